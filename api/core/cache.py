@@ -0,0 +1,210 @@
+import asyncio
+import functools
+import inspect
+import json
+import time
+from collections import OrderedDict
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+# Sentinella per distinguere "non in cache" da un valore None memorizzato
+MISSING = object()
+
+class TTLCache:
+    """Cache LRU in memoria con scadenza (TTL) per singola voce.
+    
+    Pensata per l'uso dentro l'event loop di asyncio: non usa lock.
+    """
+    
+    def __init__(self, maxsize: int = 1024, ttl: float = 60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+    
+    def get(self, key: Hashable, default: Any = MISSING) -> Any:
+        item = self._data.get(key)
+        if item is None:
+            self.misses += 1
+            return default
+        
+        expires_at, value = item
+        if expires_at <= time.monotonic():
+            # Voce scaduta: rimuovila subito
+            del self._data[key]
+            self.misses += 1
+            return default
+        
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+    
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        self._data[key] = (expires_at, value)
+        self._data.move_to_end(key)
+        
+        # Evizione LRU
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+    
+    def invalidate(self, key: Hashable):
+        self._data.pop(key, None)
+    
+    def clear(self):
+        self._data.clear()
+    
+    def __len__(self) -> int:
+        return len(self._data)
+    
+    def stats(self) -> dict:
+        return {"size": len(self._data), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses}
+
+def _json_default(value: Any) -> Any:
+    # Tipi restituiti da asyncpg che json non serializza
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Valore non serializzabile in cache: {type(value).__name__}")
+
+class TieredCache:
+    """Cache a due livelli con coalescenza delle richieste concorrenti.
+    
+    L1 è una TTLCache in processo, L2 (opzionale) è Redis, condivisa tra i
+    worker uvicorn. Su un miss la prima coroutine calcola il valore e le altre
+    con la stessa chiave attendono lo stesso risultato (singleflight), così un
+    picco di richieste produce una sola query. I valori passano da Redis come
+    JSON e vanno trattati come immutabili.
+    
+    Redis non è mai indispensabile: un errore o un timeout disattiva L2 per
+    `retry_after` secondi e le richieste proseguono con L1 e il calcolo diretto.
+    """
+    
+    def __init__(
+        self,
+        namespace: str,
+        maxsize: int = 1024,
+        redis_url: Optional[str] = None,
+        redis_timeout: float = 0.2,
+        retry_after: float = 30.0
+    ):
+        self.namespace = namespace
+        self.l1 = TTLCache(maxsize=maxsize)
+        self.redis_url = redis_url
+        self.redis_timeout = redis_timeout
+        self.retry_after = retry_after
+        self._redis = None
+        self._redis_down_until = 0.0
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.l2_hits = 0
+        self.coalesced = 0
+    
+    def make_key(self, name: str, arguments: Dict[str, Any]) -> str:
+        return f"{self.namespace}:{name}:" + json.dumps(arguments, sort_keys=True, default=str, separators=(",", ":"))
+    
+    def _get_redis(self):
+        if self.redis_url is None or time.monotonic() < self._redis_down_until:
+            return None
+        if self._redis is None:
+            import redis.asyncio as aioredis
+            self._redis = aioredis.from_url(
+                self.redis_url,
+                socket_timeout=self.redis_timeout,
+                socket_connect_timeout=self.redis_timeout
+            )
+        return self._redis
+    
+    def _redis_failed(self, e: Exception):
+        print(f"⚠️ Cache Redis non disponibile ({e}), solo cache locale per {self.retry_after:.0f}s")
+        self._redis_down_until = time.monotonic() + self.retry_after
+    
+    async def _l2_get(self, key: str) -> Any:
+        client = self._get_redis()
+        if client is None:
+            return MISSING
+        try:
+            raw = await client.get(key)
+        except Exception as e:
+            self._redis_failed(e)
+            return MISSING
+        return MISSING if raw is None else json.loads(raw)
+    
+    async def _l2_set(self, key: str, value: Any, ttl: float):
+        client = self._get_redis()
+        if client is None:
+            return
+        try:
+            await client.set(key, json.dumps(value, default=_json_default, separators=(",", ":")), px=int(ttl * 1000))
+        except Exception as e:
+            self._redis_failed(e)
+    
+    async def get_or_compute(self, key: str, ttl: float, compute: Callable[[], Awaitable[Any]]) -> Any:
+        value = self.l1.get(key)
+        if value is not MISSING:
+            return value
+        
+        task = self._inflight.get(key)
+        if task is not None:
+            # Stessa chiave già in calcolo: attendi quel risultato
+            self.coalesced += 1
+        else:
+            # Il calcolo gira in un task proprio, non in quello del primo chiamante:
+            # se una richiesta viene cancellata (client disconnesso, timeout del
+            # warm-up) le altre in attesa ricevono comunque il risultato
+            task = asyncio.ensure_future(self._compute_and_store(key, ttl, compute))
+            self._inflight[key] = task
+            task.add_done_callback(self._discard_inflight(key))
+        # shield: la cancellazione di un chiamante non interrompe il calcolo condiviso
+        return await asyncio.shield(task)
+    
+    def _discard_inflight(self, key: str) -> Callable[[asyncio.Future], None]:
+        def callback(task: asyncio.Future):
+            if self._inflight.get(key) is task:
+                del self._inflight[key]
+            # Evita "Task exception was never retrieved" se tutti i chiamanti sono stati cancellati
+            if not task.cancelled():
+                task.exception()
+        return callback
+    
+    async def _compute_and_store(self, key: str, ttl: float, compute: Callable[[], Awaitable[Any]]) -> Any:
+        value = await self._l2_get(key)
+        if value is MISSING:
+            value = await compute()
+            await self._l2_set(key, value, ttl)
+        else:
+            self.l2_hits += 1
+        self.l1.set(key, value, ttl)
+        return value
+    
+    def cached(self, name: str, ttl: float):
+        """Decoratore per metodi async: chiave da nome e argomenti (self escluso).
+        
+        Gli argomenti sono normalizzati sulla firma (default inclusi), quindi
+        f(x), f(x, 10) e f(x, limit=10) condividono la stessa voce.
+        """
+        def decorator(method):
+            signature = inspect.signature(method)
+            
+            @functools.wraps(method)
+            async def wrapper(instance, *args, **kwargs):
+                bound = signature.bind(instance, *args, **kwargs)
+                bound.apply_defaults()
+                arguments = dict(list(bound.arguments.items())[1:])
+                key = self.make_key(name, arguments)
+                return await self.get_or_compute(key, ttl, lambda: method(instance, *args, **kwargs))
+            return wrapper
+        return decorator
+    
+    async def close(self):
+        if self._redis is not None:
+            try:
+                await self._redis.aclose()
+            except Exception:
+                pass
+            self._redis = None
+    
+    def stats(self) -> dict:
+        return {**self.l1.stats(), "l2_hits": self.l2_hits, "coalesced": self.coalesced}
@@ -1,6 +1,6 @@
 import os
 from pydantic_settings import BaseSettings
-from typing import List
+from typing import List, Dict
 
 class Settings(BaseSettings):
     # Info del progetto
@@ -37,11 +37,54 @@ class Settings(BaseSettings):
             return url
         # Altrimenti costruisci l'URL dalle singole variabili
         return f"postgresql+asyncpg://{self.POSTGRES_USER}:{self.POSTGRES_PASSWORD}@{self.POSTGRES_SERVER}:{self.POSTGRES_PORT}/{self.POSTGRES_DB}?sslmode=require"
-    
+
+    # Modalità TimescaleDB: letture dagli aggregati continui (scripts/timescale_setup.sql)
+    TIMESCALE_ENABLED: bool = os.getenv("TIMESCALE_ENABLED", "false").lower() == "true"
+
+    # Pool asyncpg condiviso (creato nel lifespan dell'app)
+    DB_POOL_MIN_SIZE: int = int(os.getenv("DB_POOL_MIN_SIZE", "2"))
+    DB_POOL_MAX_SIZE: int = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+    DB_POOL_MAX_INACTIVE_LIFETIME: float = float(os.getenv("DB_POOL_MAX_INACTIVE_LIFETIME", "300"))
+    DB_COMMAND_TIMEOUT: float = float(os.getenv("DB_COMMAND_TIMEOUT", "30"))
+    DB_POOL_CLOSE_TIMEOUT: float = float(os.getenv("DB_POOL_CLOSE_TIMEOUT", "10"))
+
     # Redis per Celery
     REDIS_HOST: str = os.getenv("REDIS_HOST", "localhost")
     REDIS_PORT: int = int(os.getenv("REDIS_PORT", "6379"))
     CELERY_BROKER_URL: str = f"redis://{REDIS_HOST}:{REDIS_PORT}/0"
+
+    # Cache dei risultati di TrendService: L1 in processo + L2 Redis opzionale (condivisa tra i worker)
+    TREND_CACHE_REDIS_ENABLED: bool = os.getenv("TREND_CACHE_REDIS_ENABLED", "false").lower() == "true"
+    TREND_CACHE_REDIS_URL: str = os.getenv("TREND_CACHE_REDIS_URL", f"redis://{REDIS_HOST}:{REDIS_PORT}/1")
+    TREND_CACHE_REDIS_TIMEOUT: float = float(os.getenv("TREND_CACHE_REDIS_TIMEOUT", "0.2"))
+    TREND_CACHE_MAX_ENTRIES: int = int(os.getenv("TREND_CACHE_MAX_ENTRIES", "2048"))
+    TREND_CACHE_TTL_GLOBAL: float = float(os.getenv("TREND_CACHE_TTL_GLOBAL", "30"))
+    TREND_CACHE_TTL_COUNTRY: float = float(os.getenv("TREND_CACHE_TTL_COUNTRY", "120"))
+    TREND_CACHE_TTL_KEYWORD: float = float(os.getenv("TREND_CACHE_TTL_KEYWORD", "60"))
+    TREND_CACHE_TTL_RELATED: float = float(os.getenv("TREND_CACHE_TTL_RELATED", "300"))
+
+    # Warm-up della cache all'avvio (paesi e hashtag più richiesti negli ultimi giorni)
+    WARMUP_ENABLED: bool = os.getenv("WARMUP_ENABLED", "true").lower() == "true"
+    WARMUP_CONCURRENCY: int = int(os.getenv("WARMUP_CONCURRENCY", "4"))
+    WARMUP_TOP_HASHTAGS: int = int(os.getenv("WARMUP_TOP_HASHTAGS", "50"))
+    WARMUP_USAGE_DAYS: int = int(os.getenv("WARMUP_USAGE_DAYS", "7"))
+    WARMUP_TIMEOUT: float = float(os.getenv("WARMUP_TIMEOUT", "60"))
+
+    # Worker di ingestion (Celery): scrittura a blocchi con COPY, bucket temporali in secondi
+    INGESTION_BATCH_SIZE: int = int(os.getenv("INGESTION_BATCH_SIZE", "5000"))
+    INGESTION_INTERVAL: float = float(os.getenv("INGESTION_INTERVAL", "300"))
+    INGESTION_BUCKET_SECONDS: int = int(os.getenv("INGESTION_BUCKET_SECONDS", "300"))
+    INGESTION_FETCH_LIMIT: int = int(os.getenv("INGESTION_FETCH_LIMIT", "100"))
+
+    # Ingestion bulk NDJSON (coda limitata di batch, Retry-After in secondi)
+    BULK_INGEST_BATCH_ROWS: int = int(os.getenv("BULK_INGEST_BATCH_ROWS", "5000"))
+    BULK_INGEST_QUEUE_SIZE: int = int(os.getenv("BULK_INGEST_QUEUE_SIZE", "20"))
+    BULK_INGEST_ENQUEUE_TIMEOUT: float = float(os.getenv("BULK_INGEST_ENQUEUE_TIMEOUT", "2.0"))
+    BULK_INGEST_RETRY_AFTER: int = int(os.getenv("BULK_INGEST_RETRY_AFTER", "5"))
+    BULK_INGEST_MAX_LINE_BYTES: int = int(os.getenv("BULK_INGEST_MAX_LINE_BYTES", "65536"))
+    # Dopo una scrittura fallita i nuovi upload ricevono 503 per questo intervallo (o fino a una scrittura riuscita)
+    BULK_INGEST_FAILURE_COOLDOWN: float = float(os.getenv("BULK_INGEST_FAILURE_COOLDOWN", "30"))
+    BULK_INGEST_JOB_RETENTION_DAYS: int = int(os.getenv("BULK_INGEST_JOB_RETENTION_DAYS", "7"))
     
     # CORS
     CORS_ORIGINS: List[str] = ["*"]
@@ -53,12 +96,85 @@ class Settings(BaseSettings):
     # Sicurezza
     SECRET_KEY: str = os.getenv("SECRET_KEY", "super-secret-key-change-in-production")
     
+    # Snapshot dei trend globali (aggiornato in background, in secondi)
+    SNAPSHOT_REFRESH_INTERVAL: float = float(os.getenv("SNAPSHOT_REFRESH_INTERVAL", "60"))
+    SNAPSHOT_MAX_TRENDS: int = int(os.getenv("SNAPSHOT_MAX_TRENDS", "100"))
+    # Copia su disco dello snapshot, ricaricata all'avvio prima del pool DB (vuoto = disattivata)
+    SNAPSHOT_PERSIST_PATH: str = os.getenv("SNAPSHOT_PERSIST_PATH", "/tmp/social_trends_snapshot.json.gz")
+    SNAPSHOT_PERSIST_INTERVAL: float = float(os.getenv("SNAPSHOT_PERSIST_INTERVAL", "60"))
+    SNAPSHOT_PERSIST_MAX_AGE: float = float(os.getenv("SNAPSHOT_PERSIST_MAX_AGE", "86400"))
+    # Snapshot condiviso tra i worker (uvicorn --workers N): un solo processo lo ricalcola
+    SHARED_SNAPSHOT_ENABLED: bool = os.getenv("SHARED_SNAPSHOT_ENABLED", "false").lower() == "true"
+    SHARED_SNAPSHOT_PATH: str = os.getenv("SHARED_SNAPSHOT_PATH", "/dev/shm/social_trends_snapshot" if os.path.isdir("/dev/shm") else "/tmp/social_trends_snapshot")
+    SHARED_SNAPSHOT_POLL_INTERVAL: float = float(os.getenv("SHARED_SNAPSHOT_POLL_INTERVAL", "1.0"))
+
+    # Cache HTTP (ETag / Cache-Control) degli endpoint dei trend non basati sullo snapshot
+    HTTP_CACHE_MAX_AGE: float = float(os.getenv("HTTP_CACHE_MAX_AGE", "60"))
+    # Se true anche le risposte 304 Not Modified consumano quota
+    HTTP_CACHE_CHARGE_NOT_MODIFIED: bool = os.getenv("HTTP_CACHE_CHARGE_NOT_MODIFIED", "false").lower() == "true"
+    # Corpi JSON già serializzati (e compressi) tenuti in memoria per gli endpoint più richiesti
+    RESPONSE_CACHE_MAX_ENTRIES: int = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "256"))
+
+    # Streaming SSE delle variazioni di classifica
+    STREAM_MAX_SUBSCRIBERS: int = int(os.getenv("STREAM_MAX_SUBSCRIBERS", "10000"))
+    STREAM_QUEUE_SIZE: int = int(os.getenv("STREAM_QUEUE_SIZE", "16"))
+    STREAM_KEEPALIVE_INTERVAL: float = float(os.getenv("STREAM_KEEPALIVE_INTERVAL", "15"))
+
+    # Recupero trend dalle piattaforme (in parallelo, con deadline per piattaforma)
+    TRENDS_USE_DB: bool = os.getenv("TRENDS_USE_DB", "false").lower() == "true"
+    PLATFORM_FETCH_TIMEOUT: float = float(os.getenv("PLATFORM_FETCH_TIMEOUT", "2.0"))
+    PLATFORM_TRENDS_CACHE_TTL: float = float(os.getenv("PLATFORM_TRENDS_CACHE_TTL", "60"))
+    PLATFORM_TRENDS_CACHE_ROWS: int = int(os.getenv("PLATFORM_TRENDS_CACHE_ROWS", "100"))
+
+    # Hot store in memoria (colonne NumPy) delle ultime 24 ore di `trends`, letto al posto delle query SQL.
+    # Richiede PostgreSQL 13+ e la colonna trends.write_xid (upgrade_performance.sql). I dati, upsert
+    # inclusi, sono indietro al massimo di HOT_STORE_POLL_INTERVAL secondi più la durata di un giro; se
+    # l'ultimo giro riuscito è più vecchio di HOT_STORE_MAX_STALENESS secondi le letture tornano a SQL.
+    HOT_STORE_ENABLED: bool = os.getenv("HOT_STORE_ENABLED", "false").lower() == "true"
+    HOT_STORE_POLL_INTERVAL: float = float(os.getenv("HOT_STORE_POLL_INTERVAL", "5"))
+    HOT_STORE_BATCH_ROWS: int = int(os.getenv("HOT_STORE_BATCH_ROWS", "50000"))
+    HOT_STORE_MAX_STALENESS: float = float(os.getenv("HOT_STORE_MAX_STALENESS", "30"))
+
+    # Analisi keyword in blocco (numero massimo di keyword per richiesta)
+    KEYWORD_BATCH_MAX_SIZE: int = int(os.getenv("KEYWORD_BATCH_MAX_SIZE", "50"))
+
+    # Hashtag correlati precalcolati (intervalli in secondi)
+    RELATED_TOP_K: int = int(os.getenv("RELATED_TOP_K", "30"))
+    RELATED_REFRESH_INTERVAL: float = float(os.getenv("RELATED_REFRESH_INTERVAL", "600"))
+    RELATED_FULL_REFRESH_INTERVAL: float = float(os.getenv("RELATED_FULL_REFRESH_INTERVAL", "86400"))
+
+    # Universo sintetico dei trend simulati (stesso seed = stesso output)
+    SIMULATION_SEED: int = int(os.getenv("SIMULATION_SEED", "42"))
+    SIMULATION_UNIVERSE_SIZE: int = int(os.getenv("SIMULATION_UNIVERSE_SIZE", "100000"))
+    SIMULATION_ZIPF_EXPONENT: float = float(os.getenv("SIMULATION_ZIPF_EXPONENT", "1.1"))
+    SIMULATION_BUCKET_SECONDS: int = int(os.getenv("SIMULATION_BUCKET_SECONDS", "300"))
+
+    # Peso di ogni piattaforma nella classifica globale (JSON, es. {"tiktok": 1.0, "instagram": 0.8})
+    PLATFORM_WEIGHTS: Dict[str, float] = {"tiktok": 1.0, "instagram": 1.0}
+    
     # Rate limiting
     FREE_TIER_MONTHLY_LIMIT: int = 1000
     DEVELOPER_TIER_MONTHLY_LIMIT: int = 10000
     BUSINESS_TIER_MONTHLY_LIMIT: int = 50000
     ENTERPRISE_TIER_MONTHLY_LIMIT: int = 200000
 
+    # Contatori quota mensili (sincronizzazione e riconciliazione con api_usage, in secondi)
+    QUOTA_SYNC_INTERVAL: float = float(os.getenv("QUOTA_SYNC_INTERVAL", "10"))
+    QUOTA_RECONCILE_INTERVAL: float = float(os.getenv("QUOTA_RECONCILE_INTERVAL", "900"))
+
+    # Log di utilizzo write-behind (scrittura in blocco su api_usage)
+    USAGE_LOG_FLUSH_INTERVAL_MS: int = int(os.getenv("USAGE_LOG_FLUSH_INTERVAL_MS", "500"))
+    USAGE_LOG_BATCH_SIZE: int = int(os.getenv("USAGE_LOG_BATCH_SIZE", "500"))
+    USAGE_LOG_MAX_BUFFER: int = int(os.getenv("USAGE_LOG_MAX_BUFFER", "50000"))
+
+    # Cache in memoria delle API key (evita la query su api_keys ad ogni richiesta)
+    API_KEY_CACHE_SIZE: int = int(os.getenv("API_KEY_CACHE_SIZE", "10000"))
+    API_KEY_CACHE_TTL: float = float(os.getenv("API_KEY_CACHE_TTL", "300"))
+    API_KEY_CACHE_NEGATIVE_TTL: float = float(os.getenv("API_KEY_CACHE_NEGATIVE_TTL", "30"))
+    # TTL delle chiavi valide quando le invalidazioni tra worker (LISTEN/NOTIFY) non sono attive
+    API_KEY_CACHE_UNSYNCED_TTL: float = float(os.getenv("API_KEY_CACHE_UNSYNCED_TTL", "10"))
+    API_KEY_INVALIDATION_RETRY: float = float(os.getenv("API_KEY_INVALIDATION_RETRY", "15"))
+
     # Demo / Test mode
     ACCEPT_TEST_KEYS: bool = os.getenv("ACCEPT_TEST_KEYS", "false").lower() == "true"
     
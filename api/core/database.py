@@ -1,6 +1,7 @@
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 from api.core.config import settings
+import asyncio
 import asyncpg
 import os
 from typing import AsyncGenerator
@@ -20,45 +21,81 @@ async def get_db() -> AsyncGenerator[AsyncSession, None]:
 
 # Pool di connessioni per query dirette
 postgres_pool = None
+_pool_lock = asyncio.Lock()
+
+def get_asyncpg_url() -> str:
+    """URL del database nel formato accettato da asyncpg"""
+    # Usa il metodo get_database_url() della configurazione
+    db_url = settings.get_database_url()
+    
+    # Rimuovi il prefixo postgresql+asyncpg:// per asyncpg
+    if db_url.startswith("postgresql+asyncpg://"):
+        db_url = db_url.replace("postgresql+asyncpg://", "postgresql://", 1)
+    return db_url
 
 async def get_postgres_pool():
     global postgres_pool
     if postgres_pool is None:
-        # Usa il metodo get_database_url() della configurazione
-        db_url = settings.get_database_url()
-        
-        # Rimuovi il prefixo postgresql+asyncpg:// per asyncpg
-        if db_url.startswith("postgresql+asyncpg://"):
-            db_url = db_url.replace("postgresql+asyncpg://", "postgresql://", 1)
-        
-        postgres_pool = await asyncpg.create_pool(db_url, min_size=5, max_size=20)
+        # Evita che richieste concorrenti creino più pool
+        async with _pool_lock:
+            if postgres_pool is None:
+                postgres_pool = await asyncpg.create_pool(
+                    get_asyncpg_url(),
+                    min_size=settings.DB_POOL_MIN_SIZE,
+                    max_size=settings.DB_POOL_MAX_SIZE,
+                    max_inactive_connection_lifetime=settings.DB_POOL_MAX_INACTIVE_LIFETIME,
+                    command_timeout=settings.DB_COMMAND_TIMEOUT,
+                )
     return postgres_pool
 
-async def execute_query(query: str, *args, fetch="all"):
-    """Esegue query SQL dirette con asyncpg"""
+async def init_postgres_pool():
+    """Crea e scalda il pool all'avvio dell'applicazione (lifespan)"""
     try:
-        # Usa il metodo get_database_url() della configurazione
-        db_url = settings.get_database_url()
-        
-        # Rimuovi il prefixo postgresql+asyncpg:// per asyncpg
-        if db_url.startswith("postgresql+asyncpg://"):
-            db_url = db_url.replace("postgresql+asyncpg://", "postgresql://", 1)
-        
-        conn = await asyncpg.connect(db_url)
+        pool = await get_postgres_pool()
+        # create_pool apre già min_size connessioni: verifichiamo che rispondano
+        async with pool.acquire() as conn:
+            await conn.fetchval("SELECT 1")
+        print(f"✅ Pool database pronto ({settings.DB_POOL_MIN_SIZE}-{settings.DB_POOL_MAX_SIZE} connessioni)")
+    except Exception as e:
+        # L'API deve poter partire anche senza database (fallback simulati)
+        print(f"⚠️ Pool database non disponibile all'avvio: {e}")
+
+async def close_postgres_pool():
+    """Chiude il pool allo shutdown dell'applicazione"""
+    global postgres_pool
+    if postgres_pool is not None:
+        pool, postgres_pool = postgres_pool, None
+        try:
+            await asyncio.wait_for(pool.close(), timeout=settings.DB_POOL_CLOSE_TIMEOUT)
+        except Exception as e:
+            print(f"⚠️ Chiusura pool forzata: {e}")
+            pool.terminate()
+
+async def execute_query(query: str, *args, fetch="all", raise_on_error: bool = False):
+    """Esegue query SQL dirette con asyncpg
+    
+    Con raise_on_error=True gli errori di database vengono propagati invece
+    di restituire un risultato vuoto (utile quando "nessun risultato" e
+    "database non raggiungibile" vanno distinti, es. per le cache).
+    """
+    try:
+        pool = await get_postgres_pool()
         
-        if fetch == "all":
-            result = await conn.fetch(query, *args)
-        elif fetch == "one":
-            result = await conn.fetchrow(query, *args)
-        elif fetch == "val":
-            result = await conn.fetchval(query, *args)
-        else:
-            result = await conn.execute(query, *args)
+        async with pool.acquire() as conn:
+            if fetch == "all":
+                result = await conn.fetch(query, *args)
+            elif fetch == "one":
+                result = await conn.fetchrow(query, *args)
+            elif fetch == "val":
+                result = await conn.fetchval(query, *args)
+            else:
+                result = await conn.execute(query, *args)
             
-        await conn.close()
         return result
         
     except Exception as e:
+        if raise_on_error:
+            raise
         print(f"Database error: {e}")
         # Per ora ritorniamo dati di fallback per permettere il testing
         if fetch == "one":
@@ -0,0 +1,186 @@
+import gzip
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+from fastapi import Request, Response
+from pydantic import BaseModel
+from api.core.config import settings
+from api.core.security import charge_api_key
+
+try:
+    import brotli
+except ImportError:
+    # Opzionale: senza brotli si servono solo gzip e identity
+    brotli = None
+
+# Sotto questa dimensione (byte) la compressione non conviene
+MIN_COMPRESS_SIZE = 500
+
+def make_etag(*parts: Any) -> str:
+    """ETag debole derivato dal contenuto (o da una sua impronta) e dai parametri della richiesta"""
+    digest = hashlib.blake2b("|".join(str(part) for part in parts).encode(), digest_size=12).hexdigest()
+    return f'W/"{digest}"'
+
+def content_fingerprint(data: Any) -> str:
+    """Impronta dei dati restituiti, uguale in ogni processo: va usata negli ETag.
+    
+    Una versione a tempo non basta: i dati vengono da cache con TTL diversi
+    e per processo, quindi corpi diversi avrebbero lo stesso ETag.
+    """
+    content = json.dumps(data, sort_keys=True, default=str, separators=(",", ":"))
+    return hashlib.blake2b(content.encode(), digest_size=16).hexdigest()
+
+def time_bucket_version(max_age: float) -> int:
+    """Bucket temporale per la chiave dei corpi in cache: cambia ogni `max_age` secondi"""
+    return int(time.time() // max_age)
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Confronto debole tra If-None-Match (lista separata da virgole o '*') e l'ETag corrente"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
+
+def cache_headers(etag: str, max_age: float) -> Dict[str, str]:
+    # private: la risposta dipende dall'API key, i proxy condivisi non devono salvarla
+    return {"ETag": etag, "Cache-Control": f"private, max-age={int(max_age)}"}
+
+async def conditional_response(
+    request: Request,
+    response: Response,
+    api_key_info: Dict[str, Any],
+    etag: str,
+    max_age: float
+) -> Optional[Response]:
+    """Gestisce If-None-Match prima di interrogare i servizi.
+    
+    Restituisce la risposta 304 se il client ha già la versione corrente,
+    altrimenti None dopo aver impostato ETag e Cache-Control sulla risposta.
+    Addebita la chiamata (le 304 solo con HTTP_CACHE_CHARGE_NOT_MODIFIED):
+    l'endpoint deve usare require_tier(..., charge=False).
+    """
+    headers = cache_headers(etag, max_age)
+    # Nel log di utilizzo anche i parametri: servono al warm-up (hashtag più richiesti)
+    endpoint = request.url.path + (f"?{request.url.query}" if request.url.query else "")
+    
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        if settings.HTTP_CACHE_CHARGE_NOT_MODIFIED:
+            await charge_api_key(api_key_info, 1, endpoint)
+        return Response(status_code=304, headers=headers)
+    
+    await charge_api_key(api_key_info, 1, endpoint)
+    response.headers.update(headers)
+    return None
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> str:
+    """Codifica preferita tra br, gzip e identity secondo Accept-Encoding (q=0 esclude)"""
+    accepted: Dict[str, float] = {}
+    for item in (accept_encoding or "").split(","):
+        token, _, params = item.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if token:
+            accepted[token.strip().lower()] = q
+    
+    for encoding in ("br", "gzip"):
+        if encoding == "br" and brotli is None:
+            continue
+        if accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+            return encoding
+    return "identity"
+
+def serialize_model(model: BaseModel) -> bytes:
+    """Stessi byte prodotti da FastAPI per response_model + JSONResponse"""
+    return json.dumps(
+        model.model_dump(mode="json"),
+        ensure_ascii=False,
+        allow_nan=False,
+        indent=None,
+        separators=(",", ":")
+    ).encode("utf-8")
+
+class CachedBody:
+    """Corpo JSON serializzato una sola volta, con le varianti compresse calcolate
+    alla prima richiesta che le accetta e poi riutilizzate"""
+    
+    def __init__(self, body: bytes, etag: Optional[str] = None):
+        self.created_at = time.time()
+        # ETag calcolato dal contenuto quando il corpo è stato prodotto
+        self.etag = etag
+        self._variants: Dict[str, bytes] = {"identity": body}
+    
+    def variant(self, encoding: str) -> bytes:
+        body = self._variants.get(encoding)
+        if body is None:
+            identity = self._variants["identity"]
+            if encoding == "gzip":
+                # mtime=0: byte identici per lo stesso contenuto
+                body = gzip.compress(identity, compresslevel=6, mtime=0)
+            elif encoding == "br":
+                body = brotli.compress(identity, quality=5)
+            else:
+                raise ValueError(f"Codifica non supportata: {encoding}")
+            self._variants[encoding] = body
+        return body
+    
+    def response(self, request: Request, headers: Optional[Dict[str, str]] = None) -> Response:
+        """Risposta con la variante negoziata, senza passare da pydantic"""
+        encoding = "identity"
+        if len(self._variants["identity"]) >= MIN_COMPRESS_SIZE:
+            encoding = negotiate_encoding(request.headers.get("accept-encoding"))
+        
+        response_headers = dict(headers or {})
+        response_headers["Vary"] = "Accept-Encoding"
+        # Secondi trascorsi dalla serializzazione: i campi del corpo restano quelli di allora
+        response_headers["Age"] = str(int(time.time() - self.created_at))
+        if encoding != "identity":
+            response_headers["Content-Encoding"] = encoding
+        
+        return Response(content=self.variant(encoding), media_type="application/json", headers=response_headers)
+
+class ResponseBodyCache:
+    """Cache LRU dei corpi serializzati, per chiave (endpoint, versione dei dati, parametri).
+    
+    La chiave deve contenere la versione dei dati (versione dello snapshot o
+    bucket temporale): una nuova versione produce nuove chiavi e le vecchie
+    escono per LRU.
+    """
+    
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[Hashable, CachedBody]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+    
+    def get(self, key: Hashable) -> Optional[CachedBody]:
+        body = self._entries.get(key)
+        if body is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return body
+    
+    def put(self, key: Hashable, model: BaseModel, etag: Optional[str] = None) -> CachedBody:
+        body = self._entries[key] = CachedBody(serialize_model(model), etag)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+        return body
+
+response_bodies = ResponseBodyCache(settings.RESPONSE_CACHE_MAX_ENTRIES)
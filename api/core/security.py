@@ -1,18 +1,105 @@
-from fastapi import HTTPException, Security, Depends, status
+from fastapi import HTTPException, Request, Security, Depends, status
 from fastapi.security.api_key import APIKeyHeader
 from sqlalchemy.ext.asyncio import AsyncSession
 from api.core.database import get_db, execute_query
 from api.core.config import settings
-from datetime import datetime, timedelta
+from api.core.cache import TTLCache, MISSING
+from api.services.quota_service import quota_counter
+from api.services.usage_logger import usage_logger
+from api.services.key_invalidation import api_key_invalidations
 from typing import Optional, Dict, Any
 
 api_key_header = APIKeyHeader(name="X-API-Key", auto_error=False)
 
-async def get_current_api_key(
-    api_key: Optional[str] = Security(api_key_header),
-    db: AsyncSession = Depends(get_db)
-) -> Dict[str, Any]:
-    """Valida l'API key e restituisce le informazioni"""
+# Chiavi di test accettate in demo mode (ACCEPT_TEST_KEYS)
+TEST_API_KEYS = {
+    'test_free_key_123': {'user_email': 'test@example.com', 'tier': 'free'},
+    'test_developer_key_456': {'user_email': 'developer@example.com', 'tier': 'developer'},
+    'test_enterprise_key_789': {'user_email': 'enterprise@example.com', 'tier': 'enterprise'}
+}
+
+# Cache delle API key risolte: chiave -> riga di api_keys (None = chiave non valida)
+api_key_cache = TTLCache(maxsize=settings.API_KEY_CACHE_SIZE, ttl=settings.API_KEY_CACHE_TTL)
+
+def get_tier_limit(tier: str) -> int:
+    """Limite mensile di chiamate per il tier"""
+    tier_limits = {
+        'free': settings.FREE_TIER_MONTHLY_LIMIT,
+        'developer': settings.DEVELOPER_TIER_MONTHLY_LIMIT,
+        'business': settings.BUSINESS_TIER_MONTHLY_LIMIT,
+        'enterprise': settings.ENTERPRISE_TIER_MONTHLY_LIMIT,
+        'admin': settings.ENTERPRISE_TIER_MONTHLY_LIMIT
+    }
+    return tier_limits.get(tier, settings.FREE_TIER_MONTHLY_LIMIT)
+
+def invalidate_api_key(api_key: Optional[str] = None):
+    """Invalida la cache di questo processo per una chiave (o l'intera cache se api_key è None)"""
+    if api_key is None:
+        api_key_cache.clear()
+    else:
+        api_key_cache.invalidate(api_key)
+
+# Le invalidazioni pubblicate dagli altri worker arrivano qui
+api_key_invalidations.subscribe(invalidate_api_key)
+
+async def broadcast_api_key_invalidation(api_key: Optional[str] = None):
+    """Invalida la chiave nella cache di tutti i worker.
+    
+    Da chiamare ogni volta che una chiave viene creata, disattivata o cambia tier.
+    Se la notifica non parte, gli altri worker la vedono comunque alla scadenza
+    del TTL della cache.
+    """
+    try:
+        await api_key_invalidations.publish(api_key)
+    except Exception as e:
+        print(f"⚠️ Invalidazione API key non propagata agli altri worker: {e}")
+
+async def resolve_api_key(api_key: str) -> Optional[Dict[str, Any]]:
+    """Restituisce i dati della chiave attiva (o None), usando la cache in memoria.
+    
+    Gli errori di database vengono propagati e non finiscono in cache.
+    """
+    cached = api_key_cache.get(api_key)
+    if cached is not MISSING:
+        return cached
+    
+    row = await execute_query(
+        "SELECT * FROM api_keys WHERE key = $1 AND is_active = TRUE",
+        api_key,
+        fetch="one",
+        raise_on_error=True
+    )
+    
+    if row:
+        key_info = dict(row)
+        # Senza LISTEN attivo una revoca arriva agli altri worker solo alla scadenza: TTL breve
+        ttl = settings.API_KEY_CACHE_TTL if api_key_invalidations.connected else settings.API_KEY_CACHE_UNSYNCED_TTL
+        api_key_cache.set(api_key, key_info, ttl=ttl)
+    else:
+        # Risultato negativo con TTL breve: limita le query per chiavi inventate
+        key_info = None
+        api_key_cache.set(api_key, None, ttl=settings.API_KEY_CACHE_NEGATIVE_TTL)
+    
+    return key_info
+
+def _test_key_info(api_key: str) -> Optional[Dict[str, Any]]:
+    """Informazioni per le chiavi di test (solo con ACCEPT_TEST_KEYS attivo)"""
+    if not settings.ACCEPT_TEST_KEYS or api_key not in TEST_API_KEYS:
+        return None
+    
+    tier = TEST_API_KEYS[api_key]['tier']
+    return {
+        "api_key": api_key,
+        "user_email": TEST_API_KEYS[api_key]['user_email'],
+        "tier": tier,
+        "monthly_usage": 0,
+        "monthly_limit": get_tier_limit(tier),
+        # Le chiavi di test non consumano quota
+        "test_key": True
+    }
+
+async def authenticate_api_key(request: Request, api_key: Optional[str], charge: bool = True) -> Dict[str, Any]:
+    """Valida l'API key e, con charge=True, conteggia la chiamata nella quota mensile"""
     
     if not api_key:
         raise HTTPException(
@@ -21,78 +108,33 @@ async def get_current_api_key(
         )
     
     try:
-        # Prova la connessione al database
-        key_info = await execute_query(
-            "SELECT * FROM api_keys WHERE key = $1 AND is_active = TRUE",
-            api_key,
-            fetch="one"
-        )
+        key_info = await resolve_api_key(api_key)
         
         if not key_info:
             # In demo mode, accetta chiavi di test anche se la query non ha restituito risultati
-            if settings.ACCEPT_TEST_KEYS:
-                test_keys = {
-                    'test_free_key_123': {'user_email': 'test@example.com', 'tier': 'free'},
-                    'test_developer_key_456': {'user_email': 'developer@example.com', 'tier': 'developer'},
-                    'test_enterprise_key_789': {'user_email': 'enterprise@example.com', 'tier': 'enterprise'}
-                }
-                if api_key in test_keys:
-                    tier = test_keys[api_key]['tier']
-                    return {
-                        "api_key": api_key,
-                        "user_email": test_keys[api_key]['user_email'],
-                        "tier": tier,
-                        "monthly_usage": 0,
-                        "monthly_limit": tier_limits.get(tier, settings.FREE_TIER_MONTHLY_LIMIT)
-                    }
+            test_info = _test_key_info(api_key)
+            if test_info:
+                return test_info
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="API Key non valida"
             )
         
         # Controlla il rate limiting mensile basato sul tier
-        tier_limits = {
-            'free': settings.FREE_TIER_MONTHLY_LIMIT,
-            'developer': settings.DEVELOPER_TIER_MONTHLY_LIMIT,
-            'business': settings.BUSINESS_TIER_MONTHLY_LIMIT,
-            'enterprise': settings.ENTERPRISE_TIER_MONTHLY_LIMIT
-        }
-        
-        monthly_limit = tier_limits.get(key_info['tier'], 1000)
-        first_day_month = datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        monthly_limit = get_tier_limit(key_info['tier'])
+        monthly_usage = await quota_counter.get_usage(api_key)
         
-        monthly_usage = await execute_query(
-            "SELECT COUNT(*) FROM api_usage WHERE api_key = $1 AND timestamp >= $2",
-            api_key,
-            first_day_month,
-            fetch="val"
-        ) or 0
-        
-        if monthly_usage >= monthly_limit:
-            raise HTTPException(
-                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-                detail=f"Limite mensile di {monthly_limit} richieste superato per il tier {key_info['tier']}. Upgrade il tuo piano."
-            )
-        
-        # Registra l'utilizzo
-        try:
-            await execute_query(
-                "INSERT INTO api_usage (api_key, endpoint, timestamp) VALUES ($1, $2, $3)",
-                api_key,
-                "api_request",
-                datetime.now(),
-                fetch="none"
-            )
+        if charge:
+            if monthly_usage >= monthly_limit:
+                raise HTTPException(
+                    status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                    detail=f"Limite mensile di {monthly_limit} richieste superato per il tier {key_info['tier']}. Upgrade il tuo piano."
+                )
             
-            # Aggiorna statistiche dell'API key
-            await execute_query(
-                "UPDATE api_keys SET last_used = $1, usage_count = usage_count + 1 WHERE key = $2",
-                datetime.now(),
-                api_key,
-                fetch="none"
-            )
-        except Exception as log_error:
-            print(f"Errore logging utilizzo: {log_error}")
+            quota_counter.increment(api_key)
+            
+            # Registra l'utilizzo (scritto in blocco dal logger in background)
+            usage_logger.record(api_key, request.url.path)
         
         return {
             "api_key": api_key,
@@ -101,40 +143,61 @@ async def get_current_api_key(
             "monthly_usage": monthly_usage,
             "monthly_limit": monthly_limit
         }
-        
+    
     except HTTPException:
         # Re-raise le eccezioni HTTP (API key invalida, rate limit, etc.)
         raise
     except Exception as e:
         print(f"Database connection error in auth: {e}")
         # Sistema di fallback per le API key di test (abilitabile via settings)
-        if settings.ACCEPT_TEST_KEYS:
-            test_keys = {
-                'test_free_key_123': {'user_email': 'test@example.com', 'tier': 'free'},
-                'test_developer_key_456': {'user_email': 'developer@example.com', 'tier': 'developer'},
-                'test_enterprise_key_789': {'user_email': 'enterprise@example.com', 'tier': 'enterprise'}
-            }
-            if api_key in test_keys:
-                print(f"Usando fallback per API key di test: {api_key}")
-                tier = test_keys[api_key]['tier']
-                return {
-                    "api_key": api_key,
-                    "user_email": test_keys[api_key]['user_email'],
-                    "tier": tier,
-                    "monthly_usage": 0,
-                    "monthly_limit": tier_limits.get(tier, settings.FREE_TIER_MONTHLY_LIMIT)
-                }
+        test_info = _test_key_info(api_key)
+        if test_info:
+            print(f"Usando fallback per API key di test: {api_key}")
+            return test_info
         
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="API Key non valida"
         )
 
-def require_tier(minimum_tier: str):
-    """Decorator per richiedere un tier minimo"""
-    tier_hierarchy = {"free": 0, "developer": 1, "business": 2, "enterprise": 3}
+async def get_current_api_key(
+    request: Request,
+    api_key: Optional[str] = Security(api_key_header),
+    db: AsyncSession = Depends(get_db)
+) -> Dict[str, Any]:
+    """Valida l'API key e conteggia la chiamata"""
+    return await authenticate_api_key(request, api_key, charge=True)
+
+async def get_api_key_uncharged(
+    request: Request,
+    api_key: Optional[str] = Security(api_key_header),
+    db: AsyncSession = Depends(get_db)
+) -> Dict[str, Any]:
+    """Valida l'API key senza conteggiarla: l'endpoint addebita con charge_api_key"""
+    return await authenticate_api_key(request, api_key, charge=False)
+
+async def charge_api_key(api_key_info: Dict[str, Any], units: int, endpoint: str):
+    """Addebita `units` chiamate (es. endpoint batch o risposte condizionali), rispettando il limite mensile"""
+    if units <= 0 or api_key_info.get("test_key"):
+        return
+    
+    api_key = api_key_info["api_key"]
+    monthly_usage = await quota_counter.get_usage(api_key)
+    if monthly_usage + units > api_key_info["monthly_limit"]:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=f"Limite mensile di {api_key_info['monthly_limit']} richieste superato per il tier {api_key_info['tier']}. Upgrade il tuo piano."
+        )
+    
+    quota_counter.increment(api_key, units)
+    for _ in range(units):
+        usage_logger.record(api_key, endpoint)
+
+def require_tier(minimum_tier: str, charge: bool = True):
+    """Decorator per richiedere un tier minimo (charge=False: la chiamata va addebitata dall'endpoint)"""
+    tier_hierarchy = {"free": 0, "developer": 1, "business": 2, "enterprise": 3, "admin": 4}
     
-    def dependency(api_key_info: Dict[str, Any] = Depends(get_current_api_key)):
+    def dependency(api_key_info: Dict[str, Any] = Depends(get_current_api_key if charge else get_api_key_uncharged)):
         current_tier_level = tier_hierarchy.get(api_key_info["tier"], 0)
         required_tier_level = tier_hierarchy.get(minimum_tier, 0)
         
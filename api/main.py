@@ -1,9 +1,56 @@
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
+from contextlib import asynccontextmanager
+import asyncio
 import time
 from api.core.config import settings
-from api.routers import trends, auth, auth_v2
+from api.core.database import init_postgres_pool, close_postgres_pool
+from api.services.quota_service import quota_counter
+from api.services.usage_logger import usage_logger
+from api.services.key_invalidation import api_key_invalidations
+from api.services.snapshot_service import trend_snapshots
+from api.services.stream_service import trend_stream_hub
+from api.services.cooccurrence_service import hashtag_neighbors_refresher
+from api.services.bulk_ingest_service import bulk_ingest_queue
+from api.services.trend_service import trend_cache
+from api.services.warmup_service import cache_warmer
+from api.services.hot_store import hot_trend_store
+from api.routers import trends, auth, auth_v2, ingest
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Avvio e arresto delle risorse condivise"""
+    # Prima del pool DB: /global risponde subito con l'ultimo snapshot salvato
+    pool_warmup = None
+    if trend_snapshots.load_persisted():
+        # Con uno snapshot già disponibile non aspettiamo il database (risveglio su Render)
+        pool_warmup = asyncio.create_task(init_postgres_pool())
+    else:
+        await init_postgres_pool()
+    quota_counter.start()
+    usage_logger.start()
+    api_key_invalidations.start()
+    trend_snapshots.start()
+    trend_stream_hub.start()
+    hashtag_neighbors_refresher.start()
+    bulk_ingest_queue.start()
+    hot_trend_store.start()
+    cache_warmer.start()
+    yield
+    await cache_warmer.stop()
+    await hot_trend_store.stop()
+    await bulk_ingest_queue.stop()
+    await hashtag_neighbors_refresher.stop()
+    await trend_stream_hub.stop()
+    await trend_snapshots.stop()
+    await api_key_invalidations.stop()
+    await usage_logger.stop()
+    await quota_counter.stop()
+    await trend_cache.close()
+    if pool_warmup is not None and not pool_warmup.done():
+        pool_warmup.cancel()
+    await close_postgres_pool()
 
 # Crea l'applicazione FastAPI
 app = FastAPI(
@@ -12,6 +59,7 @@ app = FastAPI(
     version=settings.VERSION,
     docs_url="/docs",
     redoc_url="/redoc",
+    lifespan=lifespan,
 )
 
 # Middleware CORS
@@ -54,6 +102,16 @@ try:
 except Exception as e:
     print(f"❌ Failed to load auth router: {e}")
 
+try:
+    app.include_router(
+        ingest.router,
+        prefix=f"{settings.API_V1_STR}/ingest",
+        tags=["📥 Ingestion"],
+    )
+    print("✅ Ingest router loaded successfully")
+except Exception as e:
+    print(f"❌ Failed to load ingest router: {e}")
+
 # Nuovo router auth con funzionalità migliorate
 try:
     app.include_router(
@@ -128,6 +186,20 @@ async def health_check():
         "timestamp": time.time()
     }
 
+@app.get("/ready", tags=["🏠 Info"])
+async def readiness_check():
+    """
+    🚦 **Readiness Check**
+    
+    Risponde 200 solo quando lo snapshot globale esiste e il warm-up della
+    cache è terminato (503 durante l'avvio). `/health` resta il controllo di
+    liveness: il processo è vivo anche mentre la cache si sta scaldando.
+    """
+    status_info = cache_warmer.status()
+    if not cache_warmer.ready:
+        return JSONResponse(status_code=503, content={"status": "warming_up", **status_info})
+    return {"status": "ready", **status_info}
+
 @app.get("/debug/config", tags=["🏠 Info"])
 async def debug_config():
     """
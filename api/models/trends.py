@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field, EmailStr
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Literal
 from datetime import datetime
 
 class TrendItem(BaseModel):
@@ -13,6 +13,9 @@ class TrendResponse(BaseModel):
     last_updated: datetime
     total_trends: int
     trends: List[TrendItem]
+    data_age_seconds: Optional[float] = None
+    stale: bool = False
+    degraded_sources: List[str] = []
 
 class PlatformTrendItem(BaseModel):
     rank: int
@@ -38,6 +41,14 @@ class KeywordAnalysis(BaseModel):
     sentiment_avg: float
     timeline: List[Dict[str, Any]]
 
+class KeywordBatchRequest(BaseModel):
+    keywords: List[str] = Field(..., min_length=1, description="Parole chiave o hashtag da analizzare")
+    hours: int = Field(24, ge=1, le=168, description="Ore precedenti da analizzare (max 7 giorni)")
+
+class KeywordBatchAnalysis(BaseModel):
+    analysis_period_hours: int
+    results: List[KeywordAnalysis]
+
 class RelatedHashtag(BaseModel):
     hashtag: str
     relation_score: float
@@ -101,3 +112,26 @@ class ApiKeyDetailed(BaseModel):
     is_active: bool
     created_at: datetime
     last_used: Optional[datetime]
+
+class BulkIngestError(BaseModel):
+    line: int
+    error: str
+
+class BulkIngestResponse(BaseModel):
+    job_id: str
+    accepted_rows: int
+    rejected_rows: int
+    batches: int
+    errors: List[BulkIngestError] = []
+
+class BulkIngestJobStatus(BaseModel):
+    job_id: str
+    status: Literal["receiving", "writing", "completed", "partial", "failed"]
+    accepted_rows: int
+    rejected_rows: int
+    queued_rows: int
+    written_rows: int
+    failed_rows: int
+    last_error: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
@@ -7,6 +7,7 @@ from api.models.trends import (
     EmailVerificationResponse, UserInfo, ApiKeyDetailed
 )
 from api.core.database import execute_query
+from api.core.security import broadcast_api_key_invalidation
 from api.services.email_service import EmailService
 import json
 
@@ -39,6 +40,9 @@ async def _generate_api_key_core(email: str, tier: str) -> ApiKeyInfo:
             )
         )
 
+    # Una chiave appena creata non deve restare in cache come "non valida"
+    await broadcast_api_key_invalidation(new_key)
+
     # Recupera le informazioni della chiave creata
     key_info = await execute_query(
         "SELECT * FROM api_keys WHERE key = $1",
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Security
 from pydantic import BaseModel
 from typing import Optional, Literal
 from api.models.trends import (
@@ -6,6 +6,7 @@ from api.models.trends import (
     RapidAPIKeyRequest, RapidAPIKeyResponse, UserInfo, ApiKeyDetailed
 )
 from api.core.database import execute_query
+from api.core.security import api_key_header, broadcast_api_key_invalidation
 import json
 
 router = APIRouter()
@@ -32,6 +33,9 @@ async def _generate_api_key_core(email: str, tier: str) -> ApiKeyInfo:
             )
         )
 
+    # Una chiave appena creata non deve restare in cache come "non valida"
+    await broadcast_api_key_invalidation(new_key)
+
     # Recupera le informazioni della chiave creata
     key_info = await execute_query(
         "SELECT * FROM api_keys WHERE key = $1",
@@ -108,6 +112,8 @@ async def register_user(request: UserRegistrationRequest):
             else:
                 raise HTTPException(status_code=400, detail=error_msg)
         
+        await broadcast_api_key_invalidation(api_data['api_key'])
+        
         return {
             "status": "success",
             "message": "🎉 API key generata con successo!",
@@ -169,6 +175,8 @@ async def provision_rapidapi_key(request: RapidAPIKeyRequest):
             error_msg = api_data.get("message", "Errore nella generazione API key per RapidAPI")
             raise HTTPException(status_code=400, detail=error_msg)
         
+        await broadcast_api_key_invalidation(api_data['api_key'])
+        
         return RapidAPIKeyResponse(
             api_key=api_data['api_key'],
             user_id=api_data['user_id'],
@@ -223,6 +231,46 @@ async def generate_api_key_post(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Errore nella generazione della chiave: {str(e)}")
 
+@router.post("/revoke-key", response_model=dict)
+async def revoke_api_key(
+    api_key: Optional[str] = Security(api_key_header)
+):
+    """
+    🚫 **Disattiva API Key**
+    
+    Disattiva la chiave passata nell'header X-API-Key (non in query string,
+    per non lasciarla nei log di accesso). Tutti i worker la rimuovono dalla
+    cache appena ricevono la notifica; se le notifiche tra worker non sono
+    attive, la chiave resta valida al massimo per API_KEY_CACHE_UNSYNCED_TTL
+    secondi.
+    """
+    if not api_key:
+        raise HTTPException(status_code=401, detail="API Key richiesta. Aggiungi header X-API-Key")
+    
+    try:
+        revoked_key = await execute_query(
+            "UPDATE api_keys SET is_active = FALSE WHERE key = $1 AND is_active = TRUE RETURNING key",
+            api_key,
+            fetch="val"
+        )
+        
+        # Invalida comunque: la cache potrebbe contenere la chiave ancora attiva
+        await broadcast_api_key_invalidation(api_key)
+        
+        if not revoked_key:
+            raise HTTPException(status_code=404, detail="API key non trovata o già disattivata")
+        
+        return {
+            "status": "success",
+            "message": "API key disattivata",
+            "api_key": api_key[:10] + "..." + api_key[-4:]
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Errore nella disattivazione della chiave: {str(e)}")
+
 @router.get("/usage", response_model=dict)
 async def get_usage_stats(
     api_key: str = Query(..., description="La tua API key")
@@ -0,0 +1,160 @@
+from fastapi import APIRouter, Request, HTTPException, Depends, status
+from typing import Any, Dict, List, Tuple
+from api.models.trends import BulkIngestResponse, BulkIngestJobStatus
+from api.services.bulk_ingest_service import (
+    bulk_ingest_queue, validate_rows, BulkIngestQueueFull, BulkIngestUnavailable
+)
+from api.core.security import require_tier
+from api.core.config import settings
+
+router = APIRouter()
+
+# Errori riportati nella risposta (gli altri vengono solo contati)
+MAX_REPORTED_ERRORS = 100
+
+@router.post(
+    "/trends",
+    response_model=BulkIngestResponse,
+    status_code=status.HTTP_202_ACCEPTED,
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {"application/x-ndjson": {"schema": {"type": "string", "format": "binary"}}}
+        }
+    }
+)
+async def ingest_trends(
+    request: Request,
+    api_key_info: dict = Depends(require_tier("enterprise"))
+):
+    """
+    📥 **Ingestion Bulk di Trend (NDJSON)**
+    
+    Accetta un corpo NDJSON, una osservazione per riga:
+    `{"name": "#fyp", "volume": 1200, "platform": "tiktok", "country_code": "IT", "time": "2024-05-01T10:00:00Z"}`
+    
+    Le righe vengono lette in streaming, validate a blocchi e scritte in
+    background con COPY. La scrittura è idempotente per (name, platform,
+    country_code, bucket temporale): in caso di 429/503 si può ritrasmettere
+    l'intero file dopo `Retry-After` secondi.
+    
+    La risposta 202 indica che le righe sono state accodate, non ancora
+    scritte: l'esito finale (righe scritte e fallite) si legge da
+    `GET /ingest/jobs/{job_id}`. Se le scritture recenti sono fallite
+    l'upload viene rifiutato subito con 503.
+    Richiede piano Enterprise o Admin.
+    """
+    unavailable_headers = {"Retry-After": str(settings.BULK_INGEST_RETRY_AFTER)}
+    if not bulk_ingest_queue.is_running or not bulk_ingest_queue.healthy:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail={"message": "Ingestion temporaneamente non disponibile", "accepted_rows": 0},
+            headers=unavailable_headers
+        )
+    try:
+        job_id = await bulk_ingest_queue.create_job(api_key_info["api_key"])
+    except Exception as e:
+        print(f"Errore creazione job di ingestion: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail={"message": "Ingestion temporaneamente non disponibile", "accepted_rows": 0},
+            headers=unavailable_headers
+        )
+    
+    accepted = 0
+    rejected = 0
+    queued = 0
+    batches = 0
+    errors: List[Dict[str, Any]] = []
+    pending: List[Tuple[int, bytes]] = []
+    
+    async def flush_pending():
+        nonlocal accepted, rejected, queued, batches
+        records, batch_errors = validate_rows(pending)
+        valid_rows = len(pending) - len(batch_errors)
+        pending.clear()
+        rejected += len(batch_errors)
+        errors.extend(batch_errors[:MAX_REPORTED_ERRORS - len(errors)])
+        if not records:
+            return
+        try:
+            await bulk_ingest_queue.put(job_id, records)
+        except (BulkIngestQueueFull, BulkIngestUnavailable) as e:
+            queue_full = isinstance(e, BulkIngestQueueFull)
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS if queue_full else status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail={
+                    "message": "Coda di ingestion piena, riprova più tardi" if queue_full else "Ingestion temporaneamente non disponibile",
+                    "accepted_rows": accepted,
+                    "job_id": job_id
+                },
+                headers=unavailable_headers
+            )
+        accepted += valid_rows
+        queued += len(records)
+        batches += 1
+    
+    def check_line_length(line: bytes, number: int):
+        if len(line) > settings.BULK_INGEST_MAX_LINE_BYTES:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f"Riga {number} oltre {settings.BULK_INGEST_MAX_LINE_BYTES} byte"
+            )
+    
+    try:
+        # Lettura in streaming: in memoria solo il blocco corrente e la riga incompleta
+        line_number = 0
+        carry = b""
+        async for chunk in request.stream():
+            lines = (carry + chunk).split(b"\n")
+            carry = lines.pop()
+            for line in lines:
+                line_number += 1
+                check_line_length(line, line_number)
+                if line.strip():
+                    pending.append((line_number, line))
+                    if len(pending) >= settings.BULK_INGEST_BATCH_ROWS:
+                        await flush_pending()
+            check_line_length(carry, line_number + 1)
+        
+        if carry.strip():
+            pending.append((line_number + 1, carry))
+        if pending:
+            await flush_pending()
+    finally:
+        # Anche per un upload interrotto: i batch già accodati vengono scritti e contati nel job
+        await bulk_ingest_queue.finish_job(job_id, accepted, rejected, queued)
+    
+    return BulkIngestResponse(
+        job_id=job_id,
+        accepted_rows=accepted,
+        rejected_rows=rejected,
+        batches=batches,
+        errors=errors
+    )
+
+@router.get("/jobs/{job_id}", response_model=BulkIngestJobStatus)
+async def get_ingest_job(
+    job_id: str,
+    api_key_info: dict = Depends(require_tier("enterprise", charge=False))
+):
+    """
+    📋 **Esito di un upload bulk**
+    
+    Righe accodate, scritte e fallite per il job restituito da
+    `POST /ingest/trends`. Lo stato `writing` indica batch ancora in coda;
+    con `partial` o `failed` l'upload va ritrasmesso (la scrittura è
+    idempotente). Non consuma quota.
+    """
+    try:
+        job = await bulk_ingest_queue.get_job(job_id, api_key_info["api_key"])
+    except Exception as e:
+        print(f"Errore lettura job di ingestion {job_id}: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Stato del job temporaneamente non disponibile",
+            headers={"Retry-After": str(settings.BULK_INGEST_RETRY_AFTER)}
+        )
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job di ingestion non trovato")
+    return job
@@ -1,20 +1,27 @@
-from fastapi import APIRouter, Query, HTTPException, Depends
+from fastapi import APIRouter, Query, HTTPException, Depends, Request, Response, Header, status
+from fastapi.responses import StreamingResponse
 from typing import Optional
 from datetime import datetime
-from api.services.trend_service import TrendService
+from api.services.snapshot_service import trend_snapshots
+from api.services.cooccurrence_service import RELATION_METRICS
+from api.services.stream_service import trend_stream_hub, StreamCapacityExceeded
 from api.models.trends import (
     TrendResponse, PlatformTrendResponse, CountryTrendResponse,
-    KeywordAnalysis, RelatedHashtagsResponse
+    KeywordAnalysis, RelatedHashtagsResponse, KeywordBatchRequest, KeywordBatchAnalysis
 )
-from api.core.security import get_current_api_key, require_tier
+from api.core.security import get_api_key_uncharged, require_tier, charge_api_key
+from api.core.http_cache import conditional_response, make_etag, content_fingerprint, time_bucket_version, response_bodies
+from api.core.config import settings
 
 router = APIRouter()
-trend_service = TrendService()
+trend_service = trend_snapshots.trend_service
 
 @router.get("/global", response_model=TrendResponse)
 async def get_global_trends(
+    request: Request,
+    response: Response,
     limit: int = Query(10, ge=1, le=100, description="Numero massimo di trend da restituire"),
-    api_key_info: dict = Depends(get_current_api_key)
+    api_key_info: dict = Depends(get_api_key_uncharged)
 ):
     """
     🌍 **Trend Globali**
@@ -23,21 +30,97 @@ async def get_global_trends(
     Disponibile anche nel piano Free.
     """
     try:
-        results = await trend_service.get_global_trends(limit)
-        
-        return TrendResponse(
-            last_updated=datetime.now(),
-            total_trends=len(results),
-            trends=results
-        )
+        # Legge lo snapshot aggiornato in background (nessun ricalcolo per richiesta)
+        snapshot = await trend_snapshots.get_snapshot()
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Errore nel recupero trend globali: {str(e)}")
+    
+    # ETag dal contenuto dello snapshot (non dalla versione, che è per processo):
+    # con If-None-Match aggiornato risponde 304
+    stale = trend_snapshots.is_stale
+    not_modified = await conditional_response(
+        request, response, api_key_info,
+        make_etag("global", snapshot.fingerprint, limit, stale),
+        settings.SNAPSHOT_REFRESH_INTERVAL
+    )
+    if not_modified is not None:
+        return not_modified
+    
+    # Corpo serializzato una volta per versione dello snapshot (l'header Age ne indica l'età)
+    cache_key = ("global", snapshot.version, limit, stale)
+    body = response_bodies.get(cache_key)
+    if body is None:
+        try:
+            results = snapshot.trends[:limit]
+            
+            body = response_bodies.put(cache_key, TrendResponse(
+                last_updated=snapshot.created_at,
+                total_trends=len(results),
+                trends=results,
+                data_age_seconds=round(snapshot.age_seconds, 1),
+                stale=stale,
+                degraded_sources=snapshot.degraded_sources
+            ))
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Errore nel recupero trend globali: {str(e)}")
+    
+    return body.response(request, response.headers)
+
+@router.get("/stream")
+async def stream_global_trends(
+    request: Request,
+    last_event_id: Optional[str] = Header(None, alias="Last-Event-ID"),
+    api_key_info: dict = Depends(require_tier("developer"))
+):
+    """
+    📡 **Stream dei Trend Globali (Server-Sent Events)**
+    
+    Invia la classifica globale completa (`event: snapshot`) e poi solo le
+    variazioni (`event: diff`, con `upserted` e `removed`) appena lo snapshot
+    cambia. Autenticazione e controllo del piano avvengono una sola volta per
+    connessione. In riconnessione con `Last-Event-ID` uguale alla versione
+    corrente la classifica completa non viene reinviata.
+    Richiede piano Developer o superiore.
+    """
+    try:
+        queue = trend_stream_hub.subscribe()
+    except StreamCapacityExceeded:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Troppe connessioni di streaming attive, riprova più tardi",
+            headers={"Retry-After": "30"}
+        )
+    
+    # Primo messaggio letto in modo sincrono con la subscribe: nessun diff perso
+    initial = trend_stream_hub.snapshot_message()
+    if last_event_id is not None and last_event_id == str(trend_stream_hub.version):
+        initial = None
+    
+    async def events():
+        try:
+            if initial is not None:
+                yield initial
+            while True:
+                message = await queue.get()
+                if message is None:
+                    break
+                yield message
+        finally:
+            trend_stream_hub.unsubscribe(queue)
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 @router.get("/platform", response_model=PlatformTrendResponse)
 async def get_platform_trends(
+    request: Request,
+    response: Response,
     source: str = Query(..., description="Piattaforma social da interrogare", enum=["tiktok", "instagram"]),
     limit: int = Query(20, ge=1, le=50, description="Numero massimo di trend da restituire"),
-    api_key_info: dict = Depends(require_tier("developer"))
+    api_key_info: dict = Depends(require_tier("developer", charge=False))
 ):
     """
     📱 **Trend per Piattaforma**
@@ -45,30 +128,43 @@ async def get_platform_trends(
     Restituisce i trend specifici per una singola piattaforma social.
     Richiede piano Developer o superiore.
     """
-    try:
-        if source == "tiktok":
-            results = await trend_service.tiktok_service.get_trends(limit, use_db=False)
-        elif source == "instagram":
-            results = await trend_service.instagram_service.get_trends(limit, use_db=False)
-        else:
-            raise ValueError("Piattaforma non supportata")
-        
-        return PlatformTrendResponse(
-            platform=source,
-            last_updated=datetime.now(),
-            total_trends=len(results),
-            trends=results
-        )
-    except ValueError as e:
-        raise HTTPException(status_code=400, detail=str(e))
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Errore nel recupero trend {source}: {str(e)}")
+    # Corpo serializzato una volta per bucket temporale; l'ETag viene dai dati
+    # del corpo (i bucket e le cache non coincidono tra i worker)
+    cache_key = ("platform", time_bucket_version(settings.HTTP_CACHE_MAX_AGE), source, limit)
+    body = response_bodies.get(cache_key)
+    if body is None:
+        try:
+            if source == "tiktok":
+                results = await trend_service.tiktok_service.get_trends(limit, use_db=settings.TRENDS_USE_DB)
+            elif source == "instagram":
+                results = await trend_service.instagram_service.get_trends(limit, use_db=settings.TRENDS_USE_DB)
+            else:
+                raise ValueError("Piattaforma non supportata")
+            
+            body = response_bodies.put(cache_key, PlatformTrendResponse(
+                platform=source,
+                last_updated=datetime.now(),
+                total_trends=len(results),
+                trends=results
+            ), etag=make_etag("platform", content_fingerprint(results), source, limit))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Errore nel recupero trend {source}: {str(e)}")
+    
+    not_modified = await conditional_response(request, response, api_key_info, body.etag, settings.HTTP_CACHE_MAX_AGE)
+    if not_modified is not None:
+        return not_modified
+    
+    return body.response(request, response.headers)
 
 @router.get("/country", response_model=CountryTrendResponse)
 async def get_country_trends(
+    request: Request,
+    response: Response,
     code: str = Query(..., min_length=2, max_length=2, description="Codice paese ISO 3166-1 alpha-2 (es: IT, US, GB)"),
     limit: int = Query(10, ge=1, le=50, description="Numero massimo di trend da restituire"),
-    api_key_info: dict = Depends(require_tier("business"))
+    api_key_info: dict = Depends(require_tier("business", charge=False))
 ):
     """
     🌐 **Trend per Paese**
@@ -77,8 +173,20 @@ async def get_country_trends(
     Richiede piano Business o superiore.
     """
     try:
-        results = await trend_service.get_country_trends(code, limit)
-        
+        results = await trend_service.get_country_trends(code.upper(), limit)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Errore nel recupero trend per {code}: {str(e)}")
+    
+    # ETag dai dati restituiti: con If-None-Match aggiornato risponde 304
+    not_modified = await conditional_response(
+        request, response, api_key_info,
+        make_etag("country", content_fingerprint(results), code.upper(), limit),
+        settings.HTTP_CACHE_MAX_AGE
+    )
+    if not_modified is not None:
+        return not_modified
+    
+    try:
         return CountryTrendResponse(
             country=code.upper(),
             last_updated=datetime.now(),
@@ -89,9 +197,11 @@ async def get_country_trends(
 
 @router.get("/analysis/keyword", response_model=KeywordAnalysis)
 async def analyze_keyword_mentions(
+    request: Request,
+    response: Response,
     keyword: str = Query(..., min_length=1, description="Parola chiave o hashtag da analizzare"),
     hours: int = Query(24, ge=1, le=168, description="Ore precedenti da analizzare (max 7 giorni)"),
-    api_key_info: dict = Depends(require_tier("developer"))
+    api_key_info: dict = Depends(require_tier("developer", charge=False))
 ):
     """
     🔍 **Analisi Keyword**
@@ -106,7 +216,18 @@ async def analyze_keyword_mentions(
     """
     try:
         results = await trend_service.analyze_keyword(keyword, hours)
-        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Errore nell'analisi di '{keyword}': {str(e)}")
+    
+    not_modified = await conditional_response(
+        request, response, api_key_info,
+        make_etag("keyword", content_fingerprint(results), keyword, hours),
+        settings.HTTP_CACHE_MAX_AGE
+    )
+    if not_modified is not None:
+        return not_modified
+    
+    try:
         return KeywordAnalysis(
             keyword=keyword,
             total_mentions=results["total_mentions"],
@@ -117,26 +238,91 @@ async def analyze_keyword_mentions(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Errore nell'analisi di '{keyword}': {str(e)}")
 
+@router.post("/analysis/keywords", response_model=KeywordBatchAnalysis)
+async def analyze_keywords_batch(
+    request: Request,
+    body: KeywordBatchRequest,
+    api_key_info: dict = Depends(require_tier("developer", charge=False))
+):
+    """
+    🔍 **Analisi Keyword in Blocco**
+    
+    Come `/analysis/keyword`, ma per più parole chiave con una sola richiesta
+    (e una sola query). Ogni keyword viene conteggiata come una chiamata
+    nella quota mensile; le keyword duplicate vengono analizzate una volta.
+    Le richieste non valide (400) o fallite (500) non consumano quota.
+    Richiede piano Developer o superiore.
+    """
+    keywords = list(dict.fromkeys(k.strip() for k in body.keywords if k.strip()))
+    if not keywords:
+        raise HTTPException(status_code=400, detail="Nessuna keyword valida")
+    if len(keywords) > settings.KEYWORD_BATCH_MAX_SIZE:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Massimo {settings.KEYWORD_BATCH_MAX_SIZE} keyword per richiesta"
+        )
+    
+    try:
+        results = await trend_service.analyze_keywords(keywords, body.hours)
+        
+        analysis = KeywordBatchAnalysis(
+            analysis_period_hours=body.hours,
+            results=[
+                KeywordAnalysis(
+                    keyword=result["keyword"],
+                    total_mentions=result["total_mentions"],
+                    platforms=result["platforms"],
+                    sentiment_avg=result["sentiment_avg"],
+                    timeline=result["timeline"]
+                )
+                for result in results
+            ]
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Errore nell'analisi delle keyword: {str(e)}")
+    
+    # Addebito unico dopo il calcolo riuscito: tutto o niente
+    await charge_api_key(api_key_info, len(keywords), request.url.path)
+    return analysis
+
 @router.get("/hashtags/related", response_model=RelatedHashtagsResponse)
 async def get_related_hashtags(
+    request: Request,
+    response: Response,
     hashtag: str = Query(..., description="Hashtag di partenza (con o senza #)"),
     limit: int = Query(10, ge=1, le=30, description="Numero massimo di hashtag correlati"),
-    api_key_info: dict = Depends(require_tier("developer"))
+    score: str = Query("cooccurrence", description="Metrica di correlazione", enum=RELATION_METRICS),
+    api_key_info: dict = Depends(require_tier("developer", charge=False))
 ):
     """
     🔗 **Hashtag Correlati**
     
     Trova hashtag correlati a quello fornito basandosi sulla co-occorrenza
-    nei trend e nelle menzioni.
+    nei trend e nelle menzioni. Metriche disponibili: co-occorrenze grezze
+    (`cooccurrence`), PMI (`pmi`) e indice di Jaccard (`jaccard`).
     
     Richiede piano Developer o superiore.
     """
+    if score not in RELATION_METRICS:
+        raise HTTPException(status_code=400, detail=f"Metrica non supportata: {score}")
+    
+    # Pulisci l'hashtag (rimuovi # se presente)
+    clean_hashtag = hashtag.lstrip('#')
+    
+    try:
+        results = await trend_service.get_related_hashtags(clean_hashtag, limit, metric=score)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Errore nella ricerca hashtag correlati a '{hashtag}': {str(e)}")
+    
+    not_modified = await conditional_response(
+        request, response, api_key_info,
+        make_etag("related", content_fingerprint(results), clean_hashtag, limit, score),
+        settings.HTTP_CACHE_MAX_AGE
+    )
+    if not_modified is not None:
+        return not_modified
+    
     try:
-        # Pulisci l'hashtag (rimuovi # se presente)
-        clean_hashtag = hashtag.lstrip('#')
-        
-        results = await trend_service.get_related_hashtags(clean_hashtag, limit)
-        
         return RelatedHashtagsResponse(
             hashtag=f"#{clean_hashtag}",
             related_hashtags=results,
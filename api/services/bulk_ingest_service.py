@@ -0,0 +1,270 @@
+import asyncio
+import json
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+from typing_extensions import Annotated, NotRequired, TypedDict
+from pydantic import Field, TypeAdapter, ValidationError
+from api.core.database import execute_query, get_postgres_pool
+from api.core.config import settings
+from api.services.ingestion_service import TrendPointBuffer, TrendRecord, write_trend_records
+
+class TrendObservationRow(TypedDict):
+    """Riga NDJSON accettata dall'endpoint di ingestion bulk"""
+    name: Annotated[str, Field(min_length=1, max_length=255)]
+    volume: Annotated[int, Field(ge=0)]
+    platform: Annotated[str, Field(min_length=1, max_length=50)]
+    country_code: NotRequired[Annotated[str, Field(min_length=1, max_length=10)]]
+    lang: NotRequired[Optional[str]]
+    metadata: NotRequired[Optional[Dict[str, Any]]]
+    time: NotRequired[datetime]
+
+# Un'unica validazione per batch (core pydantic), niente modello per riga
+_rows_adapter = TypeAdapter(List[TrendObservationRow])
+
+class BulkIngestQueueFull(Exception):
+    """Coda di scrittura piena: il client deve riprovare più tardi"""
+
+class BulkIngestUnavailable(Exception):
+    """Writer non attivo (API avviata senza database o in shutdown)"""
+
+def validate_rows(lines: List[Tuple[int, bytes]]) -> Tuple[List[TrendRecord], List[Dict[str, Any]]]:
+    """Valida un batch di righe NDJSON (numero di riga, contenuto).
+    
+    Restituisce i record pronti per la COPY (deduplicati per bucket) e gli
+    errori per riga. Le righe non valide vengono scartate senza invalidare
+    il resto del batch.
+    """
+    errors: List[Dict[str, Any]] = []
+    line_numbers: List[int] = []
+    rows: List[Any] = []
+    for line_number, line in lines:
+        try:
+            rows.append(json.loads(line))
+            line_numbers.append(line_number)
+        except ValueError as e:
+            errors.append({"line": line_number, "error": f"JSON non valido: {e}"})
+    
+    try:
+        valid = _rows_adapter.validate_python(rows)
+    except ValidationError as e:
+        invalid = {}
+        for error in e.errors():
+            index = error["loc"][0]
+            field = ".".join(str(part) for part in error["loc"][1:])
+            invalid.setdefault(index, f"{field}: {error['msg']}" if field else error["msg"])
+        errors.extend({"line": line_numbers[i], "error": msg} for i, msg in sorted(invalid.items()))
+        # Le righe sono indipendenti: il resto del batch è valido
+        valid = _rows_adapter.validate_python([row for i, row in enumerate(rows) if i not in invalid])
+    
+    buffer = TrendPointBuffer()
+    for row in valid:
+        buffer.add(
+            name=row["name"],
+            volume=row["volume"],
+            platform=row["platform"],
+            country_code=row.get("country_code", "global"),
+            time=row.get("time"),
+            lang=row.get("lang"),
+            metadata=row.get("metadata")
+        )
+    return buffer.drain(), sorted(errors, key=lambda error: error["line"])
+
+class BulkIngestQueue:
+    """Coda limitata di batch in attesa di scrittura su `trends`.
+    
+    Un solo writer in background svuota la coda con COPY + upsert
+    (write_trend_records): la memoria occupata è al massimo
+    BULK_INGEST_QUEUE_SIZE batch, indipendentemente dalla dimensione degli upload.
+    
+    Ogni upload è un job in `ingest_jobs`: il writer aggiorna le righe scritte
+    nella stessa transazione del batch e registra quelle fallite, così il
+    client può verificare l'esito con GET /ingest/jobs/{job_id}. Dopo una
+    scrittura fallita la coda rifiuta nuovi batch (503) finché una scrittura
+    non riesce o non passano BULK_INGEST_FAILURE_COOLDOWN secondi.
+    """
+    
+    def __init__(self):
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self.written = 0
+        self.failed = 0
+        self._last_success = 0.0
+        self._last_failure = 0.0
+        self.last_error: Optional[str] = None
+        # Righe fallite non ancora registrate su ingest_jobs (database non raggiungibile)
+        self._pending_failures: Dict[str, int] = {}
+    
+    @property
+    def is_running(self) -> bool:
+        return self._task is not None and not self._task.done()
+    
+    @property
+    def healthy(self) -> bool:
+        """False se l'ultima scrittura è fallita da meno di BULK_INGEST_FAILURE_COOLDOWN secondi"""
+        if self._last_failure <= self._last_success:
+            return True
+        return time.monotonic() - self._last_failure >= settings.BULK_INGEST_FAILURE_COOLDOWN
+    
+    async def create_job(self, api_key: str) -> str:
+        """Registra un nuovo upload (gli errori di database vengono propagati)"""
+        job_id = uuid.uuid4().hex
+        await execute_query(
+            """
+            WITH expired AS (
+                DELETE FROM ingest_jobs WHERE created_at < NOW() - make_interval(days => $3)
+            )
+            INSERT INTO ingest_jobs (id, api_key) VALUES ($1, $2)
+            """,
+            job_id,
+            api_key,
+            settings.BULK_INGEST_JOB_RETENTION_DAYS,
+            fetch="none",
+            raise_on_error=True
+        )
+        return job_id
+    
+    async def finish_job(self, job_id: str, accepted_rows: int, rejected_rows: int, queued_rows: int):
+        """Chiude l'upload: da qui il job è completo quando scritte + fallite = accodate"""
+        try:
+            await execute_query(
+                """
+                UPDATE ingest_jobs
+                SET accepted_rows = $2, rejected_rows = $3, queued_rows = $4, upload_complete = TRUE, updated_at = NOW()
+                WHERE id = $1
+                """,
+                job_id,
+                accepted_rows,
+                rejected_rows,
+                queued_rows,
+                fetch="none",
+                raise_on_error=True
+            )
+        except Exception as e:
+            print(f"Errore aggiornamento job di ingestion {job_id}: {e}")
+    
+    async def get_job(self, job_id: str, api_key: str) -> Optional[Dict[str, Any]]:
+        """Stato del job (None se non esiste o appartiene a un'altra chiave)"""
+        row = await execute_query(
+            "SELECT * FROM ingest_jobs WHERE id = $1 AND api_key = $2",
+            job_id,
+            api_key,
+            fetch="one",
+            raise_on_error=True
+        )
+        if row is None:
+            return None
+        
+        job = dict(row)
+        failed = job["failed_rows"] + self._pending_failures.get(job_id, 0)
+        if not job["upload_complete"]:
+            state = "receiving"
+        elif job["written_rows"] + failed < job["queued_rows"]:
+            state = "writing"
+        elif failed == 0:
+            state = "completed"
+        else:
+            state = "failed" if job["written_rows"] == 0 else "partial"
+        return {
+            "job_id": job_id,
+            "status": state,
+            "accepted_rows": job["accepted_rows"],
+            "rejected_rows": job["rejected_rows"],
+            "queued_rows": job["queued_rows"],
+            "written_rows": job["written_rows"],
+            "failed_rows": failed,
+            "last_error": job["last_error"],
+            "created_at": job["created_at"],
+            "updated_at": job["updated_at"]
+        }
+    
+    async def put(self, job_id: str, records: List[TrendRecord]):
+        """Accoda un batch, attendendo al massimo BULK_INGEST_ENQUEUE_TIMEOUT secondi"""
+        if not self.is_running or not self.healthy:
+            raise BulkIngestUnavailable()
+        try:
+            await asyncio.wait_for(self._queue.put((job_id, records)), timeout=settings.BULK_INGEST_ENQUEUE_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise BulkIngestQueueFull()
+    
+    async def _write(self, job_id: str, records: List[TrendRecord]):
+        try:
+            pool = await get_postgres_pool()
+            async with pool.acquire() as conn:
+                # Righe e contatore del job nella stessa transazione
+                async with conn.transaction():
+                    written = await write_trend_records(conn, records)
+                    await conn.execute(
+                        "UPDATE ingest_jobs SET written_rows = written_rows + $2, updated_at = NOW() WHERE id = $1",
+                        job_id,
+                        written
+                    )
+            self.written += written
+            self._last_success = time.monotonic()
+        except Exception as e:
+            # L'upsert è idempotente: il client può ritrasmettere l'intero file
+            self.failed += len(records)
+            self._last_failure = time.monotonic()
+            self.last_error = str(e)
+            self._pending_failures[job_id] = self._pending_failures.get(job_id, 0) + len(records)
+            print(f"Errore ingestion bulk ({len(records)} righe): {e}")
+    
+    async def _record_failures(self):
+        """Riporta su ingest_jobs le righe fallite (riprova al giro successivo se il database non risponde)"""
+        if not self._pending_failures:
+            return
+        pending, self._pending_failures = self._pending_failures, {}
+        try:
+            await execute_query(
+                """
+                UPDATE ingest_jobs j
+                SET failed_rows = j.failed_rows + f.failed, last_error = $3, updated_at = NOW()
+                FROM unnest($1::text[], $2::int[]) AS f(id, failed)
+                WHERE j.id = f.id
+                """,
+                list(pending),
+                list(pending.values()),
+                self.last_error,
+                fetch="none",
+                raise_on_error=True
+            )
+        except Exception:
+            for job_id, failed in pending.items():
+                self._pending_failures[job_id] = self._pending_failures.get(job_id, 0) + failed
+    
+    async def _run(self):
+        while True:
+            try:
+                job_id, records = await asyncio.wait_for(self._queue.get(), timeout=settings.BULK_INGEST_RETRY_AFTER)
+            except asyncio.TimeoutError:
+                await self._record_failures()
+                continue
+            try:
+                await self._write(job_id, records)
+                await self._record_failures()
+            finally:
+                self._queue.task_done()
+    
+    def start(self):
+        if self._task is None:
+            self._queue = asyncio.Queue(maxsize=settings.BULK_INGEST_QUEUE_SIZE)
+            self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        if self._task is not None:
+            # Scrive i batch già accettati prima dello shutdown
+            try:
+                await asyncio.wait_for(self._queue.join(), timeout=settings.DB_POOL_CLOSE_TIMEOUT)
+            except asyncio.TimeoutError:
+                print(f"⚠️ Ingestion bulk: {self._queue.qsize()} batch non scritti allo shutdown")
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            self._queue = None
+            await self._record_failures()
+
+bulk_ingest_queue = BulkIngestQueue()
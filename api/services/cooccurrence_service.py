@@ -0,0 +1,55 @@
+import asyncio
+from typing import Optional
+from api.core.database import execute_query
+from api.core.config import settings
+
+# Metriche disponibili in hashtag_neighbors
+RELATION_METRICS = ["cooccurrence", "pmi", "jaccard"]
+
+class HashtagNeighborsRefresher:
+    """Aggiorna periodicamente i vicini precalcolati degli hashtag.
+    
+    Il calcolo avviene interamente nel database (refresh_hashtag_neighbors):
+    ad ogni giro vengono ricalcolati solo gli hashtag con nuove relazioni,
+    con un ricalcolo completo ogni RELATED_FULL_REFRESH_INTERVAL secondi
+    (PMI e Jaccard dipendono anche dai conteggi globali).
+    """
+    
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+    
+    async def refresh(self, full: bool = False) -> Optional[int]:
+        return await execute_query(
+            "SELECT refresh_hashtag_neighbors($1, $2)",
+            full,
+            settings.RELATED_TOP_K,
+            fetch="val"
+        )
+    
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        last_full = loop.time()
+        while True:
+            full = loop.time() - last_full >= settings.RELATED_FULL_REFRESH_INTERVAL
+            try:
+                await self.refresh(full=full)
+                if full:
+                    last_full = loop.time()
+            except Exception as e:
+                print(f"Errore refresh hashtag correlati: {e}")
+            await asyncio.sleep(settings.RELATED_REFRESH_INTERVAL)
+    
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+hashtag_neighbors_refresher = HashtagNeighborsRefresher()
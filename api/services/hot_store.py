@@ -0,0 +1,372 @@
+import asyncio
+import json
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from api.core.database import get_postgres_pool
+from api.core.config import settings
+
+HOUR = 3600
+DAY = 24 * HOUR
+
+# Le letture coprono 24 ore; un'ora in più serve per la crescita del bucket più vecchio
+RETENTION_SECONDS = DAY + HOUR
+
+# Riga letta da `trends`: (id, name, volume, platform, country_code, metadata JSON, time)
+HotTrendRow = Tuple[int, str, int, str, str, Optional[str], datetime]
+
+# Primo caricamento: tutta la finestra, a blocchi per id
+LOAD_QUERY = """
+SELECT id, name, volume, platform, country_code, metadata, time
+FROM trends
+WHERE id > $1 AND time >= $2
+ORDER BY id
+LIMIT $3
+"""
+
+# Aggiornamenti: righe inserite o modificate da transazioni non ancora concluse al giro precedente
+# Blocchi in ordine (write_xid, id): stesso ordine dell'indice, piano stabile anche generico
+TAIL_QUERY = """
+SELECT id, name, volume, platform, country_code, metadata, time, write_xid::text as write_xid
+FROM trends
+WHERE (write_xid, id) > ($1::text::xid8, $2) AND time >= $3
+ORDER BY write_xid, id
+LIMIT $4
+"""
+
+# Transazione attiva più vecchia nello snapshot: tutte quelle precedenti sono concluse
+HORIZON_QUERY = "SELECT pg_snapshot_xmin(pg_current_snapshot())::text"
+
+COLUMN_DTYPES = {
+    "id": np.int64,
+    "name": np.int32,
+    "platform": np.int16,
+    "country": np.int16,
+    "volume": np.int64,
+    "time": np.float64
+}
+
+class _Interner:
+    """Stringhe ↔ id interi contigui (per bincount e confronti vettoriali)"""
+    
+    def __init__(self):
+        self.values: List[str] = []
+        self.ids: Dict[str, int] = {}
+    
+    def intern(self, value: str) -> int:
+        value_id = self.ids.get(value)
+        if value_id is None:
+            value_id = self.ids[value] = len(self.values)
+            self.values.append(value)
+        return value_id
+    
+    def __len__(self) -> int:
+        return len(self.values)
+
+class HotTrendStore:
+    """Ultime 24 ore di punti di `trends` in memoria, a colonne NumPy.
+    
+    Hashtag, piattaforme e paesi sono internati in id interi; le letture per
+    piattaforma e per paese sono riduzioni vettoriali (bincount, maximum.at)
+    sulle colonne, con gli stessi risultati delle query SQL che sostituiscono.
+    
+    Ogni giro legge, in uno snapshot REPEATABLE READ, le righe scritte
+    (`trends.write_xid`, anche dagli upsert) da transazioni con id non
+    inferiore all'orizzonte del giro precedente, cioè quelle che allora
+    potevano essere ancora in corso: nessun commit tardivo va perso e i
+    punti già caricati vengono aggiornati. I dati sono quindi indietro al
+    massimo di un giro (HOT_STORE_POLL_INTERVAL); se l'ultimo giro riuscito
+    è più vecchio di HOT_STORE_MAX_STALENESS, `serving` è False e le letture
+    tornano alle query SQL.
+    
+    I risultati sono memorizzati fino al giro di aggiornamento successivo:
+    tra un aggiornamento e l'altro le letture non ricalcolano nulla.
+    """
+    
+    def __init__(self):
+        self._columns = {name: np.empty(0, dtype=dtype) for name, dtype in COLUMN_DTYPES.items()}
+        self._size = 0
+        self.names = _Interner()
+        self.platforms = _Interner()
+        self.countries = _Interner()
+        # Metadati più recenti per (hashtag, piattaforma): (time, JSON)
+        self._metadata: Dict[Tuple[int, int], Tuple[float, Optional[str]]] = {}
+        self._results: Dict[Tuple, List[Dict[str, Any]]] = {}
+        self.max_id = 0
+        # pg_snapshot_xmin del giro precedente (None prima del caricamento iniziale)
+        self.xid_horizon: Optional[int] = None
+        self.ready = False
+        self.last_sync = 0.0
+        self._task: Optional[asyncio.Task] = None
+    
+    def __len__(self) -> int:
+        return self._size
+    
+    @property
+    def serving(self) -> bool:
+        """Pronto e aggiornato di recente: altrimenti le letture usano SQL"""
+        return self.ready and time.monotonic() - self.last_sync <= settings.HOT_STORE_MAX_STALENESS
+    
+    def _column(self, name: str) -> np.ndarray:
+        return self._columns[name][:self._size]
+    
+    def _reserve(self, extra: int):
+        capacity = len(self._columns["id"])
+        if self._size + extra <= capacity:
+            return
+        # Crescita geometrica: append ammortizzato O(1)
+        capacity = max(self._size + extra, capacity * 2, 1024)
+        for name, column in self._columns.items():
+            grown = np.empty(capacity, dtype=column.dtype)
+            grown[:self._size] = column[:self._size]
+            self._columns[name] = grown
+    
+    def append(self, rows: Iterable[HotTrendRow]) -> int:
+        """Aggiunge righe di `trends`; per gli id già presenti aggiorna volume e metadati.
+        
+        Restituisce il numero di punti nuovi.
+        """
+        rows = list(rows)
+        if not rows:
+            return 0
+        
+        ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+        ids, first = np.unique(ids, return_index=True)
+        known = self._column("id")
+        positions = np.flatnonzero(np.isin(known, ids))
+        if positions.size:
+            self._update(positions, {row[0]: row for row in rows})
+        fresh = ~np.isin(ids, known[positions])
+        rows = [rows[i] for i in first[fresh]]
+        if not rows:
+            return 0
+        
+        self._reserve(len(rows))
+        start, end = self._size, self._size + len(rows)
+        columns = self._columns
+        for offset, (row_id, name, volume, platform, country_code, metadata, moment) in enumerate(rows, start):
+            name_id = self.names.intern(name)
+            platform_id = self.platforms.intern(platform)
+            timestamp = moment.timestamp()
+            columns["id"][offset] = row_id
+            columns["name"][offset] = name_id
+            columns["platform"][offset] = platform_id
+            columns["country"][offset] = self.countries.intern(country_code)
+            columns["volume"][offset] = volume
+            columns["time"][offset] = timestamp
+            self._set_metadata(name_id, platform_id, timestamp, metadata)
+        
+        self._size = end
+        self.max_id = max(self.max_id, int(columns["id"][start:end].max()))
+        self._results.clear()
+        return len(rows)
+    
+    def _update(self, positions: np.ndarray, rows_by_id: Dict[int, HotTrendRow]):
+        # Upsert su un punto già caricato: (name, platform, country, time) è la chiave, cambiano volume e metadati
+        columns = self._columns
+        for position in positions.tolist():
+            _, _, volume, _, _, metadata, _ = rows_by_id[int(columns["id"][position])]
+            columns["volume"][position] = volume
+            self._set_metadata(
+                int(columns["name"][position]), int(columns["platform"][position]),
+                float(columns["time"][position]), metadata
+            )
+        self._results.clear()
+    
+    def _set_metadata(self, name_id: int, platform_id: int, timestamp: float, metadata: Optional[str]):
+        latest = self._metadata.get((name_id, platform_id))
+        if latest is None or latest[0] <= timestamp:
+            self._metadata[(name_id, platform_id)] = (timestamp, metadata)
+    
+    def evict(self, now: Optional[float] = None) -> int:
+        """Rimuove i punti fuori finestra (compattazione delle colonne)"""
+        now = time.time() if now is None else now
+        keep = self._column("time") >= now - RETENTION_SECONDS
+        removed = self._size - int(keep.sum())
+        if removed == 0:
+            return 0
+        
+        for name, column in self._columns.items():
+            kept = column[:self._size][keep]
+            column[:len(kept)] = kept
+        self._size -= removed
+        
+        cutoff = now - RETENTION_SECONDS
+        self._metadata = {key: value for key, value in self._metadata.items() if value[0] >= cutoff}
+        self._results.clear()
+        return removed
+    
+    def platform_rows(self, platform: str, limit: int, now: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Come PLATFORM_TRENDS_QUERY: media, massimo e punti per hashtag nelle ultime 24 ore"""
+        key = ("platform", platform, limit) if now is None else None
+        cached = self._results.get(key)
+        if cached is not None:
+            return cached
+        
+        now = time.time() if now is None else now
+        platform_id = self.platforms.ids.get(platform)
+        if platform_id is None:
+            return []
+        
+        mask = (self._column("platform") == platform_id) & (self._column("time") > now - DAY)
+        name_ids = self._column("name")[mask]
+        volumes = self._column("volume")[mask]
+        if name_ids.size == 0:
+            return []
+        
+        total_names = len(self.names)
+        counts = np.bincount(name_ids, minlength=total_names)
+        sums = np.bincount(name_ids, weights=volumes, minlength=total_names)
+        present = np.flatnonzero(counts)
+        # ::int di Postgres arrotonda al più vicino
+        averages = np.floor(sums[present] / counts[present] + 0.5).astype(np.int64)
+        
+        top = self._top(present, averages, limit)
+        maxima = np.full(total_names, np.iinfo(np.int64).min, dtype=np.int64)
+        np.maximum.at(maxima, name_ids, volumes)
+        
+        rows = []
+        for name_id, average in top:
+            _, metadata = self._metadata.get((name_id, platform_id), (None, None))
+            rows.append({
+                "name": self.names.values[name_id],
+                "avg_volume": average,
+                "max_volume": int(maxima[name_id]),
+                "data_points": int(counts[name_id]),
+                "metadata": json.loads(metadata) if metadata else None
+            })
+        if key is not None:
+            self._results[key] = rows
+        return rows
+    
+    def country_rows(self, country_code: str, limit: int, now: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Come la query sui rollup di get_country_trends: volume delle ultime 24 ore orarie,
+        crescita dell'ultima ora di ogni hashtag rispetto alla precedente e piattaforme"""
+        key = ("country", country_code, limit) if now is None else None
+        cached = self._results.get(key)
+        if cached is not None:
+            return cached
+        
+        now = time.time() if now is None else now
+        country_id = self.countries.ids.get(country_code)
+        if country_id is None:
+            return []
+        
+        first_hour = int(now // HOUR) - 23
+        mask = (self._column("country") == country_id) & (self._column("time") >= (first_hour - 1) * HOUR)
+        name_ids = self._column("name")[mask]
+        volumes = self._column("volume")[mask]
+        hours = (self._column("time")[mask] // HOUR).astype(np.int64)
+        platform_ids = self._column("platform")[mask]
+        
+        in_window = hours >= first_hour
+        window_names = name_ids[in_window]
+        if window_names.size == 0:
+            return []
+        
+        total_names = len(self.names)
+        counts = np.bincount(window_names, minlength=total_names)
+        totals = np.bincount(window_names, weights=volumes[in_window], minlength=total_names)
+        present = np.flatnonzero(counts)
+        top = self._top(present, totals[present].astype(np.int64), limit)
+        
+        platform_masks = np.zeros(total_names, dtype=np.int64)
+        np.bitwise_or.at(platform_masks, window_names, np.left_shift(1, platform_ids[in_window].astype(np.int64)))
+        
+        # Crescita: ultima ora con dati di ogni hashtag contro l'ora precedente
+        latest_hour = np.full(total_names, np.iinfo(np.int64).min, dtype=np.int64)
+        np.maximum.at(latest_hour, window_names, hours[in_window])
+        distance = latest_hour[name_ids] - hours
+        latest_volume = np.bincount(name_ids[distance == 0], weights=volumes[distance == 0], minlength=total_names)
+        previous_volume = np.bincount(name_ids[distance == 1], weights=volumes[distance == 1], minlength=total_names)
+        
+        rows = []
+        for name_id, total in top:
+            previous = previous_volume[name_id]
+            platform_mask = int(platform_masks[name_id])
+            rows.append({
+                "name": self.names.values[name_id],
+                "total_volume": total,
+                "growth_percentage": float((latest_volume[name_id] - previous) / previous * 100) if previous else None,
+                "platforms": sorted(
+                    platform for platform_id, platform in enumerate(self.platforms.values)
+                    if platform_mask & (1 << platform_id)
+                )
+            })
+        if key is not None:
+            self._results[key] = rows
+        return rows
+    
+    @staticmethod
+    def _top(name_ids: np.ndarray, values: np.ndarray, limit: int) -> List[Tuple[int, int]]:
+        """Primi `limit` (id, valore) per valore decrescente: selezione O(n) + ordinamento dei soli primi"""
+        if len(values) > limit:
+            selected = np.argpartition(-values, limit - 1)[:limit]
+        else:
+            selected = np.arange(len(values))
+        selected = selected[np.argsort(-values[selected], kind="stable")]
+        return list(zip(name_ids[selected].tolist(), values[selected].tolist()))
+    
+    async def catch_up(self) -> int:
+        """Legge da `trends` le righe nuove o modificate (a blocchi di HOT_STORE_BATCH_ROWS)"""
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=RETENTION_SECONDS)
+        loaded = 0
+        pool = await get_postgres_pool()
+        async with pool.acquire() as conn:
+            # Un solo snapshot per orizzonte e blocchi: nessuna riga tra una lettura e l'altra
+            async with conn.transaction(isolation="repeatable_read", readonly=True):
+                horizon = await conn.fetchval(HORIZON_QUERY)
+                if self.xid_horizon is None:
+                    # Primo caricamento: parte dal primo id della finestra, non dall'inizio della tabella
+                    first_id = await conn.fetchval("SELECT MIN(id) FROM trends WHERE time >= $1", cutoff)
+                    since_id = (first_id or 1) - 1
+                    while True:
+                        batch = await conn.fetch(LOAD_QUERY, since_id, cutoff, settings.HOT_STORE_BATCH_ROWS)
+                        loaded += self.append(tuple(row) for row in batch)
+                        if len(batch) < settings.HOT_STORE_BATCH_ROWS:
+                            break
+                        since_id = batch[-1]["id"]
+                else:
+                    # Da (orizzonte, 0): gli id partono da 1, quindi write_xid >= orizzonte
+                    since_xid, since_id = str(self.xid_horizon), 0
+                    while True:
+                        batch = await conn.fetch(TAIL_QUERY, since_xid, since_id, cutoff, settings.HOT_STORE_BATCH_ROWS)
+                        loaded += self.append(tuple(row)[:7] for row in batch)
+                        if len(batch) < settings.HOT_STORE_BATCH_ROWS:
+                            break
+                        since_xid, since_id = batch[-1]["write_xid"], batch[-1]["id"]
+        
+        self.xid_horizon = int(horizon)
+        self.last_sync = time.monotonic()
+        return loaded
+    
+    async def _run(self):
+        started = time.time()
+        while True:
+            try:
+                await self.catch_up()
+                self.evict()
+                # Anche senza righe nuove la finestra di 24 ore avanza
+                self._results.clear()
+                if not self.ready:
+                    self.ready = True
+                    print(f"🧊 Hot store pronto: {self._size} punti in {time.time() - started:.1f}s")
+            except Exception as e:
+                print(f"⚠️ Aggiornamento hot store fallito: {e}")
+            await asyncio.sleep(settings.HOT_STORE_POLL_INTERVAL)
+    
+    def start(self):
+        if settings.HOT_STORE_ENABLED and self._task is None:
+            self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+hot_trend_store = HotTrendStore()
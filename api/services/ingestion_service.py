@@ -0,0 +1,106 @@
+import json
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from api.services.rollup_service import apply_trend_rollups
+from api.core.config import settings
+
+# Colonne scritte su `trends` (ordine dei record per la COPY)
+TREND_COLUMNS = ["name", "volume", "platform", "country_code", "lang", "metadata", "time"]
+
+# Record pronto per la COPY: (name, volume, platform, country_code, lang, metadata_json, time)
+TrendRecord = Tuple[str, int, str, str, Optional[str], Optional[str], datetime]
+
+def bucket_time(moment: Optional[datetime] = None, bucket_seconds: Optional[int] = None) -> datetime:
+    """Arrotonda un istante all'inizio del suo bucket temporale (UTC)"""
+    bucket_seconds = bucket_seconds or settings.INGESTION_BUCKET_SECONDS
+    moment = moment or datetime.now(timezone.utc)
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    epoch = int(moment.timestamp())
+    return datetime.fromtimestamp(epoch - epoch % bucket_seconds, tz=timezone.utc)
+
+class TrendPointBuffer:
+    """Buffer in memoria dei punti di trend, deduplicati per (name, platform, country, bucket).
+    
+    Un punto ripetuto nello stesso bucket sostituisce il precedente, così il
+    batch scritto contiene una sola riga per chiave (requisito dell'upsert).
+    """
+    
+    def __init__(self, bucket_seconds: Optional[int] = None):
+        self.bucket_seconds = bucket_seconds or settings.INGESTION_BUCKET_SECONDS
+        self._records: Dict[Tuple[str, str, str, datetime], TrendRecord] = {}
+    
+    def add(
+        self,
+        name: str,
+        volume: int,
+        platform: str,
+        country_code: str = "global",
+        time: Optional[datetime] = None,
+        lang: Optional[str] = None,
+        metadata: Optional[Dict[str, Any]] = None
+    ):
+        bucket = bucket_time(time, self.bucket_seconds)
+        country_code = country_code or "global"
+        self._records[(name, platform, country_code, bucket)] = (
+            name,
+            int(volume),
+            platform,
+            country_code,
+            lang,
+            json.dumps(metadata) if metadata else None,
+            bucket
+        )
+    
+    def __len__(self) -> int:
+        return len(self._records)
+    
+    def drain(self) -> List[TrendRecord]:
+        records = list(self._records.values())
+        self._records = {}
+        return records
+
+async def write_trend_records(conn, records: Iterable[TrendRecord], rollups: bool = True) -> int:
+    """Scrive un batch su `trends` con COPY + upsert idempotente e aggiorna i rollup.
+    
+    I record passano da una tabella temporanea di staging e vengono inseriti con
+    ON CONFLICT su (name, platform, country_code, time): riscrivere lo stesso
+    batch lascia il database invariato. Con rollups=False i rollup non vengono
+    toccati (backfill: si ricostruiscono alla fine con rebuild_trend_rollups).
+    """
+    records = list(records)
+    if not records:
+        return 0
+    
+    async with conn.transaction():
+        await conn.execute(
+            """
+            CREATE TEMP TABLE IF NOT EXISTS trends_staging (
+                name TEXT,
+                volume INTEGER,
+                platform TEXT,
+                country_code TEXT,
+                lang TEXT,
+                metadata JSONB,
+                time TIMESTAMPTZ
+            ) ON COMMIT DELETE ROWS
+            """
+        )
+        await conn.copy_records_to_table("trends_staging", records=records, columns=TREND_COLUMNS)
+        await conn.execute(
+            """
+            INSERT INTO trends (name, volume, platform, country_code, lang, metadata, time)
+            SELECT DISTINCT ON (name, platform, country_code, time)
+                name, volume, platform, country_code, lang, metadata, time
+            FROM trends_staging
+            ORDER BY name, platform, country_code, time
+            ON CONFLICT (name, platform, country_code, time) DO UPDATE SET
+                volume = EXCLUDED.volume,
+                lang = COALESCE(EXCLUDED.lang, trends.lang),
+                metadata = COALESCE(EXCLUDED.metadata, trends.metadata)
+            """
+        )
+        if rollups:
+            await apply_trend_rollups(conn, ((r[0], r[1], r[2], r[3], r[6]) for r in records))
+    
+    return len(records)
@@ -0,0 +1,85 @@
+import asyncio
+from typing import Callable, List, Optional
+import asyncpg
+from api.core.database import execute_query, get_asyncpg_url
+from api.core.config import settings
+
+# Canale Postgres (LISTEN/NOTIFY) delle chiavi da togliere dalla cache; payload vuoto = tutte
+CHANNEL = "api_key_invalidated"
+
+class ApiKeyInvalidationListener:
+    """Propaga l'invalidazione delle API key in cache a tutti i worker.
+    
+    Chi disattiva o modifica una chiave pubblica una NOTIFY sul canale
+    CHANNEL; ogni processo resta in LISTEN su una connessione dedicata e
+    rimuove la chiave dalla propria cache. Finché il listener non è connesso
+    le notifiche possono andare perse: `connected` è False (la cache usa un
+    TTL breve) e alla riconnessione l'intera cache viene svuotata.
+    """
+    
+    def __init__(self):
+        self._handlers: List[Callable[[Optional[str]], None]] = []
+        self._task: Optional[asyncio.Task] = None
+        self.connected = False
+    
+    def subscribe(self, handler: Callable[[Optional[str]], None]):
+        """Registra una funzione chiamata con la chiave invalidata (None = tutte)"""
+        self._handlers.append(handler)
+    
+    def _dispatch(self, api_key: Optional[str]):
+        for handler in self._handlers:
+            handler(api_key)
+    
+    async def publish(self, api_key: Optional[str] = None):
+        """Notifica l'invalidazione a tutti i processi in ascolto (questo incluso)"""
+        self._dispatch(api_key)
+        await execute_query("SELECT pg_notify($1, $2)", CHANNEL, api_key or "", fetch="val", raise_on_error=True)
+    
+    def _on_notification(self, connection, pid: int, channel: str, payload: str):
+        self._dispatch(payload or None)
+    
+    async def _listen(self):
+        conn = await asyncpg.connect(get_asyncpg_url())
+        closed = asyncio.Event()
+        try:
+            conn.add_termination_listener(lambda _: closed.set())
+            await conn.add_listener(CHANNEL, self._on_notification)
+            # Le notifiche arrivate mentre eravamo disconnessi sono perse
+            self._dispatch(None)
+            self.connected = True
+            print("🔑 Invalidazione API key tra worker attiva")
+            await closed.wait()
+        finally:
+            self.connected = False
+            if not conn.is_closed():
+                await conn.close()
+    
+    async def _run(self):
+        warned = False
+        while True:
+            try:
+                await self._listen()
+                warned = False
+                print("⚠️ Connessione LISTEN per le API key persa, riconnessione")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if not warned:
+                    print(f"⚠️ Invalidazione API key tra worker non disponibile ({e}), TTL breve per la cache")
+                    warned = True
+            await asyncio.sleep(settings.API_KEY_INVALIDATION_RETRY)
+    
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+api_key_invalidations = ApiKeyInvalidationListener()
@@ -1,7 +1,16 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
+import asyncio
 import random
-from datetime import datetime, timedelta
-from api.core.database import execute_query
+from datetime import datetime
+import numpy as np
+from api.services.platform_services.trend_queries import fetch_platform_trend_rows
+from api.services.platform_services.synthetic import get_universe
+
+# Hashtag in testa all'universo simulato (ranghi 1-10)
+HEAD_HASHTAGS = [
+    "#instagood", "#photooftheday", "#fashion", "#beautiful", "#art",
+    "#photography", "#nature", "#travel", "#fitness", "#food"
+]
 
 class InstagramService:
     def __init__(self):
@@ -10,22 +19,7 @@ class InstagramService:
     async def get_trends_from_db(self, limit: int = 20) -> List[Dict[str, Any]]:
         """Recupera i trend Instagram dal database"""
         
-        query = """
-        SELECT 
-            name,
-            AVG(volume)::int as avg_volume,
-            MAX(volume) as max_volume,
-            COUNT(*) as data_points,
-            metadata
-        FROM trends 
-        WHERE platform = $1 
-        AND time > NOW() - INTERVAL '24 hours'
-        GROUP BY name, metadata
-        ORDER BY avg_volume DESC
-        LIMIT $2
-        """
-        
-        results = await execute_query(query, self.platform, limit)
+        results = await fetch_platform_trend_rows(self.platform, limit)
         
         trends = []
         for idx, row in enumerate(results):
@@ -45,38 +39,36 @@ class InstagramService:
         
         return trends
     
-    async def simulate_real_data(self) -> List[Dict[str, Any]]:
-        """Simula dati realistici per Instagram"""
-        mock_trends = [
-            {"name": "#instagood", "base_volume": 1100000},
-            {"name": "#photooftheday", "base_volume": 900000},
-            {"name": "#fashion", "base_volume": 850000},
-            {"name": "#beautiful", "base_volume": 800000},
-            {"name": "#art", "base_volume": 750000},
-            {"name": "#photography", "base_volume": 700000},
-            {"name": "#nature", "base_volume": 650000},
-            {"name": "#travel", "base_volume": 600000},
-            {"name": "#fitness", "base_volume": 550000},
-            {"name": "#food", "base_volume": 500000}
-        ]
+    async def simulate_real_data(self, limit: int = 20, at: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """Simula dati realistici per Instagram (universo sintetico Zipf, deterministico per seed e istante)"""
+        universe = get_universe(self.platform, HEAD_HASHTAGS)
+        top = await asyncio.to_thread(universe.top, limit, at)
+        volumes = top["volumes"]
+        count = len(volumes)
         
-        trends = []
-        for idx, trend in enumerate(mock_trends):
-            volume_variation = random.uniform(0.85, 1.25)
-            volume = int(trend["base_volume"] * volume_variation)
-            
-            trend_data = {
+        posts_count = (volumes * universe.rng_for(top["bucket"], 1).uniform(2.0, 10.0, count)).astype(np.int64)
+        avg_likes = universe.rng_for(top["bucket"], 2).integers(8000, 35000, count)
+        avg_comments = universe.rng_for(top["bucket"], 3).integers(300, 2000, count)
+        
+        return [
+            {
                 "rank": idx + 1,
-                "name": trend["name"],
+                "name": universe.name(index),
                 "volume": volume,
-                "posts_count": random.randint(2000000, 12000000),
-                "avg_likes": random.randint(8000, 35000),
-                "avg_comments": random.randint(300, 2000),
-                "growth_24h": round(random.uniform(-10.0, 30.0), 1)
+                "posts_count": posts,
+                "avg_likes": likes,
+                "avg_comments": comments,
+                "growth_24h": growth
             }
-            trends.append(trend_data)
-        
-        return trends
+            for idx, (index, volume, posts, likes, comments, growth) in enumerate(zip(
+                top["indices"].tolist(),
+                volumes.tolist(),
+                posts_count.tolist(),
+                avg_likes.tolist(),
+                avg_comments.tolist(),
+                top["growth"].tolist()
+            ))
+        ]
     
     async def get_trends(self, limit: int = 20, use_db: bool = True) -> List[Dict[str, Any]]:
         """Recupera i trend Instagram"""
@@ -85,4 +77,4 @@ class InstagramService:
             if db_trends:
                 return db_trends
         
-        return await self.simulate_real_data()
+        return await self.simulate_real_data(limit)
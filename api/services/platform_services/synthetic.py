@@ -0,0 +1,124 @@
+import threading
+import zlib
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional, Sequence
+import numpy as np
+from api.core.config import settings
+
+# Periodo del ciclo giornaliero dei volumi (secondi)
+DAY_SECONDS = 86400
+
+class SyntheticTrendUniverse:
+    """Universo sintetico di hashtag con volumi Zipf variabili nel tempo.
+    
+    Il volume base dell'hashtag di rango r è `top_volume / r**s`; a questo si
+    sommano un ciclo giornaliero con fase propria per hashtag e un rumore
+    log-normale estratto per bucket temporale. Tutto è calcolato a vettori
+    NumPy sull'intero universo e dipende solo da (seed, scope, bucket):
+    stesso seed e stesso istante producono sempre lo stesso output.
+    
+    I primi ranghi usano `head_names`, gli altri nomi generati (`#trend<rango>`),
+    condivisi tra le piattaforme così che il merge trovi sovrapposizioni.
+    """
+    
+    def __init__(
+        self,
+        scope: str,
+        head_names: Sequence[str] = (),
+        size: Optional[int] = None,
+        seed: Optional[int] = None,
+        top_volume: int = 1_200_000,
+        zipf_exponent: Optional[float] = None,
+        bucket_seconds: Optional[int] = None
+    ):
+        self.scope = scope
+        self.head_names = list(head_names)
+        self.size = size or settings.SIMULATION_UNIVERSE_SIZE
+        self.seed = settings.SIMULATION_SEED if seed is None else seed
+        self.bucket_seconds = bucket_seconds or settings.SIMULATION_BUCKET_SECONDS
+        exponent = zipf_exponent or settings.SIMULATION_ZIPF_EXPONENT
+        
+        # Seed stabile tra processi (hash() di Python è randomizzato)
+        self._scope_key = zlib.crc32(scope.encode())
+        rng = np.random.default_rng([self.seed, self._scope_key])
+        
+        ranks = np.arange(1, self.size + 1, dtype=np.float64)
+        self.base_volume = (top_volume / ranks ** exponent).astype(np.float32)
+        self.phase = rng.uniform(0, 2 * np.pi, self.size).astype(np.float32)
+        self.amplitude = rng.uniform(0.05, 0.35, self.size).astype(np.float32)
+        
+        # Volumi per bucket: corrente e 24 ore prima (per la crescita).
+        # top() gira in asyncio.to_thread: la cache è protetta da un lock
+        self._cache: Dict[int, np.ndarray] = {}
+        self._cache_lock = threading.Lock()
+    
+    def bucket_index(self, at: Optional[datetime] = None) -> int:
+        at = at or datetime.now(timezone.utc)
+        if at.tzinfo is None:
+            at = at.replace(tzinfo=timezone.utc)
+        return int(at.timestamp()) // self.bucket_seconds
+    
+    def rng_for(self, bucket: int, stream: int = 0) -> np.random.Generator:
+        """Generatore deterministico per (seed, scope, bucket, stream)"""
+        return np.random.default_rng([self.seed, self._scope_key, bucket, stream])
+    
+    def volumes_at(self, bucket: int) -> np.ndarray:
+        """Volumi dell'intero universo in un bucket (gli ultimi due bucket restano in cache)"""
+        with self._cache_lock:
+            cached = self._cache.get(bucket)
+        if cached is not None:
+            return cached
+        
+        # Calcolo fuori dal lock: due thread sullo stesso bucket producono gli stessi volumi
+        seconds = bucket * self.bucket_seconds
+        angle = np.float32(2 * np.pi * (seconds % DAY_SECONDS) / DAY_SECONDS)
+        noise = self.rng_for(bucket).lognormal(0.0, 0.1, self.size).astype(np.float32)
+        volumes = self.base_volume * (1 + self.amplitude * np.sin(angle + self.phase)) * noise
+        
+        with self._cache_lock:
+            cached = self._cache.get(bucket)
+            if cached is not None:
+                return cached
+            if len(self._cache) >= 2:
+                self._cache.pop(min(self._cache))
+            self._cache[bucket] = volumes
+        return volumes
+    
+    def name(self, index: int) -> str:
+        if index < len(self.head_names):
+            return self.head_names[index]
+        return f"#trend{index + 1}"
+    
+    def top(self, limit: int, at: Optional[datetime] = None) -> Dict[str, Any]:
+        """Top `limit` hashtag per volume nel bucket di `at`, con crescita sulle 24 ore.
+        
+        Restituisce gli array (indici, volumi, crescita) e il bucket, da cui ogni
+        piattaforma costruisce i propri campi.
+        """
+        bucket = self.bucket_index(at)
+        volumes = self.volumes_at(bucket)
+        limit = min(limit, self.size)
+        
+        # Selezione O(n) con argpartition, ordinamento solo dei primi `limit`
+        indices = np.argpartition(volumes, self.size - limit)[self.size - limit:]
+        indices = indices[np.argsort(-volumes[indices], kind="stable")]
+        current = volumes[indices].astype(np.float64)
+        
+        previous = self.volumes_at(bucket - DAY_SECONDS // self.bucket_seconds)[indices]
+        growth = (current - previous) / previous * 100
+        
+        return {
+            "bucket": bucket,
+            "indices": indices,
+            "volumes": current.astype(np.int64),
+            "growth": np.round(growth, 1)
+        }
+
+# Un universo per scope, condiviso tra le istanze dei servizi
+_universes: Dict[str, SyntheticTrendUniverse] = {}
+
+def get_universe(scope: str, head_names: Sequence[str] = ()) -> SyntheticTrendUniverse:
+    universe = _universes.get(scope)
+    if universe is None:
+        universe = _universes[scope] = SyntheticTrendUniverse(scope, head_names)
+    return universe
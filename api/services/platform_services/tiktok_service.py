@@ -1,9 +1,17 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 import random
-from datetime import datetime, timedelta
-from api.core.database import execute_query
+from datetime import datetime
+import numpy as np
+from api.services.platform_services.trend_queries import fetch_platform_trend_rows
+from api.services.platform_services.synthetic import get_universe
 import asyncio
 
+# Hashtag in testa all'universo simulato (ranghi 1-10)
+HEAD_HASHTAGS = [
+    "#fyp", "#viral", "#dance", "#comedy", "#music",
+    "#trend", "#funny", "#tiktokmademebuyit", "#duet", "#food"
+]
+
 class TikTokService:
     def __init__(self):
         self.platform = "tiktok"
@@ -11,23 +19,7 @@ class TikTokService:
     async def get_trends_from_db(self, limit: int = 20) -> List[Dict[str, Any]]:
         """Recupera i trend TikTok dal database"""
         
-        # Query per i trend delle ultime 24 ore
-        query = """
-        SELECT 
-            name,
-            AVG(volume)::int as avg_volume,
-            MAX(volume) as max_volume,
-            COUNT(*) as data_points,
-            metadata
-        FROM trends 
-        WHERE platform = $1 
-        AND time > NOW() - INTERVAL '24 hours'
-        GROUP BY name, metadata
-        ORDER BY avg_volume DESC
-        LIMIT $2
-        """
-        
-        results = await execute_query(query, self.platform, limit)
+        results = await fetch_platform_trend_rows(self.platform, limit)
         
         trends = []
         for idx, row in enumerate(results):
@@ -47,39 +39,38 @@ class TikTokService:
         
         return trends
     
-    async def simulate_real_data(self) -> List[Dict[str, Any]]:
-        """Simula dati realistici per TikTok"""
-        mock_trends = [
-            {"name": "#fyp", "base_volume": 1200000},
-            {"name": "#viral", "base_volume": 950000},
-            {"name": "#dance", "base_volume": 800000},
-            {"name": "#comedy", "base_volume": 750000},
-            {"name": "#music", "base_volume": 700000},
-            {"name": "#trend", "base_volume": 650000},
-            {"name": "#funny", "base_volume": 600000},
-            {"name": "#tiktokmademebuyit", "base_volume": 550000},
-            {"name": "#duet", "base_volume": 500000},
-            {"name": "#food", "base_volume": 450000}
-        ]
+    async def simulate_real_data(self, limit: int = 20, at: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """Simula dati realistici per TikTok (universo sintetico Zipf, deterministico per seed e istante)"""
+        universe = get_universe(self.platform, HEAD_HASHTAGS)
+        # Calcolo vettoriale sull'intero universo: fuori dall'event loop
+        top = await asyncio.to_thread(universe.top, limit, at)
+        volumes = top["volumes"]
+        count = len(volumes)
         
-        trends = []
-        for idx, trend in enumerate(mock_trends):
-            # Aggiungi variazione casuale realistica
-            volume_variation = random.uniform(0.8, 1.3)
-            volume = int(trend["base_volume"] * volume_variation)
-            
-            trend_data = {
+        # Metadati per hashtag: un generatore per campo, così non dipendono da `limit`
+        videos_count = (volumes * universe.rng_for(top["bucket"], 1).uniform(1.5, 7.0, count)).astype(np.int64)
+        engagement_rate = np.round(universe.rng_for(top["bucket"], 2).uniform(5.5, 14.2, count), 1)
+        hashtag_views = volumes * universe.rng_for(top["bucket"], 3).integers(40, 700, count)
+        
+        return [
+            {
                 "rank": idx + 1,
-                "name": trend["name"],
+                "name": universe.name(index),
                 "volume": volume,
-                "videos_count": random.randint(1000000, 8000000),
-                "engagement_rate": round(random.uniform(5.5, 14.2), 1),
-                "hashtag_views": random.randint(50000000, 800000000),
-                "growth_24h": round(random.uniform(-15.0, 45.0), 1)
+                "videos_count": videos,
+                "engagement_rate": engagement,
+                "hashtag_views": views,
+                "growth_24h": growth
             }
-            trends.append(trend_data)
-        
-        return trends
+            for idx, (index, volume, videos, engagement, views, growth) in enumerate(zip(
+                top["indices"].tolist(),
+                volumes.tolist(),
+                videos_count.tolist(),
+                engagement_rate.tolist(),
+                hashtag_views.tolist(),
+                top["growth"].tolist()
+            ))
+        ]
     
     async def get_trends(self, limit: int = 20, use_db: bool = True) -> List[Dict[str, Any]]:
         """Recupera i trend TikTok"""
@@ -89,4 +80,4 @@ class TikTokService:
                 return db_trends
         
         # Fallback a dati simulati
-        return await self.simulate_real_data()
+        return await self.simulate_real_data(limit)
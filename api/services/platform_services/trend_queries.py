@@ -0,0 +1,74 @@
+import json
+from typing import Any, Dict, List
+from api.core.cache import TTLCache, MISSING
+from api.core.database import execute_query
+from api.core.config import settings
+from api.services.hot_store import hot_trend_store
+
+# Trend delle ultime 24 ore per piattaforma dalla tabella grezza.
+# Un solo passaggio su idx_trends_platform_name_time (platform, name, time DESC):
+# le window function aggregano per hashtag e DISTINCT ON tiene la riga più
+# recente, quindi i metadati più recenti, senza raggruppare sul JSONB.
+PLATFORM_TRENDS_QUERY = """
+SELECT name, avg_volume, max_volume, data_points, metadata
+FROM (
+    SELECT DISTINCT ON (name)
+        name,
+        (AVG(volume) OVER w)::int as avg_volume,
+        MAX(volume) OVER w as max_volume,
+        COUNT(*) OVER w as data_points,
+        metadata
+    FROM trends 
+    WHERE platform = $1 
+    AND time > NOW() - INTERVAL '24 hours'
+    WINDOW w AS (PARTITION BY name ORDER BY time DESC ROWS BETWEEN UNBOUNDED PRECEDING AND UNBOUNDED FOLLOWING)
+    ORDER BY name, time DESC
+) latest
+ORDER BY avg_volume DESC
+LIMIT $2
+"""
+
+# Stessa lettura dall'aggregato continuo trends_hourly (modalità TimescaleDB)
+PLATFORM_TRENDS_TIMESCALE_QUERY = """
+SELECT 
+    name,
+    (SUM(volume_sum) / NULLIF(SUM(data_points), 0))::int as avg_volume,
+    MAX(volume_max) as max_volume,
+    SUM(data_points)::int as data_points,
+    last(metadata, bucket) as metadata
+FROM trends_hourly 
+WHERE platform = $1 
+AND bucket > NOW() - INTERVAL '24 hours'
+GROUP BY name
+ORDER BY avg_volume DESC
+LIMIT $2
+"""
+
+# Righe per piattaforma: si legge sempre PLATFORM_TRENDS_CACHE_ROWS e si taglia a `limit`
+platform_trends_cache = TTLCache(maxsize=16, ttl=settings.PLATFORM_TRENDS_CACHE_TTL)
+
+def _decode_row(row) -> Dict[str, Any]:
+    item = dict(row)
+    # asyncpg restituisce il JSONB come stringa
+    if isinstance(item["metadata"], str):
+        item["metadata"] = json.loads(item["metadata"])
+    return item
+
+async def fetch_platform_trend_rows(platform: str, limit: int) -> List[Dict[str, Any]]:
+    """Righe aggregate (name, avg_volume, max_volume, data_points, metadata) per piattaforma.
+    
+    Gli errori del database vengono propagati: il chiamante deve poter
+    distinguere "nessun dato" da "database non raggiungibile".
+    """
+    if hot_trend_store.serving:
+        return hot_trend_store.platform_rows(platform, limit)
+    
+    rows = platform_trends_cache.get(platform)
+    if rows is MISSING or (len(rows) < limit and len(rows) == settings.PLATFORM_TRENDS_CACHE_ROWS):
+        query = PLATFORM_TRENDS_TIMESCALE_QUERY if settings.TIMESCALE_ENABLED else PLATFORM_TRENDS_QUERY
+        results = await execute_query(query, platform, max(limit, settings.PLATFORM_TRENDS_CACHE_ROWS), raise_on_error=True)
+        rows = [_decode_row(row) for row in results]
+        # Un risultato vuoto non va in cache: i primi dati compaiono subito
+        if rows:
+            platform_trends_cache.set(platform, rows)
+    return rows[:limit]
@@ -0,0 +1,150 @@
+import asyncio
+from datetime import date, datetime
+from typing import Dict, Optional, Tuple
+from api.core.database import execute_query
+from api.core.config import settings
+
+def current_month() -> date:
+    """Primo giorno del mese corrente"""
+    return datetime.now().date().replace(day=1)
+
+class QuotaCounter:
+    """Contatori mensili delle chiamate per API key.
+    
+    Il controllo della quota è O(1): il valore vive in memoria e viene
+    inizializzato dalla riga (api_key, month) di api_usage_monthly. Gli
+    incrementi vengono scritti in blocco dal task di sincronizzazione, che
+    rilegge anche i totali (comprensivi degli altri worker). Periodicamente
+    i contatori vengono riconciliati con api_usage.
+    """
+    
+    def __init__(self):
+        self._counts: Dict[Tuple[str, date], int] = {}
+        self._pending: Dict[Tuple[str, date], int] = {}
+        self._task: Optional[asyncio.Task] = None
+    
+    async def get_usage(self, api_key: str) -> int:
+        """Chiamate del mese corrente per la chiave"""
+        month = current_month()
+        usage = self._counts.get((api_key, month))
+        if usage is not None:
+            return usage
+        
+        try:
+            stored = await execute_query(
+                "SELECT calls FROM api_usage_monthly WHERE api_key = $1 AND month = $2",
+                api_key,
+                month,
+                fetch="val",
+                raise_on_error=True
+            ) or 0
+        except Exception as e:
+            # Come prima: se il conteggio non è disponibile non blocchiamo la richiesta
+            print(f"Errore lettura quota per {api_key[:10]}...: {e}")
+            return 0
+        
+        # Un'altra richiesta potrebbe aver inizializzato il contatore nel frattempo
+        return self._counts.setdefault((api_key, month), stored + self._pending.get((api_key, month), 0))
+    
+    def increment(self, api_key: str, amount: int = 1) -> int:
+        """Registra chiamate per la chiave e restituisce il nuovo totale"""
+        key = (api_key, current_month())
+        self._counts[key] = self._counts.get(key, 0) + amount
+        self._pending[key] = self._pending.get(key, 0) + amount
+        return self._counts[key]
+    
+    async def flush(self):
+        """Scrive gli incrementi pendenti e rilegge i totali aggiornati"""
+        month = current_month()
+        
+        # Scarta i contatori dei mesi passati (già scritti o non più rilevanti)
+        for key in [k for k in self._counts if k[1] != month]:
+            del self._counts[key]
+        
+        pending, self._pending = self._pending, {}
+        if pending:
+            try:
+                await execute_query(
+                    """
+                    INSERT INTO api_usage_monthly (api_key, month, calls)
+                    SELECT * FROM unnest($1::text[], $2::date[], $3::int[])
+                    ON CONFLICT (api_key, month)
+                    DO UPDATE SET calls = api_usage_monthly.calls + EXCLUDED.calls
+                    """,
+                    [k[0] for k in pending],
+                    [k[1] for k in pending],
+                    list(pending.values()),
+                    fetch="none",
+                    raise_on_error=True
+                )
+            except Exception as e:
+                print(f"Errore sincronizzazione quote: {e}")
+                # Rimetti in coda gli incrementi non scritti
+                for key, delta in pending.items():
+                    self._pending[key] = self._pending.get(key, 0) + delta
+                return
+        
+        keys = [k[0] for k in self._counts if k[1] == month]
+        if not keys:
+            return
+        
+        rows = await execute_query(
+            "SELECT api_key, calls FROM api_usage_monthly WHERE month = $1 AND api_key = ANY($2::text[])",
+            month,
+            keys
+        )
+        for row in rows:
+            key = (row['api_key'], month)
+            self._counts[key] = row['calls'] + self._pending.get(key, 0)
+    
+    async def reconcile(self):
+        """Riallinea i contatori del mese con il log api_usage.
+        
+        Usa GREATEST: il contatore viene incrementato prima che la chiamata
+        sia registrata nel log, quindi il log può solo recuperare chiamate
+        mancanti (es. contatori creati a metà mese o incrementi persi).
+        """
+        month = current_month()
+        await execute_query(
+            """
+            INSERT INTO api_usage_monthly (api_key, month, calls)
+            SELECT api_key, $1::date, COUNT(*)::int
+            FROM api_usage
+            WHERE timestamp >= $1::date
+            GROUP BY api_key
+            ON CONFLICT (api_key, month)
+            DO UPDATE SET calls = GREATEST(api_usage_monthly.calls, EXCLUDED.calls)
+            """,
+            month,
+            fetch="none"
+        )
+    
+    async def _run(self):
+        last_reconcile = 0.0
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                if loop.time() - last_reconcile >= settings.QUOTA_RECONCILE_INTERVAL:
+                    await self.reconcile()
+                    last_reconcile = loop.time()
+                await self.flush()
+            except Exception as e:
+                print(f"Errore nel task quote: {e}")
+            await asyncio.sleep(settings.QUOTA_SYNC_INTERVAL)
+    
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        # Ultima scrittura degli incrementi rimasti in memoria
+        await self.flush()
+
+quota_counter = QuotaCounter()
@@ -0,0 +1,73 @@
+import heapq
+from typing import List, Dict, Any, Optional
+
+def normalize_hashtag(name: str) -> str:
+    """Chiave canonica per un hashtag: '#fyp', 'FYP' e ' #Fyp ' coincidono"""
+    return "#" + name.strip().lstrip("#").lower()
+
+def merge_platform_trends(
+    platform_results: Dict[str, List[Dict[str, Any]]],
+    limit: int = 10,
+    weights: Optional[Dict[str, float]] = None
+) -> List[Dict[str, Any]]:
+    """Unisce i trend di N piattaforme e restituisce i primi `limit` per volume.
+    
+    I trend vengono raggruppati per hashtag normalizzato in un dizionario
+    (hash join, O(n) sul totale dei candidati). Il volume combinato è la somma
+    dei volumi pesati per piattaforma, la crescita è la media pesata delle
+    crescite. La selezione dei primi `limit` usa un heap (O(n log limit)).
+    """
+    weights = weights or {}
+    merged: Dict[str, Dict[str, Any]] = {}
+    
+    for platform, trends in platform_results.items():
+        weight = weights.get(platform, 1.0)
+        for trend in trends:
+            key = normalize_hashtag(trend["name"])
+            growth = trend.get("growth_24h", trend.get("growth_percentage", 0.0)) or 0.0
+            
+            entry = merged.get(key)
+            if entry is None:
+                merged[key] = {
+                    "name": trend["name"],
+                    "volume": trend["volume"] * weight,
+                    "platforms": [platform],
+                    "growth_sum": growth * weight,
+                    "weight_sum": weight
+                }
+            else:
+                entry["volume"] += trend["volume"] * weight
+                if platform not in entry["platforms"]:
+                    entry["platforms"].append(platform)
+                entry["growth_sum"] += growth * weight
+                entry["weight_sum"] += weight
+    
+    top = heapq.nlargest(limit, merged.values(), key=lambda t: t["volume"])
+    
+    return [
+        {
+            "rank": idx + 1,
+            "name": trend["name"],
+            "volume": int(trend["volume"]),
+            "growth_percentage": round(trend["growth_sum"] / trend["weight_sum"], 1) if trend["weight_sum"] else 0.0,
+            "platforms": trend["platforms"]
+        }
+        for idx, trend in enumerate(top)
+    ]
+
+def diff_rankings(
+    previous: List[Dict[str, Any]],
+    current: List[Dict[str, Any]]
+) -> Dict[str, List]:
+    """Differenze tra due classifiche: voci nuove o modificate e hashtag usciti.
+    
+    Applicando `upserted` (per nome) e rimuovendo `removed` dalla classifica
+    precedente si ottiene quella corrente.
+    """
+    previous_by_name = {trend["name"]: trend for trend in previous}
+    current_names = {trend["name"] for trend in current}
+    
+    return {
+        "upserted": [trend for trend in current if previous_by_name.get(trend["name"]) != trend],
+        "removed": [name for name in previous_by_name if name not in current_names]
+    }
@@ -0,0 +1,106 @@
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, Tuple, Set
+
+# Punto di trend: (name, volume, platform, country_code, time)
+TrendPoint = Tuple[str, int, str, str, datetime]
+
+def hour_bucket(moment: datetime) -> datetime:
+    """Inizio dell'ora in UTC (i datetime naive sono considerati UTC)"""
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.astimezone(timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+def touched_rollup_keys(points: Iterable[TrendPoint]) -> Set[Tuple[str, str, datetime]]:
+    """Bucket (paese, hashtag, ora) interessati da un batch di punti"""
+    return {
+        (country_code, name, hour_bucket(moment))
+        for name, _, _, country_code, moment in points
+    }
+
+async def lock_rollup_buckets(conn, keys: Set[Tuple[str, str, datetime]]):
+    """Advisory lock di transazione sui bucket toccati e sulle ore successive.
+    
+    Le ore successive sono le righe riscritte dall'aggiornamento della crescita:
+    con tutte le righe scritte protette dal lock, due writer non si attendono
+    mai sui lock di riga di trend_rollups_hourly. L'acquisizione in ordine
+    evita i deadlock tra batch che condividono più bucket.
+    """
+    locked = sorted(keys | {(country, name, bucket + timedelta(hours=1)) for country, name, bucket in keys})
+    await conn.execute(
+        """
+        SELECT pg_advisory_xact_lock(
+            hashtext('trend_rollups_hourly'),
+            hashtext(k.country_code || '|' || k.name || '|' || extract(epoch FROM k.bucket)::bigint)
+        )
+        FROM unnest($1::text[], $2::text[], $3::timestamptz[]) WITH ORDINALITY AS k(country_code, name, bucket, position)
+        ORDER BY k.position
+        """,
+        [k[0] for k in locked],
+        [k[1] for k in locked],
+        [k[2] for k in locked]
+    )
+
+async def apply_trend_rollups(conn, points: Iterable[TrendPoint]) -> int:
+    """Aggiorna trend_rollups_hourly per i bucket toccati da un batch di punti.
+    
+    Da chiamare nella stessa transazione che scrive i punti su `trends`. I
+    bucket vengono ricalcolati dai dati grezzi (lettura su idx_trends_name_time),
+    quindi l'aggiornamento è idempotente anche con upsert e ritrasmissioni.
+    Restituisce il numero di bucket toccati.
+    
+    Due transazioni concorrenti sullo stesso bucket non vedono i punti non
+    ancora confermati dell'altra: senza serializzazione l'ultima a fare commit
+    sovrascriverebbe il rollup con un aggregato incompleto. Per questo ogni
+    bucket scritto viene bloccato con un advisory lock fino al commit, prima
+    del ricalcolo.
+    """
+    keys = touched_rollup_keys(points)
+    if not keys:
+        return 0
+    
+    await lock_rollup_buckets(conn, keys)
+    
+    countries = [k[0] for k in keys]
+    names = [k[1] for k in keys]
+    buckets = [k[2] for k in keys]
+    
+    await conn.execute(
+        """
+        INSERT INTO trend_rollups_hourly (country_code, name, bucket, volume, data_points, platforms)
+        SELECT k.country_code, k.name, k.bucket, SUM(t.volume), COUNT(*), array_agg(DISTINCT t.platform)
+        FROM unnest($1::text[], $2::text[], $3::timestamptz[]) AS k(country_code, name, bucket)
+        JOIN trends t
+            ON t.name = k.name
+            AND t.country_code = k.country_code
+            AND t.time >= k.bucket
+            AND t.time < k.bucket + INTERVAL '1 hour'
+        GROUP BY k.country_code, k.name, k.bucket
+        ON CONFLICT (country_code, name, bucket) DO UPDATE SET
+            volume = EXCLUDED.volume,
+            data_points = EXCLUDED.data_points,
+            platforms = EXCLUDED.platforms
+        """,
+        countries,
+        names,
+        buckets
+    )
+    
+    # Crescita dei bucket toccati e delle ore successive (che dipendono da questi)
+    await conn.execute(
+        """
+        UPDATE trend_rollups_hourly r
+        SET growth_percentage = (r.volume - p.volume)::float / NULLIF(p.volume, 0) * 100
+        FROM unnest($1::text[], $2::text[], $3::timestamptz[]) AS t(country_code, name, bucket)
+        JOIN trend_rollups_hourly p
+            ON p.country_code = t.country_code AND p.name = t.name
+        WHERE r.country_code = t.country_code
+        AND r.name = t.name
+        AND r.bucket IN (t.bucket, t.bucket + INTERVAL '1 hour')
+        AND p.bucket = r.bucket - INTERVAL '1 hour'
+        """,
+        countries,
+        names,
+        buckets
+    )
+    
+    return len(keys)
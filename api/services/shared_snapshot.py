@@ -0,0 +1,204 @@
+import mmap
+import os
+import struct
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:
+    # Non disponibile su Windows: lo store condiviso resta disattivato
+    fcntl = None
+
+# Ordine dei bit nella maschera delle piattaforme (stesso ordine del merge in TrendService)
+PLATFORM_CODES = ("tiktok", "instagram")
+
+# Header del file: magic, formato, capacità (righe per slot), slot attivo, sequenza
+HEADER = struct.Struct("<4sIIIQ")
+HEADER_SIZE = 64
+MAGIC = b"STSN"
+FILE_FORMAT = 1
+
+# Header di ogni slot: versione, created_at (epoch), numero di righe, maschera fonti degradate
+SLOT_HEADER = struct.Struct("<QdII")
+SLOT_HEADER_SIZE = 32
+
+# Una riga per trend, il rank è la posizione nell'array
+ROW_DTYPE = np.dtype([
+    ("name", "S128"),
+    ("volume", "<i8"),
+    ("growth", "<f8"),
+    ("platforms", "<u4")
+])
+
+def _platform_mask(platforms: List[str]) -> int:
+    mask = 0
+    for platform in platforms:
+        mask |= 1 << PLATFORM_CODES.index(platform)
+    return mask
+
+def _platform_list(mask: int) -> List[str]:
+    return [platform for bit, platform in enumerate(PLATFORM_CODES) if mask & (1 << bit)]
+
+class SharedSnapshotStore:
+    """Classifica globale condivisa tra i worker uvicorn tramite un file mmap.
+    
+    Un solo processo (quello che ottiene il lock esclusivo sul file `.lock`)
+    calcola lo snapshot e lo pubblica; gli altri leggono gli array NumPy
+    direttamente dalla memoria condivisa. Se il processo che scrive termina,
+    il lock si libera e il primo worker che lo ottiene prende il suo posto.
+    
+    Il file contiene due slot: la pubblicazione scrive nello slot inattivo e
+    poi cambia l'indice dello slot attivo nell'header (swap atomico). La
+    sequenza nell'header permette ai lettori di scartare una lettura
+    sovrapposta a una pubblicazione e di riprovare.
+    """
+    
+    def __init__(self, path: str, capacity: int):
+        self.path = path
+        self.capacity = capacity
+        self.slot_size = SLOT_HEADER_SIZE + capacity * ROW_DTYPE.itemsize
+        self.file_size = HEADER_SIZE + 2 * self.slot_size
+        self.is_writer = False
+        self._lock_file = None
+        self._map: Optional[mmap.mmap] = None
+    
+    @staticmethod
+    def supported() -> bool:
+        return fcntl is not None
+    
+    def try_acquire_writer(self) -> bool:
+        """Prova a diventare il processo che pubblica (non bloccante)"""
+        if self.is_writer:
+            return True
+        if self._lock_file is None:
+            self._lock_file = open(f"{self.path}.lock", "a+b")
+        try:
+            fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return False
+        
+        self._open(create=True)
+        self.is_writer = True
+        return True
+    
+    def _open(self, create: bool = False) -> bool:
+        if self._map is not None:
+            return True
+        if not create and not os.path.exists(self.path):
+            return False
+        
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            size = os.fstat(fd).st_size
+            if size != self.file_size:
+                if not create:
+                    # File di un'altra configurazione o non ancora inizializzato
+                    return False
+                os.ftruncate(fd, self.file_size)
+            self._map = mmap.mmap(fd, self.file_size)
+        finally:
+            os.close(fd)
+        
+        magic, file_format, capacity, _, _ = HEADER.unpack_from(self._map, 0)
+        if create and (magic != MAGIC or file_format != FILE_FORMAT or capacity != self.capacity):
+            HEADER.pack_into(self._map, 0, MAGIC, FILE_FORMAT, self.capacity, 0, 0)
+        return True
+    
+    def _header(self) -> Tuple[int, int]:
+        magic, file_format, capacity, active, sequence = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or file_format != FILE_FORMAT or capacity != self.capacity:
+            return -1, 0
+        return active, sequence
+    
+    def _slot_offset(self, slot: int) -> int:
+        return HEADER_SIZE + slot * self.slot_size
+    
+    @property
+    def version(self) -> int:
+        """Versione pubblicata (0 se non c'è ancora nulla)"""
+        if not self._open():
+            return 0
+        active, sequence = self._header()
+        if sequence == 0:
+            return 0
+        return SLOT_HEADER.unpack_from(self._map, self._slot_offset(active))[0]
+    
+    def publish(self, trends: List[Dict[str, Any]], version: int, created_at: datetime, degraded_sources: List[str]):
+        """Scrive la classifica nello slot inattivo e lo rende attivo"""
+        if not self.is_writer:
+            raise RuntimeError("Solo il processo con il lock può pubblicare lo snapshot")
+        
+        trends = trends[:self.capacity]
+        rows = np.zeros(len(trends), dtype=ROW_DTYPE)
+        rows["name"] = [trend["name"].encode()[:ROW_DTYPE["name"].itemsize] for trend in trends]
+        rows["volume"] = [trend["volume"] for trend in trends]
+        rows["growth"] = [trend["growth_percentage"] for trend in trends]
+        rows["platforms"] = [_platform_mask(trend["platforms"]) for trend in trends]
+        
+        active, sequence = self._header()
+        target = 1 - active if active in (0, 1) else 0
+        offset = self._slot_offset(target)
+        SLOT_HEADER.pack_into(
+            self._map, offset,
+            version, created_at.timestamp(), len(trends), _platform_mask(degraded_sources)
+        )
+        start = offset + SLOT_HEADER_SIZE
+        self._map[start:start + rows.nbytes] = rows.tobytes()
+        
+        # Swap: da qui in poi i lettori vedono il nuovo slot
+        HEADER.pack_into(self._map, 0, MAGIC, FILE_FORMAT, self.capacity, target, sequence + 1)
+    
+    def read(self, newer_than: int = 0) -> Optional[Tuple[int, datetime, List[Dict[str, Any]], List[str]]]:
+        """Ultima classifica pubblicata se più recente di `newer_than`.
+        
+        Restituisce (versione, created_at, trend, fonti degradate) oppure None.
+        """
+        if not self._open():
+            return None
+        
+        for _ in range(3):
+            active, sequence = self._header()
+            if sequence == 0 or active not in (0, 1):
+                return None
+            offset = self._slot_offset(active)
+            version, created_at, count, degraded = SLOT_HEADER.unpack_from(self._map, offset)
+            if version <= newer_than:
+                return None
+            
+            # Vista zero-copy sugli array nel file condiviso
+            rows = np.frombuffer(self._map, dtype=ROW_DTYPE, count=count, offset=offset + SLOT_HEADER_SIZE)
+            trends = [
+                {
+                    "rank": idx + 1,
+                    "name": name.decode(errors="ignore"),
+                    "volume": volume,
+                    "growth_percentage": growth,
+                    "platforms": _platform_list(mask)
+                }
+                for idx, (name, volume, growth, mask) in enumerate(zip(
+                    rows["name"].tolist(), rows["volume"].tolist(), rows["growth"].tolist(), rows["platforms"].tolist()
+                ))
+            ]
+            del rows
+            
+            # Pubblicazione avvenuta durante la lettura: lo slot potrebbe essere stato riscritto
+            if self._header()[1] != sequence:
+                continue
+            return version, datetime.fromtimestamp(created_at, timezone.utc), trends, _platform_list(degraded)
+        return None
+    
+    def close(self):
+        if self._map is not None:
+            try:
+                self._map.close()
+            except BufferError:
+                # Una vista NumPy è ancora viva: il mapping si chiude con il processo
+                pass
+            self._map = None
+        if self._lock_file is not None:
+            # Chiudere il file rilascia il lock: un altro worker può pubblicare
+            self._lock_file.close()
+            self._lock_file = None
+        self.is_writer = False
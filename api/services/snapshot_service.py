@@ -0,0 +1,261 @@
+import asyncio
+import gzip
+import hashlib
+import json
+import os
+import time
+from datetime import datetime, timezone
+from typing import List, Dict, Any, Optional
+from api.services.trend_service import TrendService
+from api.services.shared_snapshot import SharedSnapshotStore
+from api.core.config import settings
+
+class TrendSnapshot:
+    """Classifica globale calcolata in un certo istante (immutabile)"""
+    
+    def __init__(
+        self,
+        trends: List[Dict[str, Any]],
+        version: int,
+        created_at: Optional[datetime] = None,
+        degraded_sources: Optional[List[str]] = None
+    ):
+        self.trends = trends
+        self.version = version
+        self.degraded_sources = degraded_sources or []
+        self.created_at = created_at or datetime.now(timezone.utc)
+        self._fingerprint: Optional[str] = None
+    
+    @property
+    def age_seconds(self) -> float:
+        return max(0.0, (datetime.now(timezone.utc) - self.created_at).total_seconds())
+    
+    @property
+    def fingerprint(self) -> str:
+        """Hash del contenuto (trend e fonti degradate), uguale in ogni processo.
+        
+        A differenza di `version`, che riparte da 1 a ogni avvio e può differire
+        tra worker, identifica i dati: adatto per gli ETag.
+        """
+        if self._fingerprint is None:
+            content = json.dumps([self.trends, self.degraded_sources], sort_keys=True, default=str, separators=(",", ":"))
+            self._fingerprint = hashlib.blake2b(content.encode(), digest_size=16).hexdigest()
+        return self._fingerprint
+
+# Formato del file su disco: cambiarlo invalida i file scritti dalle versioni precedenti
+SNAPSHOT_FILE_FORMAT = 1
+
+def save_snapshot(path: str, snapshot: TrendSnapshot):
+    """Scrive lo snapshot come JSON compresso, in modo atomico (file temporaneo + rename)"""
+    payload = {
+        "format": SNAPSHOT_FILE_FORMAT,
+        "version": snapshot.version,
+        "created_at": snapshot.created_at.isoformat(),
+        "degraded_sources": snapshot.degraded_sources,
+        "trends": snapshot.trends
+    }
+    data = gzip.compress(json.dumps(payload, default=str, separators=(",", ":")).encode(), compresslevel=6)
+    
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+def load_snapshot(path: str) -> Optional[TrendSnapshot]:
+    """Legge uno snapshot salvato con save_snapshot (None se assente o in un formato diverso)"""
+    try:
+        with open(path, "rb") as f:
+            payload = json.loads(gzip.decompress(f.read()))
+    except FileNotFoundError:
+        return None
+    if payload.get("format") != SNAPSHOT_FILE_FORMAT:
+        return None
+    return TrendSnapshot(
+        payload["trends"],
+        payload["version"],
+        created_at=datetime.fromisoformat(payload["created_at"]),
+        degraded_sources=payload["degraded_sources"]
+    )
+
+class TrendSnapshotService:
+    """Snapshot dei trend globali aggiornato in background.
+    
+    Le richieste leggono sempre l'ultimo snapshot valido; se un refresh
+    fallisce continua ad essere servito quello precedente (stale-while-revalidate)
+    con la sua età esposta nella risposta.
+    
+    Lo snapshot viene anche salvato su disco (SNAPSHOT_PERSIST_PATH): dopo un
+    riavvio l'ultima classifica è servita subito, con la sua età originale,
+    finché il primo refresh non la sostituisce.
+    
+    Con SHARED_SNAPSHOT_ENABLED solo un worker ricalcola e pubblica lo snapshot
+    (SharedSnapshotStore); gli altri lo leggono dalla memoria condivisa.
+    """
+    
+    def __init__(self, trend_service: TrendService):
+        self.trend_service = trend_service
+        self.snapshot: Optional[TrendSnapshot] = None
+        self.last_error: Optional[str] = None
+        self.last_refresh_attempt: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+        self._refresh_lock: Optional[asyncio.Lock] = None
+        self._updated: Optional[asyncio.Event] = None
+        self.restored_from_disk = False
+        self._last_persist: Optional[float] = None
+        self.shared: Optional[SharedSnapshotStore] = None
+    
+    @property
+    def is_stale(self) -> bool:
+        """True se l'ultimo refresh è fallito o lo snapshot è più vecchio di due intervalli"""
+        if self.snapshot is None:
+            return True
+        return self.last_error is not None or self.snapshot.age_seconds > 2 * settings.SNAPSHOT_REFRESH_INTERVAL
+    
+    def _lock(self) -> asyncio.Lock:
+        if self._refresh_lock is None:
+            self._refresh_lock = asyncio.Lock()
+        return self._refresh_lock
+    
+    async def _refresh_locked(self):
+        self.last_refresh_attempt = time.monotonic()
+        try:
+            trends, degraded_sources = await self.trend_service.get_global_trends_with_status(
+                limit=settings.SNAPSHOT_MAX_TRENDS
+            )
+            version = self.snapshot.version + 1 if self.snapshot else 1
+            if self.shared is not None and self.shared.is_writer:
+                # Dopo un cambio di processo che scrive la numerazione prosegue
+                version = max(version, self.shared.version + 1)
+            self.snapshot = TrendSnapshot(trends, version, degraded_sources=degraded_sources)
+            self.restored_from_disk = False
+            self.last_error = None
+            if self.shared is not None and self.shared.is_writer:
+                self.shared.publish(trends, version, self.snapshot.created_at, degraded_sources)
+            self._notify()
+        except Exception as e:
+            self.last_error = str(e)
+            print(f"⚠️ Refresh snapshot trend fallito, servo l'ultimo valido: {e}")
+    
+    def _notify(self):
+        # Sveglia chi attende e prepara l'evento per il prossimo snapshot
+        if self._updated is not None:
+            self._updated.set()
+        self._updated = asyncio.Event()
+    
+    async def wait_for_update(self, version: int, timeout: Optional[float] = None) -> Optional[TrendSnapshot]:
+        """Attende uno snapshot con versione maggiore di `version` (None allo scadere del timeout)"""
+        if self._updated is None:
+            self._updated = asyncio.Event()
+        while self.snapshot is None or self.snapshot.version <= version:
+            try:
+                await asyncio.wait_for(self._updated.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                return None
+        return self.snapshot
+    
+    async def refresh(self) -> Optional[TrendSnapshot]:
+        """Ricalcola la classifica; in caso di errore mantiene lo snapshot precedente"""
+        async with self._lock():
+            await self._refresh_locked()
+        return self.snapshot
+    
+    def _load_shared(self) -> bool:
+        """Adotta lo snapshot pubblicato da un altro worker, se più recente"""
+        try:
+            published = self.shared.read(newer_than=self.snapshot.version if self.snapshot else 0)
+        except Exception as e:
+            print(f"⚠️ Lettura snapshot condiviso fallita: {e}")
+            return False
+        if published is None:
+            return False
+        
+        version, created_at, trends, degraded_sources = published
+        self.snapshot = TrendSnapshot(trends, version, created_at=created_at, degraded_sources=degraded_sources)
+        self.restored_from_disk = False
+        self.last_error = None
+        self._notify()
+        return True
+    
+    async def get_snapshot(self) -> TrendSnapshot:
+        """Ultimo snapshot disponibile (calcolato al volo solo se non ne esiste ancora uno)"""
+        if self.snapshot is None and self.shared is not None:
+            self._load_shared()
+        if self.snapshot is None:
+            async with self._lock():
+                # Un refresh concorrente potrebbe averlo già prodotto
+                if self.snapshot is None:
+                    await self._refresh_locked()
+        if self.snapshot is None:
+            raise RuntimeError(f"Nessuno snapshot dei trend disponibile: {self.last_error}")
+        return self.snapshot
+    
+    def load_persisted(self) -> bool:
+        """Carica lo snapshot salvato su disco (chiamato all'avvio, prima del pool DB)"""
+        if not settings.SNAPSHOT_PERSIST_PATH or self.snapshot is not None:
+            return False
+        try:
+            snapshot = load_snapshot(settings.SNAPSHOT_PERSIST_PATH)
+        except Exception as e:
+            print(f"⚠️ Snapshot su disco non leggibile, ignorato: {e}")
+            return False
+        if snapshot is None or snapshot.age_seconds > settings.SNAPSHOT_PERSIST_MAX_AGE:
+            return False
+        
+        self.snapshot = snapshot
+        self.restored_from_disk = True
+        print(f"💾 Snapshot v{snapshot.version} caricato da disco ({snapshot.age_seconds:.0f}s fa, {len(snapshot.trends)} trend)")
+        return True
+    
+    async def persist(self, force: bool = False):
+        """Salva lo snapshot corrente su disco (al massimo ogni SNAPSHOT_PERSIST_INTERVAL secondi)"""
+        snapshot = self.snapshot
+        if not settings.SNAPSHOT_PERSIST_PATH or snapshot is None:
+            return
+        if self.shared is not None and not self.shared.is_writer:
+            # Salva solo il worker che calcola lo snapshot
+            return
+        now = time.monotonic()
+        if not force and self._last_persist is not None and now - self._last_persist < settings.SNAPSHOT_PERSIST_INTERVAL:
+            return
+        try:
+            await asyncio.to_thread(save_snapshot, settings.SNAPSHOT_PERSIST_PATH, snapshot)
+            self._last_persist = now
+        except Exception as e:
+            print(f"⚠️ Salvataggio snapshot su disco fallito: {e}")
+    
+    async def _run(self):
+        while True:
+            # Senza store condiviso ogni processo ricalcola; con lo store solo chi ha il lock
+            if self.shared is None or self.shared.try_acquire_writer():
+                await self.refresh()
+                await self.persist()
+                await asyncio.sleep(settings.SNAPSHOT_REFRESH_INTERVAL)
+            else:
+                self._load_shared()
+                await asyncio.sleep(settings.SHARED_SNAPSHOT_POLL_INTERVAL)
+    
+    def start(self):
+        if settings.SHARED_SNAPSHOT_ENABLED and self.shared is None:
+            if SharedSnapshotStore.supported():
+                self.shared = SharedSnapshotStore(settings.SHARED_SNAPSHOT_PATH, settings.SNAPSHOT_MAX_TRENDS)
+            else:
+                print("⚠️ Snapshot condiviso non supportato su questa piattaforma, ogni worker calcola il proprio")
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.persist(force=True)
+        if self.shared is not None:
+            self.shared.close()
+            self.shared = None
+
+trend_snapshots = TrendSnapshotService(TrendService())
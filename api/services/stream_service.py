@@ -0,0 +1,128 @@
+import asyncio
+import json
+from typing import Any, Dict, Optional, Set
+from api.services.snapshot_service import TrendSnapshotService, TrendSnapshot, trend_snapshots
+from api.services.ranking import diff_rankings
+from api.core.config import settings
+
+class StreamCapacityExceeded(Exception):
+    """Numero massimo di connessioni di streaming raggiunto"""
+
+def format_sse(event: Optional[str], data: Dict[str, Any], event_id: Optional[int] = None) -> bytes:
+    """Messaggio Server-Sent Events già serializzato"""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    if event:
+        lines.append(f"event: {event}")
+    lines.append("data: " + json.dumps(data, default=str, separators=(",", ":")))
+    return ("\n".join(lines) + "\n\n").encode()
+
+KEEPALIVE_MESSAGE = b": keepalive\n\n"
+
+class TrendStreamHub:
+    """Diffusione delle variazioni di classifica a tutti i client in streaming.
+    
+    Un solo produttore attende i nuovi snapshot, calcola il diff una volta e
+    lo serializza una volta; ai subscriber arrivano gli stessi byte tramite
+    code limitate. Un client troppo lento non blocca gli altri: la sua coda
+    viene svuotata e riceve di nuovo la classifica completa.
+    """
+    
+    def __init__(self, snapshots: TrendSnapshotService):
+        self.snapshots = snapshots
+        self.version: Optional[int] = None
+        self._snapshot_message: Optional[bytes] = None
+        self._subscribers: Set[asyncio.Queue] = set()
+        self._task: Optional[asyncio.Task] = None
+        self.resyncs = 0
+    
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+    
+    def subscribe(self) -> asyncio.Queue:
+        if len(self._subscribers) >= settings.STREAM_MAX_SUBSCRIBERS:
+            raise StreamCapacityExceeded()
+        queue = asyncio.Queue(maxsize=settings.STREAM_QUEUE_SIZE)
+        self._subscribers.add(queue)
+        return queue
+    
+    def unsubscribe(self, queue: asyncio.Queue):
+        self._subscribers.discard(queue)
+    
+    def snapshot_message(self) -> Optional[bytes]:
+        """Classifica completa dell'ultima versione (primo messaggio di ogni connessione)"""
+        return self._snapshot_message
+    
+    def _set_snapshot(self, snapshot: TrendSnapshot):
+        self.version = snapshot.version
+        self._snapshot_message = format_sse(
+            "snapshot",
+            {"version": snapshot.version, "created_at": snapshot.created_at, "trends": snapshot.trends},
+            snapshot.version
+        )
+    
+    def _publish(self, message: bytes):
+        for queue in list(self._subscribers):
+            try:
+                queue.put_nowait(message)
+            except asyncio.QueueFull:
+                # Client in ritardo: scarta i diff in coda e riparte dalla classifica completa
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(self._snapshot_message)
+                self.resyncs += 1
+    
+    async def _run(self):
+        snapshot = None
+        while snapshot is None:
+            try:
+                snapshot = await self.snapshots.get_snapshot()
+            except RuntimeError:
+                await asyncio.sleep(settings.STREAM_KEEPALIVE_INTERVAL)
+        self._set_snapshot(snapshot)
+        # Client connessi prima del primo snapshot
+        self._publish(self._snapshot_message)
+        
+        # `snapshot` è l'ultima versione pubblicata: base di ogni diff
+        seen_version = snapshot.version
+        while True:
+            current = await self.snapshots.wait_for_update(seen_version, timeout=settings.STREAM_KEEPALIVE_INTERVAL)
+            if current is None:
+                # Nessun cambiamento: commento SSE per tenere aperte le connessioni (proxy, load balancer)
+                self._publish(KEEPALIVE_MESSAGE)
+                continue
+            
+            seen_version = current.version
+            diff = diff_rankings(snapshot.trends, current.trends)
+            if not diff["upserted"] and not diff["removed"]:
+                continue
+            
+            self._set_snapshot(current)
+            self._publish(format_sse(
+                "diff",
+                {"version": current.version, "base_version": snapshot.version, **diff},
+                current.version
+            ))
+            snapshot = current
+    
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        # Chiude gli stream aperti (None = fine stream)
+        for queue in list(self._subscribers):
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait(None)
+
+trend_stream_hub = TrendStreamHub(trend_snapshots)
@@ -1,94 +1,167 @@
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 from datetime import datetime, timedelta
+import asyncio
 from api.services.platform_services.tiktok_service import TikTokService
 from api.services.platform_services.instagram_service import InstagramService
 from api.core.database import execute_query
+from api.core.config import settings
+from api.core.cache import TieredCache
+from api.services.hot_store import hot_trend_store
+from api.services.ranking import merge_platform_trends
+
+def escape_like(value: str) -> str:
+    """Escape dei caratteri speciali di LIKE/ILIKE"""
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+# Analisi keyword dall'aggregato continuo mentions_hourly (modalità TimescaleDB).
+# La finestra è arrotondata all'ora: include l'intera ora di partenza.
+KEYWORD_ANALYSIS_TIMESCALE_QUERY = """
+SELECT 
+    k.idx,
+    GROUPING(m.platform) = 1 as is_timeline,
+    m.platform,
+    m.bucket as hour,
+    SUM(m.volume_sum)::bigint as volume,
+    SUM(m.sentiment_sum) / NULLIF(SUM(m.sentiment_points), 0) as avg_sentiment
+FROM unnest($1::text[]) WITH ORDINALITY AS k(pattern, idx)
+JOIN mentions_hourly m ON m.keyword ILIKE k.pattern
+WHERE m.bucket >= date_trunc('hour', $2::timestamptz)
+GROUP BY GROUPING SETS ((k.idx, m.platform), (k.idx, m.bucket))
+ORDER BY k.idx, is_timeline, hour
+"""
+
+# Multiplier per simulare la popolarità nei diversi paesi (fallback senza dati per paese)
+COUNTRY_MULTIPLIERS = {
+    'US': 1.0,    # USA = baseline
+    'GB': 0.35,   # Regno Unito
+    'CA': 0.12,   # Canada  
+    'AU': 0.08,   # Australia
+    'IT': 0.20,   # Italia
+    'FR': 0.25,   # Francia
+    'DE': 0.28,   # Germania
+    'ES': 0.18,   # Spagna
+    'NL': 0.06,   # Olanda
+    'SE': 0.04,   # Svezia
+    'BR': 0.15,   # Brasile
+    'MX': 0.10,   # Messico
+    'JP': 0.30,   # Giappone
+    'KR': 0.15,   # Corea del Sud
+    'IN': 0.45,   # India
+    'SG': 0.03,   # Singapore
+}
+
+# Cache condivisa dei risultati (L1 per processo, L2 Redis tra i worker se abilitata)
+trend_cache = TieredCache(
+    "trends",
+    maxsize=settings.TREND_CACHE_MAX_ENTRIES,
+    redis_url=settings.TREND_CACHE_REDIS_URL if settings.TREND_CACHE_REDIS_ENABLED else None,
+    redis_timeout=settings.TREND_CACHE_REDIS_TIMEOUT
+)
 
 class TrendService:
     def __init__(self):
         self.tiktok_service = TikTokService()
         self.instagram_service = InstagramService()
+        self.platform_services = {
+            "tiktok": self.tiktok_service,
+            "instagram": self.instagram_service
+        }
+        # Ultimo risultato valido per (piattaforma, limit) (usato se la piattaforma è lenta o in errore)
+        self._last_platform_results: Dict[Tuple[str, int], List[Dict[str, Any]]] = {}
     
-    async def get_global_trends(self, limit: int = 10) -> List[Dict[str, Any]]:
-        """Combina trend da tutte le piattaforme"""
+    async def _fetch_platform(self, platform: str, limit: int) -> Tuple[List[Dict[str, Any]], bool]:
+        """Recupera i trend di una piattaforma entro la sua deadline.
         
-        # Per ora usiamo solo dati simulati
-        tiktok_trends = await self.tiktok_service.get_trends(limit=limit, use_db=False)
-        instagram_trends = await self.instagram_service.get_trends(limit=limit, use_db=False)
+        Restituisce (trend, degradato): in caso di timeout o errore (anche
+        del database) usa l'ultimo risultato valido in memoria con lo stesso
+        limit.
+        """
+        service = self.platform_services[platform]
+        try:
+            trends = await asyncio.wait_for(
+                service.get_trends(limit=limit, use_db=settings.TRENDS_USE_DB),
+                timeout=settings.PLATFORM_FETCH_TIMEOUT
+            )
+            self._last_platform_results[(platform, limit)] = trends
+            return trends, False
+        except asyncio.TimeoutError:
+            print(f"⚠️ Timeout recupero trend {platform} ({settings.PLATFORM_FETCH_TIMEOUT}s), uso ultimo risultato")
+        except Exception as e:
+            print(f"⚠️ Errore recupero trend {platform}: {e}, uso ultimo risultato")
+        return self._last_platform_results.get((platform, limit), []), True
+    
+    async def fetch_platform_trends(self, limit: int = 10) -> Tuple[Dict[str, List[Dict[str, Any]]], List[str]]:
+        """Interroga tutte le piattaforme in parallelo.
         
-        # Combina e normalizza
-        all_trends = []
+        Restituisce i risultati per piattaforma e l'elenco delle fonti degradate.
+        """
+        platforms = list(self.platform_services)
+        results = await asyncio.gather(*(self._fetch_platform(p, limit) for p in platforms))
         
-        # Aggiungi trend TikTok
-        for trend in tiktok_trends:
-            all_trends.append({
-                "name": trend["name"],
-                "volume": trend["volume"],
-                "platforms": ["tiktok"],
-                "growth_percentage": trend.get("growth_24h", 0.0)
-            })
+        platform_results = {}
+        degraded_sources = []
+        for platform, (trends, degraded) in zip(platforms, results):
+            platform_results[platform] = trends
+            if degraded:
+                degraded_sources.append(platform)
         
-        # Aggiungi trend Instagram
-        for trend in instagram_trends:
-            # Cerca se questo trend esiste già (stesso hashtag da TikTok)
-            existing = next((t for t in all_trends if t["name"] == trend["name"]), None)
-            
-            if existing:
-                # Combina i dati
-                existing["volume"] += trend["volume"]
-                existing["platforms"].append("instagram")
-                existing["growth_percentage"] = (existing["growth_percentage"] + trend.get("growth_24h", 0.0)) / 2
-            else:
-                all_trends.append({
-                    "name": trend["name"],
-                    "volume": trend["volume"],
-                    "platforms": ["instagram"],
-                    "growth_percentage": trend.get("growth_24h", 0.0)
-                })
-        
-        # Ordina per volume totale
-        all_trends.sort(key=lambda x: x["volume"], reverse=True)
-        
-        # Aggiungi rank e limita i risultati
-        final_trends = []
-        for idx, trend in enumerate(all_trends[:limit]):
-            final_trends.append({
-                "rank": idx + 1,
-                "name": trend["name"],
-                "volume": trend["volume"],
-                "growth_percentage": round(trend["growth_percentage"], 1),
-                "platforms": trend["platforms"]
-            })
+        return platform_results, degraded_sources
+    
+    async def get_global_trends_with_status(self, limit: int = 10) -> Tuple[List[Dict[str, Any]], List[str]]:
+        """Classifica globale e fonti degradate"""
+        platform_results, degraded_sources = await self.fetch_platform_trends(limit)
         
-        return final_trends
+        trends = merge_platform_trends(
+            platform_results,
+            limit=limit,
+            weights=settings.PLATFORM_WEIGHTS
+        )
+        return trends, degraded_sources
     
+    @trend_cache.cached("global", ttl=settings.TREND_CACHE_TTL_GLOBAL)
+    async def get_global_trends(self, limit: int = 10) -> List[Dict[str, Any]]:
+        """Combina trend da tutte le piattaforme"""
+        trends, _ = await self.get_global_trends_with_status(limit)
+        return trends
+    
+    @trend_cache.cached("country", ttl=settings.TREND_CACHE_TTL_COUNTRY)
     async def get_country_trends(self, country_code: str, limit: int = 10) -> List[Dict[str, Any]]:
         """Recupera trend per paese specifico con fallback intelligente"""
         
-        # Prima prova a cercare trend specifici per paese nel database
+        # Prima prova a leggere i trend del paese dai rollup orari (ultime 24 ore)
         query = """
+        WITH top AS (
+            SELECT 
+                name,
+                SUM(volume)::bigint as total_volume,
+                (array_agg(growth_percentage ORDER BY bucket DESC))[1] as growth_percentage
+            FROM trend_rollups_hourly 
+            WHERE country_code = $1 
+            AND bucket >= date_trunc('hour', NOW()) - INTERVAL '23 hours'
+            GROUP BY name
+            ORDER BY total_volume DESC
+            LIMIT $2
+        )
         SELECT 
-            name,
-            SUM(volume) as total_volume,
-            array_agg(DISTINCT platform) as platforms,
-            AVG(
-                CASE 
-                    WHEN LAG(volume) OVER (PARTITION BY name ORDER BY time) IS NOT NULL 
-                    THEN ((volume - LAG(volume) OVER (PARTITION BY name ORDER BY time))::float / 
-                          NULLIF(LAG(volume) OVER (PARTITION BY name ORDER BY time), 0)) * 100
-                    ELSE 0 
-                END
-            ) as growth_percentage
-        FROM trends 
-        WHERE country_code = $1 
-        AND time > NOW() - INTERVAL '24 hours'
-        GROUP BY name
-        ORDER BY total_volume DESC
-        LIMIT $2
+            top.name,
+            top.total_volume,
+            top.growth_percentage,
+            ARRAY(
+                SELECT DISTINCT p
+                FROM trend_rollups_hourly r, unnest(r.platforms) p
+                WHERE r.country_code = $1
+                AND r.name = top.name
+                AND r.bucket >= date_trunc('hour', NOW()) - INTERVAL '23 hours'
+            ) as platforms
+        FROM top
+        ORDER BY top.total_volume DESC
         """
         
         try:
-            results = await execute_query(query, country_code.upper(), limit, fetch="all")
+            if hot_trend_store.serving:
+                results = hot_trend_store.country_rows(country_code.upper(), limit)
+            else:
+                results = await execute_query(query, country_code.upper(), limit, fetch="all")
         except:
             # Se la query fallisce (tabella non esiste, ecc.), usa fallback
             results = []
@@ -97,27 +170,7 @@ class TrendService:
         if not results or len(results) == 0:
             global_trends = await self.get_global_trends(limit)
             
-            # Multiplier per simulare la popolarità nei diversi paesi
-            country_multipliers = {
-                'US': 1.0,    # USA = baseline
-                'GB': 0.35,   # Regno Unito
-                'CA': 0.12,   # Canada  
-                'AU': 0.08,   # Australia
-                'IT': 0.20,   # Italia
-                'FR': 0.25,   # Francia
-                'DE': 0.28,   # Germania
-                'ES': 0.18,   # Spagna
-                'NL': 0.06,   # Olanda
-                'SE': 0.04,   # Svezia
-                'BR': 0.15,   # Brasile
-                'MX': 0.10,   # Messico
-                'JP': 0.30,   # Giappone
-                'KR': 0.15,   # Corea del Sud
-                'IN': 0.45,   # India
-                'SG': 0.03,   # Singapore
-            }
-            
-            multiplier = country_multipliers.get(country_code.upper(), 0.05)  # Default per paesi non listati
+            multiplier = COUNTRY_MULTIPLIERS.get(country_code.upper(), 0.05)  # Default per paesi non listati
             
             # Adatta i trend globali al paese
             adapted_trends = []
@@ -146,38 +199,49 @@ class TrendService:
         
         return trends
     
+    @trend_cache.cached("keyword", ttl=settings.TREND_CACHE_TTL_KEYWORD)
     async def analyze_keyword(self, keyword: str, hours_back: int = 24) -> Dict[str, Any]:
         """Analizza le menzioni di una keyword"""
+        results = await self.analyze_keywords([keyword], hours_back)
+        return results[0]
+    
+    async def analyze_keywords(self, keywords: List[str], hours_back: int = 24) -> List[Dict[str, Any]]:
+        """Analizza le menzioni di più keyword con una sola query (risultati nello stesso ordine)"""
         
         since_time = datetime.now() - timedelta(hours=hours_back)
         
-        # Conta menzioni totali per piattaforma
-        platform_query = """
+        # Breakdown per piattaforma e timeline oraria per ogni keyword in un solo passaggio:
+        # unnest dei pattern + join ILIKE (ogni pattern usa l'indice trigram idx_mentions_keyword_trgm)
+        query = KEYWORD_ANALYSIS_TIMESCALE_QUERY if settings.TIMESCALE_ENABLED else """
         SELECT 
-            platform,
-            SUM(volume) as total_mentions,
-            AVG(sentiment) as avg_sentiment
-        FROM mentions 
-        WHERE keyword ILIKE $1 
-        AND time > $2
-        GROUP BY platform
+            k.idx,
+            GROUPING(m.platform) = 1 as is_timeline,
+            m.platform,
+            date_trunc('hour', m.time) as hour,
+            SUM(m.volume) as volume,
+            AVG(m.sentiment) as avg_sentiment
+        FROM unnest($1::text[]) WITH ORDINALITY AS k(pattern, idx)
+        JOIN mentions m ON m.keyword ILIKE k.pattern
+        WHERE m.time > $2
+        GROUP BY GROUPING SETS ((k.idx, m.platform), (k.idx, date_trunc('hour', m.time)))
+        ORDER BY k.idx, is_timeline, hour
         """
         
-        platform_results = await execute_query(platform_query, f"%{keyword}%", since_time)
+        patterns = [f"%{escape_like(keyword)}%" for keyword in keywords]
+        results = await execute_query(query, patterns, since_time)
         
-        # Timeline oraria
-        timeline_query = """
-        SELECT 
-            date_trunc('hour', time) as hour,
-            SUM(volume) as volume
-        FROM mentions 
-        WHERE keyword ILIKE $1 
-        AND time > $2
-        GROUP BY hour
-        ORDER BY hour
-        """
+        rows_by_keyword: Dict[int, List] = {}
+        for row in results:
+            rows_by_keyword.setdefault(row['idx'], []).append(row)
         
-        timeline_results = await execute_query(timeline_query, f"%{keyword}%", since_time)
+        return [
+            self._format_keyword_analysis(keyword, rows_by_keyword.get(idx, []), hours_back)
+            for idx, keyword in enumerate(keywords, start=1)
+        ]
+    
+    def _format_keyword_analysis(self, keyword: str, rows: List, hours_back: int) -> Dict[str, Any]:
+        platform_results = [row for row in rows if not row['is_timeline']]
+        timeline_results = [row for row in rows if row['is_timeline']]
         
         # Formatta risultati
         platforms = {}
@@ -186,8 +250,8 @@ class TrendService:
         sentiment_count = 0
         
         for row in platform_results:
-            platforms[row['platform']] = row['total_mentions']
-            total_mentions += row['total_mentions']
+            platforms[row['platform']] = row['volume']
+            total_mentions += row['volume']
             if row['avg_sentiment']:
                 sentiment_sum += row['avg_sentiment']
                 sentiment_count += 1
@@ -209,9 +273,37 @@ class TrendService:
             "analysis_period_hours": hours_back
         }
     
-    async def get_related_hashtags(self, hashtag: str, limit: int = 10) -> List[Dict[str, Any]]:
+    @trend_cache.cached("related", ttl=settings.TREND_CACHE_TTL_RELATED)
+    async def get_related_hashtags(self, hashtag: str, limit: int = 10, metric: str = "cooccurrence") -> List[Dict[str, Any]]:
         """Trova hashtag correlati"""
         
+        hashtag = hashtag.lstrip('#')
+        
+        # Vicini precalcolati: una sola lettura sull'indice (hashtag, metric, rank)
+        results = await execute_query(
+            """
+            SELECT related_hashtag, score, volume
+            FROM hashtag_neighbors
+            WHERE hashtag = $1 AND metric = $2
+            ORDER BY rank
+            LIMIT $3
+            """,
+            hashtag,
+            metric,
+            limit
+        )
+        
+        if results:
+            return [
+                {
+                    "hashtag": f"#{row['related_hashtag']}",
+                    "relation_score": round(row['score'] or 0.0, 2),
+                    "volume": int(row['volume'] or 0)
+                }
+                for row in results
+            ]
+        
+        # Fallback: calcolo diretto su hashtag_relations (vicini non ancora calcolati)
         query = """
         SELECT 
             related_hashtag,
@@ -225,7 +317,7 @@ class TrendService:
         LIMIT $2
         """
         
-        results = await execute_query(query, hashtag.lstrip('#'), limit)
+        results = await execute_query(query, hashtag, limit)
         
         related = []
         for row in results:
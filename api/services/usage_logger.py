@@ -0,0 +1,108 @@
+import asyncio
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+from api.core.database import get_postgres_pool
+from api.core.config import settings
+
+class UsageLogger:
+    """Buffer write-behind per il log di utilizzo delle API key.
+    
+    Le chiamate vengono accumulate in memoria e scritte in blocco ogni
+    USAGE_LOG_FLUSH_INTERVAL_MS millisecondi o al raggiungimento di
+    USAGE_LOG_BATCH_SIZE eventi: una COPY su api_usage e un solo UPDATE
+    su api_keys con i delta per chiave.
+    """
+    
+    def __init__(self):
+        self._events: List[Tuple[str, str, datetime]] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self.dropped = 0
+    
+    def record(self, api_key: str, endpoint: str):
+        """Accoda una chiamata (non blocca la richiesta)"""
+        self._events.append((api_key, endpoint, datetime.now(timezone.utc)))
+        
+        if len(self._events) > settings.USAGE_LOG_MAX_BUFFER:
+            # Database irraggiungibile da troppo tempo: scarta gli eventi più vecchi
+            overflow = len(self._events) - settings.USAGE_LOG_MAX_BUFFER
+            del self._events[:overflow]
+            self.dropped += overflow
+        
+        if self._wakeup is not None and len(self._events) >= settings.USAGE_LOG_BATCH_SIZE:
+            self._wakeup.set()
+    
+    async def flush(self):
+        """Scrive su database tutti gli eventi in buffer"""
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        
+        async with self._flush_lock:
+            events, self._events = self._events, []
+            if not events:
+                return
+            
+            # Delta per chiave: numero di chiamate e ultimo utilizzo
+            deltas: Dict[str, List] = {}
+            for api_key, _, timestamp in events:
+                delta = deltas.setdefault(api_key, [0, timestamp])
+                delta[0] += 1
+                delta[1] = max(delta[1], timestamp)
+            
+            try:
+                pool = await get_postgres_pool()
+                async with pool.acquire() as conn:
+                    async with conn.transaction():
+                        await conn.copy_records_to_table(
+                            "api_usage",
+                            records=events,
+                            columns=["api_key", "endpoint", "timestamp"]
+                        )
+                        await conn.execute(
+                            """
+                            UPDATE api_keys AS k
+                            SET usage_count = k.usage_count + d.calls,
+                                last_used = GREATEST(k.last_used, d.last_used)
+                            FROM unnest($1::text[], $2::int[], $3::timestamptz[]) AS d(key, calls, last_used)
+                            WHERE k.key = d.key
+                            """,
+                            list(deltas.keys()),
+                            [d[0] for d in deltas.values()],
+                            [d[1] for d in deltas.values()]
+                        )
+            except Exception as e:
+                print(f"Errore logging utilizzo ({len(events)} eventi): {e}")
+                # Rimetti in testa gli eventi non scritti, nel limite del buffer
+                self._events = (events + self._events)[-settings.USAGE_LOG_MAX_BUFFER:]
+    
+    async def _run(self):
+        interval = settings.USAGE_LOG_FLUSH_INTERVAL_MS / 1000
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+    
+    def start(self):
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            self._wakeup = None
+        # Svuota il buffer prima dello shutdown
+        await self.flush()
+        if self.dropped:
+            print(f"⚠️ Eventi di utilizzo scartati per buffer pieno: {self.dropped}")
+
+usage_logger = UsageLogger()
@@ -0,0 +1,119 @@
+import asyncio
+import time
+from typing import Any, Dict, List, Optional
+from urllib.parse import unquote_plus
+from api.core.database import execute_query
+from api.core.config import settings
+from api.services.snapshot_service import TrendSnapshotService, trend_snapshots
+from api.services.trend_service import COUNTRY_MULTIPLIERS
+
+class CacheWarmer:
+    """Precalcola all'avvio le risposte più richieste nella cache di TrendService.
+    
+    Gira in background dopo l'avvio: /health (liveness) risponde subito,
+    /ready (readiness) solo quando il warm-up è terminato e lo snapshot
+    globale esiste. Il warm-up finisce comunque entro WARMUP_TIMEOUT secondi,
+    anche se qualche chiave non è stata calcolata.
+    """
+    
+    def __init__(self, snapshots: TrendSnapshotService):
+        self.snapshots = snapshots
+        self._task: Optional[asyncio.Task] = None
+        self._done = False
+        self.started_at: Optional[float] = None
+        self.duration: Optional[float] = None
+        self.warmed = 0
+        self.failed = 0
+    
+    @property
+    def ready(self) -> bool:
+        return self._done and self.snapshots.snapshot is not None
+    
+    async def popular_hashtags(self, limit: int) -> List[str]:
+        """Hashtag più richiesti su /hashtags/related secondo api_usage"""
+        rows = await execute_query(
+            """
+            SELECT substring(endpoint from '[?&]hashtag=([^&]*)') as hashtag, COUNT(*) as calls
+            FROM api_usage
+            WHERE endpoint LIKE $1
+            AND timestamp >= NOW() - make_interval(days => $2)
+            GROUP BY 1
+            ORDER BY calls DESC
+            LIMIT $3
+            """,
+            f"{settings.API_V1_STR}/trends/hashtags/related?%",
+            settings.WARMUP_USAGE_DAYS,
+            limit * 2
+        )
+        
+        # "%23fyp", "#fyp" e "fyp" sono la stessa voce di cache
+        hashtags: List[str] = []
+        for row in rows:
+            hashtag = unquote_plus(row['hashtag'] or "").lstrip('#')
+            if hashtag and hashtag not in hashtags:
+                hashtags.append(hashtag)
+        return hashtags[:limit]
+    
+    async def _warm(self):
+        trend_service = self.snapshots.trend_service
+        jobs = [(f"paese {code}", trend_service.get_country_trends, (code,)) for code in COUNTRY_MULTIPLIERS]
+        
+        try:
+            hashtags = await self.popular_hashtags(settings.WARMUP_TOP_HASHTAGS)
+        except Exception as e:
+            print(f"⚠️ Warm-up: hashtag più richiesti non disponibili ({e})")
+            hashtags = []
+        jobs += [(f"#{hashtag}", trend_service.get_related_hashtags, (hashtag,)) for hashtag in hashtags]
+        
+        semaphore = asyncio.Semaphore(settings.WARMUP_CONCURRENCY)
+        
+        async def warm_one(label: str, method, args: tuple):
+            async with semaphore:
+                try:
+                    # Stessi argomenti (e default) dei router: stessa chiave di cache
+                    await method(*args)
+                    self.warmed += 1
+                except Exception as e:
+                    self.failed += 1
+                    print(f"⚠️ Warm-up {label} fallito: {e}")
+        
+        await asyncio.gather(*(warm_one(*job) for job in jobs))
+    
+    async def _run(self):
+        self.started_at = time.time()
+        try:
+            await asyncio.wait_for(self._warm(), timeout=settings.WARMUP_TIMEOUT)
+        except asyncio.TimeoutError:
+            print(f"⚠️ Warm-up interrotto dopo {settings.WARMUP_TIMEOUT:.0f}s")
+        self.duration = time.time() - self.started_at
+        self._done = True
+        print(f"🔥 Warm-up completato in {self.duration:.1f}s ({self.warmed} voci, {self.failed} errori)")
+    
+    def start(self):
+        if self._task is not None:
+            return
+        if not settings.WARMUP_ENABLED:
+            self._done = True
+            return
+        self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+    
+    def status(self) -> Dict[str, Any]:
+        return {
+            "warmup_done": self._done,
+            "snapshot_ready": self.snapshots.snapshot is not None,
+            "snapshot_restored_from_disk": self.snapshots.restored_from_disk,
+            "warmed": self.warmed,
+            "failed": self.failed,
+            "warmup_seconds": round(self.duration, 2) if self.duration is not None else None
+        }
+
+cache_warmer = CacheWarmer(trend_snapshots)
@@ -0,0 +1,28 @@
+from celery import Celery
+from api.core.config import settings
+
+# App Celery per l'ingestion dei trend (broker Redis)
+celery_app = Celery(
+    "social_trends",
+    broker=settings.CELERY_BROKER_URL,
+    include=["api.workers.tasks"]
+)
+
+celery_app.conf.update(
+    task_serializer="json",
+    accept_content=["json"],
+    timezone="UTC",
+    enable_utc=True,
+    # Un task interrotto viene rieseguito: l'upsert idempotente rende sicura la ripetizione
+    task_acks_late=True,
+    task_reject_on_worker_lost=True,
+    worker_prefetch_multiplier=1,
+    beat_schedule={
+        f"ingest-{platform}": {
+            "task": "api.workers.tasks.ingest_platform",
+            "schedule": settings.INGESTION_INTERVAL,
+            "args": (platform,)
+        }
+        for platform in ("tiktok", "instagram")
+    }
+)
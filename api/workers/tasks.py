@@ -0,0 +1,85 @@
+import asyncio
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+import asyncpg
+from api.core.config import settings
+from api.core.database import get_asyncpg_url
+from api.services.ingestion_service import TrendPointBuffer, write_trend_records
+from api.services.platform_services.tiktok_service import TikTokService
+from api.services.platform_services.instagram_service import InstagramService
+from api.workers.celery_app import celery_app
+
+PLATFORM_SERVICES = {
+    "tiktok": TikTokService(),
+    "instagram": InstagramService()
+}
+
+async def _write_batches(buffer: TrendPointBuffer) -> int:
+    """Scrive il buffer a blocchi di INGESTION_BATCH_SIZE su una connessione dedicata"""
+    records = buffer.drain()
+    if not records:
+        return 0
+    
+    # Ogni task gira nel proprio event loop: niente pool condiviso con l'API
+    conn = await asyncpg.connect(get_asyncpg_url())
+    try:
+        written = 0
+        for start in range(0, len(records), settings.INGESTION_BATCH_SIZE):
+            written += await write_trend_records(conn, records[start:start + settings.INGESTION_BATCH_SIZE])
+        return written
+    finally:
+        await conn.close()
+
+async def _ingest_platform(platform: str) -> int:
+    service = PLATFORM_SERVICES[platform]
+    # Dati "live" della piattaforma, non quelli già salvati nel database
+    trends = await service.get_trends(limit=settings.INGESTION_FETCH_LIMIT, use_db=False)
+    
+    buffer = TrendPointBuffer()
+    collected_at = datetime.utcnow()
+    for trend in trends:
+        metadata = {k: v for k, v in trend.items() if k not in ("rank", "name", "volume")}
+        buffer.add(
+            name=trend["name"],
+            volume=trend["volume"],
+            platform=platform,
+            country_code=trend.get("country_code", "global"),
+            time=collected_at,
+            metadata=metadata
+        )
+    
+    return await _write_batches(buffer)
+
+@celery_app.task(name="api.workers.tasks.ingest_platform", bind=True, max_retries=3, default_retry_delay=30)
+def ingest_platform(self, platform: str) -> int:
+    """Raccoglie i trend di una piattaforma e li scrive su `trends` (idempotente per bucket)"""
+    if platform not in PLATFORM_SERVICES:
+        raise ValueError(f"Piattaforma non supportata: {platform}")
+    try:
+        written = asyncio.run(_ingest_platform(platform))
+        print(f"📥 Ingestion {platform}: {written} punti scritti")
+        return written
+    except (OSError, asyncpg.PostgresError) as e:
+        print(f"⚠️ Ingestion {platform} fallita: {e}")
+        raise self.retry(exc=e)
+
+@celery_app.task(name="api.workers.tasks.ingest_points", bind=True, max_retries=3, default_retry_delay=30)
+def ingest_points(self, points: List[Dict[str, Any]], bucket_seconds: Optional[int] = None) -> int:
+    """Scrive punti già raccolti (dict con name, volume, platform, country_code, time, lang, metadata)"""
+    buffer = TrendPointBuffer(bucket_seconds)
+    for point in points:
+        time = point.get("time")
+        buffer.add(
+            name=point["name"],
+            volume=point["volume"],
+            platform=point["platform"],
+            country_code=point.get("country_code", "global"),
+            time=datetime.fromisoformat(time) if isinstance(time, str) else time,
+            lang=point.get("lang"),
+            metadata=point.get("metadata")
+        )
+    try:
+        return asyncio.run(_write_batches(buffer))
+    except (OSError, asyncpg.PostgresError) as e:
+        print(f"⚠️ Ingestion di {len(points)} punti fallita: {e}")
+        raise self.retry(exc=e)
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+Backfill storico: carica file CSV o Parquet in `trends` o `mentions` con COPY.
+
+I file vengono letti a blocchi (--chunk-size righe) e ogni blocco viene
+scritto da un pool di processi, ciascuno con la propria connessione. Alla
+fine i rollup dell'intervallo caricato vengono ricostruiti.
+
+USO:
+  python scripts/backfill_trends.py trends storico_2024.parquet storico_2025.csv --workers 8
+  python scripts/backfill_trends.py mentions mentions_2024.csv --chunk-size 100000
+
+Colonne attese (header CSV o schema Parquet):
+  trends:   name, volume, platform, time [, country_code, lang, metadata]
+  mentions: keyword, volume, platform, time [, sentiment, metadata]
+
+`time` in formato ISO 8601 (senza fuso = UTC), `metadata` come oggetto JSON.
+Su `trends` il caricamento è idempotente (upsert su name, platform,
+country_code, time); su `mentions` rieseguire lo stesso file duplica i dati.
+I file Parquet richiedono pyarrow.
+"""
+
+import argparse
+import asyncio
+import csv
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime, timedelta, timezone
+from itertools import islice
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import asyncpg
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from api.core.config import settings
+from api.core.database import get_asyncpg_url
+from api.services.ingestion_service import write_trend_records
+
+MENTION_COLUMNS = ["keyword", "volume", "platform", "sentiment", "metadata", "time"]
+
+# Aggregati continui da aggiornare in modalità TimescaleDB (scripts/timescale_setup.sql)
+CONTINUOUS_AGGREGATES = {
+    "trends": ["trends_hourly", "trends_daily"],
+    "mentions": ["mentions_hourly"]
+}
+
+# (righe scritte, righe scartate, time minimo, time massimo)
+ChunkResult = Tuple[int, int, Optional[datetime], Optional[datetime]]
+
+def parse_time(value: Any) -> datetime:
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.strip())
+    if not isinstance(value, datetime):
+        raise ValueError(f"time non valido: {value!r}")
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value
+
+def parse_metadata(value: Any) -> Optional[str]:
+    if value is None or value == "":
+        return None
+    if isinstance(value, str):
+        # Verifica che sia JSON valido prima della COPY
+        json.loads(value)
+        return value
+    return json.dumps(value)
+
+def optional_text(value: Any) -> Optional[str]:
+    return value if value not in (None, "") else None
+
+def trend_record(row: Dict[str, Any]) -> tuple:
+    return (
+        row["name"],
+        int(row["volume"]),
+        row["platform"],
+        optional_text(row.get("country_code")) or "global",
+        optional_text(row.get("lang")),
+        parse_metadata(row.get("metadata")),
+        parse_time(row["time"])
+    )
+
+def mention_record(row: Dict[str, Any]) -> tuple:
+    sentiment = row.get("sentiment")
+    return (
+        row["keyword"],
+        int(row["volume"]),
+        row["platform"],
+        float(sentiment) if sentiment not in (None, "") else 0.5,
+        parse_metadata(row.get("metadata")),
+        parse_time(row["time"])
+    )
+
+async def _write_chunk(table: str, records: List[tuple], database_url: str):
+    conn = await asyncpg.connect(database_url)
+    try:
+        if table == "trends":
+            # I rollup si ricostruiscono una volta sola alla fine
+            await write_trend_records(conn, records, rollups=False)
+        else:
+            await conn.copy_records_to_table("mentions", records=records, columns=MENTION_COLUMNS)
+    finally:
+        await conn.close()
+
+def load_chunk(table: str, rows: List[Dict[str, Any]], database_url: str) -> ChunkResult:
+    """Eseguito nei processi del pool: converte un blocco di righe e lo scrive con COPY"""
+    to_record = trend_record if table == "trends" else mention_record
+    records = []
+    rejected = 0
+    for row in rows:
+        try:
+            records.append(to_record(row))
+        except (KeyError, TypeError, ValueError):
+            rejected += 1
+
+    if not records:
+        return 0, rejected, None, None
+
+    asyncio.run(_write_chunk(table, records, database_url))
+    times = [record[-1] for record in records]
+    return len(records), rejected, min(times), max(times)
+
+def iter_chunks(path: str, chunk_size: int) -> Iterator[List[Dict[str, Any]]]:
+    """Legge un file CSV o Parquet a blocchi di chunk_size righe"""
+    if path.endswith(".parquet"):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise SystemExit("❌ pyarrow non installato: pip install pyarrow per leggere file Parquet")
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+            yield batch.to_pylist()
+        return
+
+    with open(path, newline="", encoding="utf-8") as f:
+        reader = csv.DictReader(f)
+        while True:
+            rows = list(islice(reader, chunk_size))
+            if not rows:
+                return
+            yield rows
+
+async def rebuild_rollups(table: str, database_url: str, time_from: datetime, time_to: datetime):
+    """Ricostruisce rollup e aggregati continui dell'intervallo caricato, un mese alla volta"""
+    conn = await asyncpg.connect(database_url, command_timeout=None)
+    try:
+        if table == "trends":
+            slice_start = time_from
+            while slice_start <= time_to:
+                slice_end = min(slice_start + timedelta(days=30), time_to)
+                rows = await conn.fetchval("SELECT rebuild_trend_rollups($1, $2)", slice_start, slice_end)
+                print(f"   🔁 Rollup {slice_start:%Y-%m-%d} → {slice_end:%Y-%m-%d}: {rows} bucket")
+                if slice_end == time_to:
+                    break
+                slice_start = slice_end
+
+        if settings.TIMESCALE_ENABLED:
+            for view in CONTINUOUS_AGGREGATES[table]:
+                await conn.execute(
+                    f"CALL refresh_continuous_aggregate('{view}', $1::timestamptz, $2::timestamptz)",
+                    time_from,
+                    time_to + timedelta(hours=1)
+                )
+                print(f"   🔁 Aggregato continuo {view} aggiornato")
+    finally:
+        await conn.close()
+
+def run_backfill(table: str, paths: List[str], workers: int, chunk_size: int, rebuild: bool) -> bool:
+    database_url = get_asyncpg_url()
+    started = time.time()
+    written = 0
+    rejected = 0
+    failed_chunks = 0
+    time_from: Optional[datetime] = None
+    time_to: Optional[datetime] = None
+
+    def collect(futures):
+        nonlocal written, rejected, failed_chunks, time_from, time_to
+        for future in futures:
+            try:
+                chunk_written, chunk_rejected, chunk_from, chunk_to = future.result()
+            except Exception as e:
+                failed_chunks += 1
+                print(f"❌ Blocco non scritto: {e}")
+                continue
+            written += chunk_written
+            rejected += chunk_rejected
+            if chunk_from is not None:
+                time_from = chunk_from if time_from is None else min(time_from, chunk_from)
+                time_to = chunk_to if time_to is None else max(time_to, chunk_to)
+        print(f"   📦 {written} righe scritte ({written / max(time.time() - started, 0.001):.0f} righe/s)")
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = set()
+        for path in paths:
+            print(f"📄 Lettura {path}...")
+            for rows in iter_chunks(path, chunk_size):
+                pending.add(pool.submit(load_chunk, table, rows, database_url))
+                # Al massimo due blocchi in coda per processo: memoria costante
+                if len(pending) >= workers * 2:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    collect(done)
+        done, _ = wait(pending)
+        collect(done)
+
+    print(f"✅ Caricate {written} righe in {table} in {time.time() - started:.1f}s ({rejected} scartate)")
+
+    if rebuild and time_from is not None and (table == "trends" or settings.TIMESCALE_ENABLED):
+        print("🔄 Ricostruzione rollup...")
+        asyncio.run(rebuild_rollups(table, database_url, time_from, time_to))
+
+    if failed_chunks:
+        print(f"⚠️ {failed_chunks} blocchi non scritti: rilancia il backfill per gli stessi file")
+    return failed_chunks == 0
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill storico di trends/mentions da CSV o Parquet")
+    parser.add_argument("table", choices=["trends", "mentions"])
+    parser.add_argument("paths", nargs="+", help="File .csv o .parquet")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 4, help="Processi di scrittura")
+    parser.add_argument("--chunk-size", type=int, default=50000, help="Righe per blocco COPY")
+    parser.add_argument("--no-rebuild", action="store_true", help="Non ricostruire i rollup alla fine")
+    args = parser.parse_args()
+
+    success = run_backfill(args.table, args.paths, args.workers, args.chunk_size, not args.no_rebuild)
+    exit(0 if success else 1)
+
+if __name__ == "__main__":
+    main()
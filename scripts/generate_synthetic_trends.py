@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Popola `trends` con dati sintetici per benchmark e load test.
+
+Usa lo stesso universo Zipf dei servizi TikTok/Instagram
+(api/services/platform_services/synthetic.py): con lo stesso SIMULATION_SEED
+il database contiene esattamente i trend che l'API simula per gli stessi
+istanti. Le righe vengono scritte con COPY + upsert (rilanciare lo script è
+sicuro) e alla fine vengono ricostruiti i rollup dell'intervallo.
+
+USO:
+  python scripts/generate_synthetic_trends.py --days 7 --per-bucket 1000
+  SIMULATION_UNIVERSE_SIZE=1000000 python scripts/generate_synthetic_trends.py --countries global US IT --seed 7
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+import asyncpg
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from api.core.config import settings
+from api.core.database import get_asyncpg_url
+from api.services.ingestion_service import write_trend_records
+from api.services.platform_services import tiktok_service, instagram_service
+from api.services.platform_services.synthetic import SyntheticTrendUniverse
+
+HEAD_HASHTAGS = {
+    "tiktok": tiktok_service.HEAD_HASHTAGS,
+    "instagram": instagram_service.HEAD_HASHTAGS
+}
+
+BATCH_SIZE = 50000
+
+async def generate(days: int, step_minutes: int, per_bucket: int, countries, seed: int):
+    # Lo scope "global" coincide con quello dei servizi: stessi trend dell'API simulata
+    universes = {
+        (platform, country): SyntheticTrendUniverse(
+            platform if country == "global" else f"{platform}:{country}",
+            head_names,
+            seed=seed
+        )
+        for platform, head_names in HEAD_HASHTAGS.items()
+        for country in countries
+    }
+    
+    end = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+    start = end - timedelta(days=days)
+    steps = int((end - start) / timedelta(minutes=step_minutes))
+    
+    conn = await asyncpg.connect(get_asyncpg_url(), command_timeout=None)
+    try:
+        started = time.time()
+        written = 0
+        batch = []
+        for step in range(steps + 1):
+            moment = start + timedelta(minutes=step * step_minutes)
+            for (platform, country), universe in universes.items():
+                top = universe.top(per_bucket, moment)
+                for index, volume, growth in zip(top["indices"].tolist(), top["volumes"].tolist(), top["growth"].tolist()):
+                    batch.append((
+                        universe.name(index),
+                        volume,
+                        platform,
+                        country,
+                        None,
+                        json.dumps({"growth_24h": growth}),
+                        moment
+                    ))
+            
+            if len(batch) >= BATCH_SIZE or step == steps:
+                written += await write_trend_records(conn, batch, rollups=False)
+                batch = []
+                print(f"   📦 {moment:%Y-%m-%d %H:%M} - {written} righe ({written / max(time.time() - started, 0.001):.0f} righe/s)")
+        
+        print(f"✅ {written} righe sintetiche scritte in {time.time() - started:.1f}s")
+        
+        print("🔄 Ricostruzione rollup...")
+        buckets = await conn.fetchval("SELECT rebuild_trend_rollups($1, $2)", start, end)
+        print(f"✅ {buckets} bucket orari ricostruiti")
+    finally:
+        await conn.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Genera trend sintetici deterministici in Postgres")
+    parser.add_argument("--days", type=int, default=7, help="Giorni di storico da generare")
+    parser.add_argument("--step-minutes", type=int, default=60, help="Intervallo tra i punti")
+    parser.add_argument("--per-bucket", type=int, default=1000, help="Hashtag per piattaforma, paese e istante")
+    parser.add_argument("--countries", nargs="+", default=["global"], help="Paesi da generare (es. global US IT)")
+    parser.add_argument("--seed", type=int, default=settings.SIMULATION_SEED)
+    args = parser.parse_args()
+    
+    print(f"🎲 Universo di {settings.SIMULATION_UNIVERSE_SIZE} hashtag, seed {args.seed}")
+    asyncio.run(generate(args.days, args.step_minutes, args.per_bucket, args.countries, args.seed))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+-- Modalità TimescaleDB (opzionale): ipertabelle, aggregati continui e compressione
+-- Richiede l'estensione timescaledb (es. docker-compose). Su Render resta il Postgres semplice.
+-- Dopo l'esecuzione imposta TIMESCALE_ENABLED=true. Script idempotente.
+
+CREATE EXTENSION IF NOT EXISTS timescaledb CASCADE;
+
+-- Le ipertabelle richiedono che gli indici univoci includano la colonna time
+ALTER TABLE trends DROP CONSTRAINT IF EXISTS trends_pkey;
+ALTER TABLE mentions DROP CONSTRAINT IF EXISTS mentions_pkey;
+
+SELECT create_hypertable('trends', 'time', if_not_exists => TRUE, migrate_data => TRUE);
+SELECT create_hypertable('mentions', 'time', if_not_exists => TRUE, migrate_data => TRUE);
+
+-- Aggregato orario dei trend (letto da get_trends_from_db delle piattaforme)
+CREATE MATERIALIZED VIEW IF NOT EXISTS trends_hourly
+WITH (timescaledb.continuous, timescaledb.materialized_only = false) AS
+SELECT 
+    time_bucket(INTERVAL '1 hour', time) AS bucket,
+    platform,
+    country_code,
+    name,
+    SUM(volume)::bigint AS volume_sum,
+    MAX(volume) AS volume_max,
+    COUNT(*) AS data_points,
+    last(metadata, time) AS metadata
+FROM trends
+GROUP BY bucket, platform, country_code, name
+WITH NO DATA;
+
+-- Aggregato giornaliero dei trend (storico lungo)
+CREATE MATERIALIZED VIEW IF NOT EXISTS trends_daily
+WITH (timescaledb.continuous, timescaledb.materialized_only = false) AS
+SELECT 
+    time_bucket(INTERVAL '1 day', time) AS bucket,
+    platform,
+    country_code,
+    name,
+    SUM(volume)::bigint AS volume_sum,
+    MAX(volume) AS volume_max,
+    COUNT(*) AS data_points
+FROM trends
+GROUP BY bucket, platform, country_code, name
+WITH NO DATA;
+
+-- Versione precedente di mentions_hourly senza sentiment_points: va ricreata
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_class WHERE relname = 'mentions_hourly')
+    AND NOT EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_name = 'mentions_hourly' AND column_name = 'sentiment_points'
+    ) THEN
+        DROP MATERIALIZED VIEW mentions_hourly;
+    END IF;
+END $$;
+
+-- Aggregato orario delle menzioni (letto da analyze_keyword)
+-- Somma e conteggio dei soli sentiment non NULL: la media resta ricomponibile tra bucket
+CREATE MATERIALIZED VIEW IF NOT EXISTS mentions_hourly
+WITH (timescaledb.continuous, timescaledb.materialized_only = false) AS
+SELECT 
+    time_bucket(INTERVAL '1 hour', time) AS bucket,
+    platform,
+    keyword,
+    SUM(volume)::bigint AS volume_sum,
+    SUM(sentiment) AS sentiment_sum,
+    COUNT(sentiment) AS sentiment_points,
+    COUNT(*) AS data_points
+FROM mentions
+GROUP BY bucket, platform, keyword
+WITH NO DATA;
+
+CREATE INDEX IF NOT EXISTS idx_trends_hourly_platform_bucket ON trends_hourly (platform, bucket DESC);
+CREATE INDEX IF NOT EXISTS idx_mentions_hourly_keyword_trgm ON mentions_hourly USING GIN (keyword gin_trgm_ops);
+
+-- Aggiornamento automatico degli aggregati
+SELECT add_continuous_aggregate_policy('trends_hourly',
+    start_offset => INTERVAL '3 hours', end_offset => INTERVAL '1 hour',
+    schedule_interval => INTERVAL '5 minutes', if_not_exists => TRUE);
+SELECT add_continuous_aggregate_policy('trends_daily',
+    start_offset => INTERVAL '3 days', end_offset => INTERVAL '1 day',
+    schedule_interval => INTERVAL '1 hour', if_not_exists => TRUE);
+SELECT add_continuous_aggregate_policy('mentions_hourly',
+    start_offset => INTERVAL '3 hours', end_offset => INTERVAL '1 hour',
+    schedule_interval => INTERVAL '5 minutes', if_not_exists => TRUE);
+
+-- Compressione dei chunk più vecchi di 7 giorni
+-- Le colonne dell'indice univoco uq_trends_point (usato dagli upsert dell'ingestion)
+-- devono stare in segmentby o orderby
+ALTER TABLE trends SET (
+    timescaledb.compress,
+    timescaledb.compress_segmentby = 'platform, country_code',
+    timescaledb.compress_orderby = 'name, time DESC'
+);
+ALTER TABLE mentions SET (
+    timescaledb.compress,
+    timescaledb.compress_segmentby = 'platform',
+    timescaledb.compress_orderby = 'time DESC'
+);
+SELECT add_compression_policy('trends', INTERVAL '7 days', if_not_exists => TRUE);
+SELECT add_compression_policy('mentions', INTERVAL '7 days', if_not_exists => TRUE);
+
+-- Popola gli aggregati con lo storico esistente
+CALL refresh_continuous_aggregate('trends_hourly', NULL, NULL);
+CALL refresh_continuous_aggregate('trends_daily', NULL, NULL);
+CALL refresh_continuous_aggregate('mentions_hourly', NULL, NULL);
@@ -0,0 +1,265 @@
+-- Schema per le ottimizzazioni di performance dell'API
+-- Esegui questo script sul database esistente (idempotente)
+
+-- Contatori mensili delle chiamate per API key (controllo quota in O(1))
+CREATE TABLE IF NOT EXISTS api_usage_monthly (
+    api_key TEXT NOT NULL,
+    month DATE NOT NULL,
+    calls INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (api_key, month)
+);
+
+-- Inizializza i contatori del mese corrente dal log api_usage
+INSERT INTO api_usage_monthly (api_key, month, calls)
+SELECT api_key, date_trunc('month', NOW())::date, COUNT(*)
+FROM api_usage
+WHERE timestamp >= date_trunc('month', NOW())
+GROUP BY api_key
+ON CONFLICT (api_key, month)
+DO UPDATE SET calls = GREATEST(api_usage_monthly.calls, EXCLUDED.calls);
+
+-- Rollup orario per (paese, hashtag, ora) con crescita precalcolata
+-- Aggiornato in modo incrementale dall'ingestion (api/services/rollup_service.py)
+CREATE TABLE IF NOT EXISTS trend_rollups_hourly (
+    country_code TEXT NOT NULL,
+    name TEXT NOT NULL,
+    bucket TIMESTAMPTZ NOT NULL,
+    volume BIGINT NOT NULL DEFAULT 0,
+    data_points INTEGER NOT NULL DEFAULT 0,
+    platforms TEXT[] NOT NULL DEFAULT '{}',
+    growth_percentage FLOAT,
+    PRIMARY KEY (country_code, name, bucket)
+);
+
+CREATE INDEX IF NOT EXISTS idx_trend_rollups_country_bucket ON trend_rollups_hourly (country_code, bucket DESC);
+CREATE INDEX IF NOT EXISTS idx_trends_country_time ON trends (country_code, time DESC);
+
+-- Ricalcola i rollup di un intervallo dai dati grezzi (backfill o riparazione)
+-- Si ricostruiscono ore intere: anche l'ora che contiene p_to, con tutti i suoi punti
+CREATE OR REPLACE FUNCTION rebuild_trend_rollups(p_from TIMESTAMPTZ, p_to TIMESTAMPTZ DEFAULT NOW())
+RETURNS INTEGER AS $$
+DECLARE
+    v_from TIMESTAMPTZ := date_trunc('hour', p_from);
+    v_to TIMESTAMPTZ := date_trunc('hour', p_to) + INTERVAL '1 hour';
+    v_rows INTEGER;
+BEGIN
+    DELETE FROM trend_rollups_hourly WHERE bucket >= v_from AND bucket < v_to;
+    
+    INSERT INTO trend_rollups_hourly (country_code, name, bucket, volume, data_points, platforms)
+    SELECT country_code, name, date_trunc('hour', time), SUM(volume), COUNT(*), array_agg(DISTINCT platform)
+    FROM trends
+    WHERE time >= v_from AND time < v_to
+    GROUP BY country_code, name, date_trunc('hour', time);
+    
+    GET DIAGNOSTICS v_rows = ROW_COUNT;
+    
+    -- Statistiche aggiornate dopo il caricamento in blocco (altrimenti il join sotto può degenerare)
+    ANALYZE trend_rollups_hourly;
+    
+    -- Crescita rispetto all'ora precedente (inclusa l'ora successiva all'intervallo)
+    UPDATE trend_rollups_hourly r
+    SET growth_percentage = (r.volume - p.volume)::float / NULLIF(p.volume, 0) * 100
+    FROM trend_rollups_hourly p
+    WHERE p.country_code = r.country_code
+    AND p.name = r.name
+    AND p.bucket = r.bucket - INTERVAL '1 hour'
+    AND r.bucket >= v_from
+    AND r.bucket <= v_to;
+    
+    RETURN v_rows;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Popola i rollup delle ultime 48 ore
+SELECT rebuild_trend_rollups(NOW() - INTERVAL '48 hours');
+
+-- Ricerca keyword: indice trigram per ILIKE '%kw%' (analyze_keyword)
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE INDEX IF NOT EXISTS idx_mentions_keyword_trgm ON mentions USING GIN (keyword gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_mentions_time ON mentions (time DESC);
+
+-- Stato dei job di manutenzione (ultimo aggiornamento incrementale)
+CREATE TABLE IF NOT EXISTS maintenance_jobs (
+    job TEXT PRIMARY KEY,
+    last_run TIMESTAMPTZ
+);
+
+-- Vicini precalcolati per hashtag (top-K per metrica: cooccurrence, pmi, jaccard)
+CREATE TABLE IF NOT EXISTS hashtag_neighbors (
+    hashtag TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    rank SMALLINT NOT NULL,
+    related_hashtag TEXT NOT NULL,
+    score FLOAT NOT NULL,
+    volume BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (hashtag, metric, rank)
+);
+
+CREATE INDEX IF NOT EXISTS idx_hashtag_relations_time ON hashtag_relations (time DESC);
+
+-- Occorrenze di ogni hashtag (come main o related) in hashtag_relations, aggiornate per delta
+CREATE TABLE IF NOT EXISTS hashtag_occurrences (
+    hashtag TEXT PRIMARY KEY,
+    occurrences BIGINT NOT NULL
+);
+
+-- Righe di hashtag_relations già conteggiate (totale per la PMI)
+ALTER TABLE maintenance_jobs ADD COLUMN IF NOT EXISTS row_count BIGINT NOT NULL DEFAULT 0;
+
+-- Ricalcola i vicini degli hashtag con nuove relazioni dall'ultimo run (o di tutti con p_full)
+-- Le occorrenze e il totale si aggiornano con le sole righe nuove: un run incrementale
+-- legge il delta e le relazioni degli hashtag toccati, non l'intera tabella
+CREATE OR REPLACE FUNCTION refresh_hashtag_neighbors(p_full BOOLEAN DEFAULT FALSE, p_top_k INTEGER DEFAULT 30)
+RETURNS INTEGER AS $$
+DECLARE
+    v_since TIMESTAMPTZ;
+    v_total BIGINT := 0;
+    v_delta BIGINT;
+    v_started TIMESTAMPTZ := NOW();
+    v_rows INTEGER;
+BEGIN
+    -- Un solo refresh alla volta anche con più worker
+    IF NOT pg_try_advisory_xact_lock(hashtext('refresh_hashtag_neighbors')) THEN
+        RETURN -1;
+    END IF;
+    
+    IF p_full THEN
+        DELETE FROM hashtag_occurrences;
+    ELSE
+        SELECT last_run, row_count INTO v_since, v_total FROM maintenance_jobs WHERE job = 'hashtag_neighbors';
+        IF v_since IS NULL THEN
+            -- Primo run: le occorrenze vanno contate da zero
+            DELETE FROM hashtag_occurrences;
+            v_total := 0;
+        END IF;
+    END IF;
+    
+    -- Delta (v_since, v_started]: il limite superiore evita di contare due volte le righe
+    -- con time futuro, che entrano nel run successivo
+    WITH delta AS (
+        SELECT main_hashtag, related_hashtag FROM hashtag_relations
+        WHERE (v_since IS NULL OR time > v_since) AND time <= v_started
+    ),
+    counted AS (
+        INSERT INTO hashtag_occurrences (hashtag, occurrences)
+        SELECT h, COUNT(*)
+        FROM (
+            SELECT main_hashtag AS h FROM delta
+            UNION ALL
+            SELECT related_hashtag FROM delta
+        ) x
+        GROUP BY h
+        ON CONFLICT (hashtag) DO UPDATE SET occurrences = hashtag_occurrences.occurrences + EXCLUDED.occurrences
+    )
+    SELECT COUNT(*) INTO v_delta FROM delta;
+    
+    v_total := COALESCE(v_total, 0) + v_delta;
+    
+    DELETE FROM hashtag_neighbors
+    WHERE hashtag IN (
+        SELECT DISTINCT main_hashtag FROM hashtag_relations
+        WHERE (v_since IS NULL OR time > v_since) AND time <= v_started
+    );
+    
+    WITH dirty AS (
+        SELECT DISTINCT main_hashtag AS hashtag FROM hashtag_relations
+        WHERE (v_since IS NULL OR time > v_since) AND time <= v_started
+    ),
+    pairs AS (
+        SELECT r.main_hashtag AS a, r.related_hashtag AS b, COUNT(*) AS n_ab, AVG(r.volume) AS avg_volume
+        FROM hashtag_relations r
+        JOIN dirty d ON d.hashtag = r.main_hashtag
+        GROUP BY r.main_hashtag, r.related_hashtag
+    ),
+    scored AS (
+        SELECT 
+            p.a,
+            p.b,
+            p.avg_volume,
+            p.n_ab::float AS cooccurrence,
+            ln(p.n_ab * v_total::float / (oa.occurrences * ob.occurrences)) AS pmi,
+            p.n_ab::float / (oa.occurrences + ob.occurrences - p.n_ab) AS jaccard
+        FROM pairs p
+        JOIN hashtag_occurrences oa ON oa.hashtag = p.a
+        JOIN hashtag_occurrences ob ON ob.hashtag = p.b
+    ),
+    ranked AS (
+        SELECT 
+            s.a, s.b, s.avg_volume, m.metric, m.score,
+            ROW_NUMBER() OVER (PARTITION BY s.a, m.metric ORDER BY m.score DESC, s.avg_volume DESC, s.b) AS rk
+        FROM scored s
+        CROSS JOIN LATERAL (VALUES
+            ('cooccurrence', s.cooccurrence),
+            ('pmi', s.pmi),
+            ('jaccard', s.jaccard)
+        ) AS m(metric, score)
+    )
+    INSERT INTO hashtag_neighbors (hashtag, metric, rank, related_hashtag, score, volume, updated_at)
+    SELECT a, metric, rk, b, score, avg_volume::bigint, v_started
+    FROM ranked
+    WHERE rk <= p_top_k;
+    
+    GET DIAGNOSTICS v_rows = ROW_COUNT;
+    
+    INSERT INTO maintenance_jobs (job, last_run, row_count) VALUES ('hashtag_neighbors', v_started, v_total)
+    ON CONFLICT (job) DO UPDATE SET last_run = EXCLUDED.last_run, row_count = EXCLUDED.row_count;
+    
+    RETURN v_rows;
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT refresh_hashtag_neighbors(TRUE);
+
+-- Ingestion idempotente: un solo punto per (name, platform, country_code, time bucket)
+DELETE FROM trends a
+USING trends b
+WHERE a.ctid < b.ctid
+AND a.name = b.name
+AND a.platform = b.platform
+AND a.country_code = b.country_code
+AND a.time = b.time;
+
+CREATE UNIQUE INDEX IF NOT EXISTS uq_trends_point ON trends (name, platform, country_code, time);
+
+-- Job di ingestion bulk: esito delle righe accettate da POST /ingest/trends
+CREATE TABLE IF NOT EXISTS ingest_jobs (
+    id TEXT PRIMARY KEY,
+    api_key TEXT NOT NULL,
+    accepted_rows INTEGER NOT NULL DEFAULT 0,
+    rejected_rows INTEGER NOT NULL DEFAULT 0,
+    queued_rows INTEGER NOT NULL DEFAULT 0,
+    written_rows INTEGER NOT NULL DEFAULT 0,
+    failed_rows INTEGER NOT NULL DEFAULT 0,
+    upload_complete BOOLEAN NOT NULL DEFAULT FALSE,
+    last_error TEXT,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_ingest_jobs_created_at ON ingest_jobs (created_at);
+
+-- Trend per piattaforma: aggregazione per hashtag e metadati più recenti in un solo passaggio
+CREATE INDEX IF NOT EXISTS idx_trends_platform_name_time ON trends (platform, name, time DESC);
+
+-- Hot store in memoria dell'API: caricamento iniziale per id
+CREATE INDEX IF NOT EXISTS idx_trends_id ON trends (id);
+
+-- Hot store: transazione che ha scritto (inserito o aggiornato) ogni riga, per rileggere anche
+-- i commit tardivi e gli upsert (PostgreSQL 13+). Senza default nell'ADD COLUMN la tabella
+-- non viene riscritta: le righe esistenti restano NULL
+ALTER TABLE trends ADD COLUMN IF NOT EXISTS write_xid xid8;
+ALTER TABLE trends ALTER COLUMN write_xid SET DEFAULT pg_current_xact_id();
+
+CREATE OR REPLACE FUNCTION set_trends_write_xid() RETURNS trigger AS $$
+BEGIN
+    NEW.write_xid := pg_current_xact_id();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_trends_write_xid ON trends;
+CREATE TRIGGER trg_trends_write_xid BEFORE UPDATE ON trends
+FOR EACH ROW EXECUTE FUNCTION set_trends_write_xid();
+
+CREATE INDEX IF NOT EXISTS idx_trends_write_xid ON trends (write_xid, id);
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Test dell'hot store a colonne: aggregazioni per piattaforma e per paese, finestra di 24 ore (senza database).
+"""
+
+import sys
+import os
+from datetime import datetime, timezone
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from api.services.hot_store import HotTrendStore
+
+NOW = datetime(2024, 5, 2, 12, 30, tzinfo=timezone.utc).timestamp()
+
+def at(hours_ago: float) -> datetime:
+    return datetime.fromtimestamp(NOW - hours_ago * 3600, timezone.utc)
+
+def make_store() -> HotTrendStore:
+    store = HotTrendStore()
+    store.append([
+        (1, "#fyp", 100, "tiktok", "IT", '{"v": 1}', at(2)),
+        (2, "#fyp", 201, "tiktok", "IT", '{"v": 2}', at(1)),
+        (3, "#fyp", 50, "instagram", "IT", None, at(0.2)),
+        (4, "#food", 120, "tiktok", "US", None, at(0.1)),
+        (5, "#old", 9999, "tiktok", "IT", None, at(30)),
+    ])
+    return store
+
+def test_platform_rows():
+    """Media arrotondata, massimo, punti e metadati più recenti nelle ultime 24 ore."""
+    store = make_store()
+    rows = store.platform_rows("tiktok", 10, now=NOW)
+    assert [r["name"] for r in rows] == ["#fyp", "#food"]
+    assert rows[0] == {"name": "#fyp", "avg_volume": 151, "max_volume": 201, "data_points": 2, "metadata": {"v": 2}}
+    assert store.platform_rows("tiktok", 1, now=NOW)[0]["name"] == "#fyp"
+    assert store.platform_rows("snapchat", 10, now=NOW) == []
+    print("✅ Aggregazione per piattaforma")
+
+def test_country_rows_growth_and_platforms():
+    """Volume totale, crescita dell'ultima ora rispetto alla precedente e piattaforme ordinate."""
+    store = make_store()
+    rows = store.country_rows("IT", 10, now=NOW)
+    assert len(rows) == 1
+    fyp = rows[0]
+    assert fyp["total_volume"] == 351
+    assert fyp["platforms"] == ["instagram", "tiktok"]
+    # Ultima ora (12:00) 50, ora precedente (11:00) 201
+    assert round(fyp["growth_percentage"], 1) == round((50 - 201) / 201 * 100, 1)
+    assert store.country_rows("US", 10, now=NOW)[0]["growth_percentage"] is None
+    print("✅ Aggregazione per paese")
+
+def test_duplicate_ids_and_eviction():
+    """Gli id già caricati vengono ignorati e i punti fuori finestra rimossi."""
+    store = make_store()
+    assert store.append([(2, "#fyp", 201, "tiktok", "IT", None, at(1)), (6, "#new", 5, "tiktok", "IT", None, at(0))]) == 1
+    assert len(store) == 6
+    assert store.evict(now=NOW) == 1
+    assert len(store) == 5
+    assert store.max_id == 6
+    assert [r["name"] for r in store.platform_rows("tiktok", 10, now=NOW)] == ["#fyp", "#food", "#new"]
+    print("✅ Deduplica per id ed evizione")
+
+def test_upsert_updates_loaded_point():
+    """Un punto riletto dopo un upsert aggiorna volume e metadati senza duplicarsi."""
+    store = make_store()
+    store.platform_rows("tiktok", 10)
+    assert store.append([(2, "#fyp", 401, "tiktok", "IT", '{"v": 3}', at(1))]) == 0
+    assert len(store) == 5
+    rows = store.platform_rows("tiktok", 10, now=NOW)
+    assert rows[0] == {"name": "#fyp", "avg_volume": 251, "max_volume": 401, "data_points": 2, "metadata": {"v": 3}}
+    assert store.country_rows("IT", 10, now=NOW)[0]["total_volume"] == 551
+    print("✅ Aggiornamento dei punti già caricati")
+
+if __name__ == "__main__":
+    print("🧪 Test hot store")
+    print("=" * 50)
+    test_platform_rows()
+    test_country_rows_growth_and_platforms()
+    test_duplicate_ids_and_eviction()
+    test_upsert_updates_loaded_point()
+    print("🎉 Tutti i test superati")
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Test del buffer di ingestion: bucket temporali e deduplica per chiave (senza database).
+"""
+
+import sys
+import os
+from datetime import datetime, timezone
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from api.services.ingestion_service import TrendPointBuffer, bucket_time
+from api.services.bulk_ingest_service import validate_rows
+
+def test_bucket_time():
+    """Gli istanti vengono arrotondati all'inizio del bucket, in UTC."""
+    moment = datetime(2024, 5, 1, 10, 7, 42, tzinfo=timezone.utc)
+    assert bucket_time(moment, 300) == datetime(2024, 5, 1, 10, 5, tzinfo=timezone.utc)
+    assert bucket_time(moment.replace(tzinfo=None), 3600) == datetime(2024, 5, 1, 10, 0, tzinfo=timezone.utc)
+    print("✅ Bucket temporali")
+
+def test_buffer_dedupes_same_bucket():
+    """Punti con la stessa chiave nello stesso bucket producono un solo record (l'ultimo)."""
+    buffer = TrendPointBuffer(bucket_seconds=300)
+    buffer.add("#fyp", 100, "tiktok", "IT", datetime(2024, 5, 1, 10, 1, tzinfo=timezone.utc))
+    buffer.add("#fyp", 120, "tiktok", "IT", datetime(2024, 5, 1, 10, 4, tzinfo=timezone.utc))
+    buffer.add("#fyp", 90, "instagram", "IT", datetime(2024, 5, 1, 10, 4, tzinfo=timezone.utc))
+    buffer.add("#fyp", 80, "tiktok", "IT", datetime(2024, 5, 1, 10, 6, tzinfo=timezone.utc))
+    
+    records = buffer.drain()
+    assert len(records) == 3
+    assert ("#fyp", 120, "tiktok", "IT", None, None, datetime(2024, 5, 1, 10, 0, tzinfo=timezone.utc)) in records
+    assert len(buffer) == 0
+    print("✅ Deduplica per (name, platform, country, bucket)")
+
+def test_validate_rows_skips_invalid_lines():
+    """Le righe non valide vengono segnalate senza scartare il resto del batch."""
+    records, errors = validate_rows([
+        (1, b'{"name": "#fyp", "volume": 10, "platform": "tiktok", "time": "2024-05-01T10:00:00Z"}'),
+        (2, b'{"name": "#fyp", "volume": -5, "platform": "tiktok"}'),
+        (3, b'non json'),
+        (4, b'{"name": "#food", "volume": 7, "platform": "instagram", "country_code": "IT"}'),
+    ])
+    
+    assert [r[0] for r in records] == ["#fyp", "#food"]
+    assert records[1][3] == "IT"
+    assert [e["line"] for e in errors] == [2, 3]
+    print("✅ Validazione NDJSON a blocchi")
+
+if __name__ == "__main__":
+    print("🧪 Test buffer di ingestion")
+    print("=" * 50)
+    test_bucket_time()
+    test_buffer_dedupes_same_bucket()
+    test_validate_rows_skips_invalid_lines()
+    print("🎉 Tutti i test superati")
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Test del motore di merge/ranking dei trend multi-piattaforma (senza database).
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from api.services.ranking import merge_platform_trends, normalize_hashtag, diff_rankings
+
+def test_merge_same_hashtag_across_platforms():
+    """Lo stesso hashtag su più piattaforme viene unito in una sola voce."""
+    results = merge_platform_trends({
+        "tiktok": [{"name": "#Food", "volume": 100, "growth_24h": 10.0}],
+        "instagram": [{"name": "#food", "volume": 50, "growth_24h": 20.0}],
+    }, limit=10)
+    
+    assert len(results) == 1
+    assert results[0]["volume"] == 150
+    assert results[0]["platforms"] == ["tiktok", "instagram"]
+    assert results[0]["growth_percentage"] == 15.0
+    print("✅ Merge per hashtag normalizzato")
+
+def test_top_limit_and_ranks():
+    """Vengono restituiti solo i primi `limit` trend, ordinati e con rank."""
+    trends = [{"name": f"#tag{i}", "volume": i} for i in range(1000)]
+    results = merge_platform_trends({"tiktok": trends}, limit=5)
+    
+    assert [r["volume"] for r in results] == [999, 998, 997, 996, 995]
+    assert [r["rank"] for r in results] == [1, 2, 3, 4, 5]
+    print("✅ Selezione top-N con heap")
+
+def test_platform_weights():
+    """I pesi per piattaforma influenzano volume e crescita."""
+    results = merge_platform_trends({
+        "tiktok": [{"name": "#x", "volume": 100, "growth_24h": 0.0}],
+        "instagram": [{"name": "#x", "volume": 100, "growth_24h": 30.0}],
+    }, limit=1, weights={"instagram": 2.0})
+    
+    assert results[0]["volume"] == 300
+    assert results[0]["growth_percentage"] == 20.0
+    print("✅ Pesi per piattaforma")
+
+def test_normalize_hashtag():
+    assert normalize_hashtag(" FYP ") == normalize_hashtag("#fyp") == "#fyp"
+    print("✅ Normalizzazione hashtag")
+
+def test_diff_rankings():
+    """Il diff contiene solo le voci nuove o cambiate e gli hashtag usciti."""
+    previous = [
+        {"rank": 1, "name": "#a", "volume": 10},
+        {"rank": 2, "name": "#b", "volume": 5},
+        {"rank": 3, "name": "#c", "volume": 1},
+    ]
+    current = [
+        {"rank": 1, "name": "#a", "volume": 10},
+        {"rank": 2, "name": "#d", "volume": 7},
+        {"rank": 3, "name": "#b", "volume": 5},
+    ]
+    
+    diff = diff_rankings(previous, current)
+    assert [t["name"] for t in diff["upserted"]] == ["#d", "#b"]
+    assert diff["removed"] == ["#c"]
+    assert diff_rankings(current, current) == {"upserted": [], "removed": []}
+    print("✅ Diff tra classifiche")
+
+if __name__ == "__main__":
+    print("🧪 Test motore di ranking")
+    print("=" * 50)
+    test_merge_same_hashtag_across_platforms()
+    test_top_limit_and_ranks()
+    test_platform_weights()
+    test_normalize_hashtag()
+    test_diff_rankings()
+    print("🎉 Tutti i test superati")
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Test dello snapshot condiviso tra worker: pubblicazione, swap e lettura (senza database).
+"""
+
+import sys
+import os
+import tempfile
+from datetime import datetime, timezone
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from api.services.shared_snapshot import SharedSnapshotStore
+
+TRENDS = [
+    {"rank": 1, "name": "#fyp", "volume": 1200000, "growth_percentage": 12.5, "platforms": ["tiktok", "instagram"]},
+    {"rank": 2, "name": "#caffè", "volume": 90000, "growth_percentage": -3.2, "platforms": ["instagram"]},
+]
+
+def test_publish_and_read_roundtrip():
+    """I lettori vedono esattamente la classifica pubblicata dal processo con il lock."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "snapshot")
+        writer = SharedSnapshotStore(path, capacity=10)
+        reader = SharedSnapshotStore(path, capacity=10)
+        created_at = datetime(2024, 5, 1, 10, 0, tzinfo=timezone.utc)
+        
+        assert writer.try_acquire_writer()
+        assert reader.read() is None
+        writer.publish(TRENDS, 7, created_at, ["instagram"])
+        
+        version, read_created_at, trends, degraded = reader.read()
+        assert (version, read_created_at, degraded) == (7, created_at, ["instagram"])
+        assert trends == TRENDS
+        assert reader.read(newer_than=7) is None
+        writer.close()
+        reader.close()
+    print("✅ Pubblicazione e lettura")
+
+def test_single_writer_and_swap():
+    """Un solo processo pubblica; ogni pubblicazione sostituisce la precedente."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "snapshot")
+        first = SharedSnapshotStore(path, capacity=10)
+        second = SharedSnapshotStore(path, capacity=10)
+        now = datetime.now(timezone.utc)
+        
+        assert first.try_acquire_writer()
+        assert not second.try_acquire_writer()
+        for version in range(1, 4):
+            first.publish(TRENDS[:version % 2 + 1], version, now, [])
+        assert second.version == 3
+        assert len(second.read()[2]) == 2
+        
+        # Il processo che scrive termina: il lock passa all'altro
+        first.close()
+        assert second.try_acquire_writer()
+        assert second.version == 3
+        second.close()
+    print("✅ Lock di scrittura e swap")
+
+if __name__ == "__main__":
+    print("🧪 Test snapshot condiviso")
+    print("=" * 50)
+    test_publish_and_read_roundtrip()
+    test_single_writer_and_swap()
+    print("🎉 Tutti i test superati")
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Test dell'universo sintetico dei trend simulati (senza database).
+"""
+
+import sys
+import os
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from datetime import datetime, timezone
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from api.services.platform_services.synthetic import SyntheticTrendUniverse
+from api.services.platform_services.tiktok_service import TikTokService
+
+AT = datetime(2025, 1, 1, 12, 0, tzinfo=timezone.utc)
+
+def test_same_seed_same_output():
+    """Stesso seed e stesso istante producono lo stesso top-N."""
+    a = SyntheticTrendUniverse("test", size=50000, seed=7).top(100, AT)
+    b = SyntheticTrendUniverse("test", size=50000, seed=7).top(100, AT)
+    c = SyntheticTrendUniverse("test", size=50000, seed=8).top(100, AT)
+    
+    assert a["indices"].tolist() == b["indices"].tolist()
+    assert a["volumes"].tolist() == b["volumes"].tolist()
+    assert a["volumes"].tolist() != c["volumes"].tolist()
+    print("✅ Output deterministico per seed")
+
+def test_top_is_sorted_and_zipf_shaped():
+    """Il top-N è ordinato per volume e la testa domina la coda."""
+    top = SyntheticTrendUniverse("test", size=50000, seed=7).top(1000, AT)
+    volumes = top["volumes"].tolist()
+    
+    assert len(volumes) == 1000
+    assert volumes == sorted(volumes, reverse=True)
+    assert volumes[0] > 50 * volumes[-1]
+    print("✅ Top-N ordinato con distribuzione Zipf")
+
+def test_simulate_real_data_honors_limit():
+    """simulate_real_data rispetta `limit` e i primi risultati non dipendono da esso."""
+    service = TikTokService()
+    small = asyncio.run(service.simulate_real_data(5, AT))
+    large = asyncio.run(service.simulate_real_data(200, AT))
+    
+    assert len(small) == 5 and len(large) == 200
+    assert small == large[:5]
+    assert [t["rank"] for t in small] == [1, 2, 3, 4, 5]
+    print("✅ simulate_real_data rispetta limit")
+
+def test_concurrent_top_from_threads():
+    """top() chiamato da più thread (asyncio.to_thread) su bucket diversi non rompe la cache."""
+    universe = SyntheticTrendUniverse("test", size=20000, seed=7, bucket_seconds=60)
+    instants = [AT + timedelta(minutes=i % 7) for i in range(200)]
+    
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(lambda at: universe.top(10, at), instants))
+    
+    assert len(universe._cache) <= 2
+    expected = SyntheticTrendUniverse("test", size=20000, seed=7, bucket_seconds=60).top(10, instants[-1])
+    assert results[-1]["volumes"].tolist() == expected["volumes"].tolist()
+    print("✅ top() sicuro tra thread")
+
+if __name__ == "__main__":
+    print("🧪 Test universo sintetico")
+    print("=" * 50)
+    test_same_seed_same_output()
+    test_top_is_sorted_and_zipf_shaped()
+    test_simulate_real_data_honors_limit()
+    test_concurrent_top_from_threads()
+    print("🎉 Tutti i test superati")
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Test della cache a due livelli: coalescenza dei miss e fallback senza Redis.
+"""
+
+import sys
+import os
+import asyncio
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from api.core.cache import TieredCache
+
+class CountingService:
+    cache = TieredCache("test", maxsize=16)
+    
+    def __init__(self):
+        self.calls = 0
+    
+    @cache.cached("double", ttl=60)
+    async def double(self, value: int):
+        self.calls += 1
+        await asyncio.sleep(0.01)
+        return value * 2
+
+def test_concurrent_misses_are_coalesced():
+    """Richieste concorrenti sulla stessa chiave eseguono un solo calcolo."""
+    service = CountingService()
+    
+    async def run():
+        results = await asyncio.gather(*(service.double(21) for _ in range(20)), service.double(1))
+        return results, await service.double(21)
+    
+    results, cached = asyncio.run(run())
+    assert results[:20] == [42] * 20
+    assert results[20] == 2
+    assert cached == 42
+    assert service.calls == 2
+    print("✅ Singleflight sui miss concorrenti")
+
+def test_errors_are_not_cached():
+    """Un errore arriva a tutti i chiamanti in attesa e la chiave resta da calcolare."""
+    cache = TieredCache("test", maxsize=16)
+    attempts = []
+    
+    async def failing():
+        attempts.append(1)
+        await asyncio.sleep(0.01)
+        raise ValueError("db giù")
+    
+    async def run():
+        results = await asyncio.gather(
+            *(cache.get_or_compute("k", 60, failing) for _ in range(3)),
+            return_exceptions=True
+        )
+        value = await cache.get_or_compute("k", 60, lambda: asyncio.sleep(0, result="ok"))
+        return results, value
+    
+    results, value = asyncio.run(run())
+    assert all(isinstance(r, ValueError) for r in results)
+    assert len(attempts) == 1
+    assert value == "ok"
+    print("✅ Errori propagati e non memorizzati")
+
+def test_cancelled_caller_does_not_cancel_waiters():
+    """Cancellare il primo chiamante non propaga CancelledError a chi attende la stessa chiave."""
+    cache = TieredCache("test", maxsize=16)
+    attempts = []
+    
+    async def slow():
+        attempts.append(1)
+        await asyncio.sleep(0.05)
+        return "valore"
+    
+    async def run():
+        first = asyncio.ensure_future(cache.get_or_compute("k", 60, slow))
+        await asyncio.sleep(0.01)
+        second = asyncio.ensure_future(cache.get_or_compute("k", 60, slow))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        return await asyncio.gather(first, second, return_exceptions=True)
+    
+    first, second = asyncio.run(run())
+    assert isinstance(first, asyncio.CancelledError)
+    assert second == "valore"
+    assert len(attempts) == 1
+    assert cache.l1.get("k") == "valore"
+    print("✅ Cancellazione del primo chiamante isolata")
+
+def test_unreachable_redis_falls_back_to_l1():
+    """Con Redis irraggiungibile la cache continua a funzionare in locale."""
+    cache = TieredCache("test", maxsize=16, redis_url="redis://127.0.0.1:1/0", redis_timeout=0.1)
+    
+    async def run():
+        first = await cache.get_or_compute("k", 60, lambda: asyncio.sleep(0, result=[1, 2]))
+        second = await cache.get_or_compute("k", 60, lambda: asyncio.sleep(0, result=[3]))
+        await cache.close()
+        return first, second
+    
+    assert asyncio.run(run()) == ([1, 2], [1, 2])
+    print("✅ Fallback su L1 senza Redis")
+
+if __name__ == "__main__":
+    print("🧪 Test cache a due livelli")
+    print("=" * 50)
+    test_concurrent_misses_are_coalesced()
+    test_errors_are_not_cached()
+    test_cancelled_caller_does_not_cancel_waiters()
+    test_unreachable_redis_falls_back_to_l1()
+    print("🎉 Tutti i test superati")